@@ -1,77 +1,33 @@
-import re
 import sys
 from pathlib import Path
 
-import bibtexparser
 from decouple import config
 
-bib_path = Path(config("BIB_PATH"))
-changes = 0
-unfixable = 0
-
-# Remapping
-remap = {
-    "report": "techreport",
-    "thesis": "phdthesis",
-    "online": "misc",
-    "electronic": "misc",
-}
+from common.bib_lint import ERROR, FIX, WARNING, lint_file
 
-# Standard types to validate against
-STANDARD_TYPES = {
-    "article",
-    "book",
-    "inbook",
-    "incollection",
-    "inproceedings",
-    "conference",
-    "manual",
-    "mastersthesis",
-    "phdthesis",
-    "misc",
-    "proceedings",
-    "techreport",
-    "unpublished",
-    "presentation",
-}
+bib_path = Path(config("BIB_PATH"))
 
+# One pass over the file runs every registered rule (type remap, non-standard
+# types, unsafe citekeys, missing year/title); only remapped @type headers
+# are rewritten, and the file is not written at all if nothing changed.
 print(f"Reading BibTeX file: {bib_path}")
-with open(bib_path, encoding="utf-8") as bibfile:
-    bib_db = bibtexparser.load(bibfile)
-
-for entry in bib_db.entries:
-    original_type = entry["ENTRYTYPE"].lower()
-
-    # Apply remap if needed
-    if original_type in remap:
-        new_type = remap[original_type]
-        if new_type != original_type:
-            print(f"[{entry.get('ID')}] Changing '{original_type}' → '{new_type}'")
-            entry["ENTRYTYPE"] = new_type
-            changes += 1
+result = lint_file(bib_path, fix=True)
 
-# After remapping, check for any remaining non-standard types
-for entry in bib_db.entries:
-    entry_type = entry["ENTRYTYPE"].lower()
-    if entry_type not in STANDARD_TYPES:
-        print(f"❌ [{entry.get('ID')}] Still non-standard: {entry_type}")
-        unfixable += 1
+for finding in result.by_severity(FIX):
+    print(f"[{finding.key}] {finding.message}")
+for finding in result.by_severity(ERROR):
+    print(f"❌ [{finding.key}] {finding.message}")
+for finding in result.by_severity(WARNING):
+    print(f"⚠ [{finding.key}] {finding.message}")
 
-# Save if changes
-if changes > 0:
-    with open(bib_path, "w", encoding="utf-8") as outbib:
-        bibtexparser.dump(bib_db, outbib)
+if result.written:
     print(f"✅ Updated .bib file saved: {bib_path}")
 
 print(f"\nSummary:")
-print(f"✔ Types changed: {changes}")
-print(f"❗ Remaining unfixable types: {unfixable}")
+print(f"✔ Types changed: {len(result.changes)}")
+print(f"❗ Remaining unfixable problems: {len(result.by_severity(ERROR))}")
+print(f"⚠ Warnings: {len(result.by_severity(WARNING))}")
 
 # Exit codes for Hazel:
-# 0 = no changes, 1 = changes applied, 2 = unfixable types remain
-if unfixable > 0:
-    sys.exit(2)
-elif changes > 0:
-    sys.exit(1)
-else:
-    sys.exit(0)
+# 0 = no changes, 1 = changes applied, 2 = unfixable problems remain
+sys.exit(result.exit_code)
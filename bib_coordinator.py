@@ -0,0 +1,227 @@
+import argparse
+import fcntl
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+from decouple import config
+
+from common.bib_cache import cache_path_for, load_bib
+from common.bib_lint import lint_file, print_findings
+
+# === CONFIGURATION ===
+bib_path = Path(config("BIB_PATH"))
+# Triggers closer together than this are coalesced into one run.
+QUIET_SECONDS = config("BIB_QUIET_SECONDS", default=5, cast=float)
+# ...but a steady stream of saves cannot postpone a run for longer than this.
+MAX_DELAY_SECONDS = config("BIB_MAX_DELAY_SECONDS", default=60, cast=float)
+DEFAULT_TASKS = config("BIB_TASKS", default="standardise,cache")
+
+lock_path = cache_path_for(bib_path, suffix=".bibjobs.lock")
+trigger_path = cache_path_for(bib_path, suffix=".bibjobs.trigger")
+runs_path = cache_path_for(bib_path, suffix=".bibjobs.sqlite")
+
+
+# === TASKS (run in-process, one after the other) ===
+# Each returns (changed, summary).
+def task_standardise():
+    result = lint_file(bib_path, ["type-remap"], fix=True)
+    print_findings(result.findings)
+    return bool(result.changes), f"{len(result.changes)} types changed"
+
+
+def task_lint():
+    result = lint_file(bib_path, fix=True)
+    print_findings(result.findings)
+    return bool(result.changes), f"{len(result.findings)} findings"
+
+
+def task_cache():
+    # Leaves the parsed-BibTeX cache warm for the pdf_matching scripts.
+    db = load_bib(bib_path)
+    return False, f"{len(db.entries)} entries cached"
+
+
+TASKS = {
+    "standardise": task_standardise,
+    "lint": task_lint,
+    "cache": task_cache,
+}
+
+
+# === TRIGGERS ===
+def add_trigger():
+    """Record one trigger: one byte appended, and a fresh mtime."""
+    trigger_path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(trigger_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, b".")
+    finally:
+        os.close(fd)
+
+
+def last_trigger():
+    try:
+        return trigger_path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def take_triggers():
+    """Claim every trigger so far; later ones start a new file (and a new run)."""
+    taken = trigger_path.with_name(trigger_path.name + ".taken")
+    try:
+        os.replace(trigger_path, taken)
+    except FileNotFoundError:
+        return 0
+    count = taken.stat().st_size
+    taken.unlink()
+    return count
+
+
+# === RUN LOG ===
+def open_runs():
+    conn = sqlite3.connect(runs_path, timeout=30)
+    conn.execute("""CREATE TABLE IF NOT EXISTS runs (
+            started_at REAL NOT NULL,
+            duration REAL NOT NULL,
+            triggers INTEGER NOT NULL,
+            tasks TEXT NOT NULL,
+            outcome TEXT NOT NULL,
+            detail TEXT
+        )""")
+    return conn
+
+
+def record_run(started_at, duration, triggers, tasks, outcome, detail):
+    with open_runs() as conn:
+        conn.execute(
+            "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?)",
+            (started_at, duration, triggers, ",".join(tasks), outcome, detail),
+        )
+    conn.close()
+
+
+def print_history(limit):
+    conn = open_runs()
+    rows = conn.execute(
+        "SELECT started_at, duration, triggers, tasks, outcome, detail "
+        "FROM runs ORDER BY started_at DESC LIMIT ?",
+        (limit,),
+    ).fetchall()
+    conn.close()
+    for started_at, duration, triggers, tasks, outcome, detail in reversed(rows):
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started_at))
+        print(
+            f"{when}  {duration:6.2f}s  {triggers:3d} triggers  {tasks}: {outcome} ({detail})"
+        )
+
+
+# === COORDINATOR ===
+def run_tasks(tasks, triggers):
+    started_at = time.time()
+    changed = False
+    outcome = "clean"
+    details = []
+    for name in tasks:
+        try:
+            task_changed, summary = TASKS[name]()
+        except Exception as e:
+            outcome = "error"
+            details.append(f"{name}: {e}")
+            print(f"❌ {name} failed: {e}")
+            continue
+        changed = changed or task_changed
+        details.append(f"{name}: {summary}")
+    if changed and outcome != "error":
+        outcome = "changed"
+    duration = time.time() - started_at
+    record_run(started_at, duration, triggers, tasks, outcome, "; ".join(details))
+    print(
+        f"🧹 Ran {', '.join(tasks)} for {triggers} trigger(s) in {duration:.2f}s: {outcome}"
+    )
+    return changed
+
+
+def drain(tasks, quiet, max_delay):
+    """Run ``tasks`` until no triggers are left, waiting out each burst."""
+    changed = False
+    first_seen = None
+    while True:
+        last = last_trigger()
+        if last is None:
+            return changed
+        now = time.time()
+        first_seen = first_seen or now
+        wait = min(last + quiet - now, first_seen + max_delay - now)
+        if wait > 0:
+            time.sleep(min(wait, quiet))
+            continue
+        triggers = take_triggers()
+        first_seen = None
+        if triggers:
+            changed = run_tasks(tasks, triggers) or changed
+
+
+def coordinate(tasks, quiet, max_delay):
+    """Take the lock and drain triggers; return whether any run changed the file.
+
+    Whoever cannot get the lock just leaves its trigger for the holder. The
+    holder checks again after unlocking, so a trigger that arrived between
+    its last check and the unlock is never stranded.
+    """
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    changed = False
+    with open(lock_path, "a") as lock:
+        while True:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                print("⏳ Another run is in progress; it will pick up this trigger.")
+                return changed
+            try:
+                changed = drain(tasks, quiet, max_delay) or changed
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+            if last_trigger() is None:
+                return changed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Debounced, single-instance runner for BibTeX maintenance (for Hazel)."
+    )
+    parser.add_argument(
+        "--tasks",
+        default=DEFAULT_TASKS,
+        help=f"Comma-separated tasks to run ({', '.join(TASKS)}). Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--quiet",
+        type=float,
+        default=QUIET_SECONDS,
+        help="Seconds without new triggers before running. Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--now", action="store_true", help="Run immediately, without waiting."
+    )
+    parser.add_argument(
+        "--history", type=int, metavar="N", help="Show the last N runs and exit."
+    )
+    args = parser.parse_args()
+
+    if args.history:
+        print_history(args.history)
+        sys.exit(0)
+
+    tasks = [t.strip() for t in args.tasks.split(",") if t.strip()]
+    unknown = [t for t in tasks if t not in TASKS]
+    if unknown:
+        parser.error(f"unknown task(s): {', '.join(unknown)}")
+
+    quiet = 0 if args.now else args.quiet
+    add_trigger()
+    # Exit 1 if the .bib file was changed, so the wrapper can notify.
+    sys.exit(1 if coordinate(tasks, quiet, MAX_DELAY_SECONDS) else 0)
@@ -0,0 +1,120 @@
+from collections import deque
+
+# Scores are scaled to integers so prices compare exactly.
+SCALE = 10**6
+
+# Each auction round shrinks the bid increment by this factor.
+EPSILON_FACTOR = 8
+
+
+def assign(edges, floor=0):
+    """One-to-one ``left → (right, score)`` maximising the total score.
+
+    ``edges`` are ``(left, right, score)`` candidates, a sparse graph such
+    as a blocking index produces; those below ``floor`` are dropped, and a
+    left may stay unassigned. Solved as an asymmetric assignment with
+    Bertsekas' auction: each left gets a private "unassigned" column worth
+    0, lefts bid for columns in rounds of shrinking increments, and a final
+    reverse auction lowers the price of columns left free. Costs are scaled
+    by the number of lefts so the last round, with an increment of 1, is
+    exactly optimal rather than merely close.
+    """
+    rows, cols, adjacency, scores = {}, {}, [], {}
+    for left, right, score in edges:
+        if score < floor:
+            continue
+        i = rows.setdefault(left, len(rows))
+        j = cols.setdefault(right, len(cols))
+        if i == len(adjacency):
+            adjacency.append([])
+        adjacency[i].append((j, round(score * SCALE)))
+        scores[i, j] = score
+    if not rows:
+        return {}
+
+    # Costs are top - weight, so all are >= 0; every row is assigned once,
+    # so the shift does not change the optimum. Column n_cols + i is row
+    # i's "unassigned" column, costing top.
+    n_rows, n_cols = len(rows), len(cols)
+    top = max(w for arcs in adjacency for _, w in arcs)
+    scale = n_rows + 1
+    costs = [
+        [(j, (top - w) * scale) for j, w in arcs] + [(n_cols + i, top * scale)]
+        for i, arcs in enumerate(adjacency)
+    ]
+    incoming = [[] for _ in range(n_cols + n_rows)]
+    for i, arcs in enumerate(costs):
+        for j, c in arcs:
+            incoming[j].append((i, c))
+    price = [0] * (n_cols + n_rows)
+    row4col = [-1] * (n_cols + n_rows)
+    col4row = [-1] * n_rows
+    held = [0] * n_rows  # cost of the arc each row holds
+
+    # === FORWARD AUCTION ===
+    # Every row ends within eps of its cheapest column (cost plus price).
+    eps = max(1, top * scale // EPSILON_FACTOR)
+    while True:
+        queue = deque()
+        for i, arcs in enumerate(costs):
+            j0 = col4row[i]
+            if j0 != -1:
+                h0 = held[i] + price[j0]
+                if all(h0 - c - price[j] <= eps for j, c in arcs):
+                    continue
+                row4col[j0] = col4row[i] = -1
+            queue.append(i)
+
+        while queue:
+            i = queue.popleft()
+            h1 = h2 = float("inf")
+            for j, c in costs[i]:
+                h = c + price[j]
+                if h < h2:
+                    if h < h1:
+                        h1, j1, c1, h2 = h, j, c, h1
+                    else:
+                        h2 = h
+            # Bid the column up until it is eps dearer than the runner-up.
+            price[j1] += h2 - h1 + eps
+            owner = row4col[j1]
+            col4row[i], row4col[j1], held[i] = j1, i, c1
+            if owner != -1:
+                col4row[owner] = -1
+                queue.append(owner)
+
+        if eps == 1:
+            break
+        eps = max(1, eps // EPSILON_FACTOR)
+
+    # === REVERSE AUCTION ===
+    # Free columns may not cost more than any taken one: a free column
+    # either drops to that floor or pulls its best row across, freeing the
+    # row's old column in turn.
+    lowest = min(price[j] for j in col4row)
+    stack = [j for j, i in enumerate(row4col) if i == -1 and price[j] > lowest]
+    while stack:
+        j = stack.pop()
+        b1 = b2 = -float("inf")
+        for i, c in incoming[j]:
+            b = held[i] + price[col4row[i]] - c
+            if b > b2:
+                if b > b1:
+                    b1, i1, c1, b2 = b, i, c, b1
+                else:
+                    b2 = b
+        if lowest >= b1 - 1:
+            price[j] = lowest
+            continue
+        price[j] = max(lowest, b2 - 1)
+        k = col4row[i1]
+        row4col[k] = -1
+        col4row[i1], row4col[j], held[i1] = j, i1, c1
+        if price[k] > lowest:
+            stack.append(k)
+
+    lefts = list(rows)
+    rights = list(cols)
+    return {
+        lefts[i]: (rights[j], scores[i, j]) for i, j in enumerate(col4row) if j < n_cols
+    }
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import pickle
+import sys
+import tempfile
+from collections import Counter, defaultdict, deque
+from pathlib import Path
+
+from bibtexparser.bibdatabase import BibDatabase
+from bibtexparser.bparser import BibTexParser
+from decouple import config
+
+from common.bib_parse_worker import parse_chunk
+from common.bib_spans import iter_spans
+from common.external import run_many
+
+# Bump when the cache layout changes so old pickles are ignored.
+CACHE_VERSION = 1
+CACHE_DIR = Path(config("CACHE_DIR", default="~/.cache/zotero_utils")).expanduser()
+
+# Above this many changed entries one whole-file parse beats many small ones.
+FULL_PARSE_THRESHOLD = 200
+
+# Large parses are split into chunks at entry boundaries and run in this many
+# processes (1 disables it). Each worker gets a few chunks to even out load.
+PARSE_WORKERS = config("BIB_PARSE_WORKERS", default=os.cpu_count() or 1, cast=int)
+CHUNKS_PER_WORKER = 4
+
+# Workers are fresh interpreters running this file, not forked or spawned
+# copies of the caller: the scripts have no __main__ guard, and forking is
+# unsafe on macOS once CoreFoundation has been loaded.
+WORKER = [sys.executable, str(Path(__file__).with_name("bib_parse_worker.py"))]
+
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def cache_path_for(bib_path, options=None, suffix=".bibcache.pickle"):
+    """Cache file for ``bib_path``; each set of parser options gets its own."""
+    bib_path = Path(bib_path).resolve()
+    name = hashlib.sha1(f"{bib_path}|{sorted((options or {}).items())}".encode("utf-8"))
+    return CACHE_DIR / f"{bib_path.stem}-{name.hexdigest()[:12]}{suffix}"
+
+
+def _parse(text, options):
+    return BibTexParser(**options).parse(text, partial=True)
+
+
+def _chunks(spans, count):
+    """Split ``spans`` into at most ``count`` contiguous runs of similar byte size."""
+    total = sum(s.end - s.start for _, s in spans)
+    target = max(1, total // count)
+    chunk, size = [], 0
+    for item in spans:
+        chunk.append(item)
+        size += item[1].end - item[1].start
+        if size >= target:
+            yield chunk
+            chunk, size = [], 0
+    if chunk:
+        yield chunk
+
+
+def _parse_parallel(data, strings_text, spans, options, workers):
+    """Parse ``spans`` of ``data`` in worker processes; return ``{digest: entries}``.
+
+    Every chunk is prefixed with the file's @string definitions so macros
+    still resolve. Chunks are merged back in file order; a chunk whose
+    worker failed is parsed here instead.
+    """
+    chunks = list(_chunks(spans, workers * CHUNKS_PER_WORKER))
+    texts = [
+        strings_text
+        + "\n"
+        + "\n".join(data[s.start : s.end].decode("utf-8") for _, s in chunk)
+        for chunk in chunks
+    ]
+    requests = [(WORKER, json.dumps({"text": t, "options": options})) for t in texts]
+    results = run_many(requests, max_workers=workers, timeout=None, retries=0)
+    parsed = {}
+    for chunk, text, result in zip(chunks, texts, results):
+        db = BibDatabase()
+        db.entries = (
+            json.loads(result.stdout) if result.ok else parse_chunk(text, options)
+        )
+        parsed.update(_distribute(db, chunk))
+    return parsed
+
+
+def _report_duplicates(spans):
+    counts = Counter(s.key for _, s in spans if s.key)
+    duplicates = sorted(key for key, n in counts.items() if n > 1)
+    if duplicates:
+        shown = ", ".join(duplicates[:10]) + (" ..." if len(duplicates) > 10 else "")
+        print(f"⚠ {len(duplicates)} duplicate citekeys in BibTeX: {shown}")
+
+
+def _read_cache(path):
+    try:
+        with open(path, "rb") as f:
+            cache = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+    return cache if cache.get("version") == CACHE_VERSION else None
+
+
+def _write_cache(path, cache):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=path.name, suffix=".tmp", dir=path.parent)
+    with os.fdopen(fd, "wb") as f:
+        pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_name, path)
+
+
+def _database(cache):
+    db = BibDatabase()
+    db.entries = [e for digest in cache["order"] for e in cache["spans"][digest]]
+    db.strings = cache["meta"]["strings"]
+    db.preambles = cache["meta"]["preambles"]
+    db.comments = cache["meta"]["comments"]
+    return db
+
+
+def _distribute(db, spans):
+    """Assign a whole-file parse back to entry spans by citekey, in file order."""
+    by_key = defaultdict(deque)
+    for entry in db.entries:
+        by_key[entry.get("ID")].append(entry)
+    parsed = {}
+    for digest, span in spans:
+        queue = by_key.get(span.key)
+        parsed[digest] = [queue.popleft()] if queue else []
+    return parsed
+
+
+def load_bib(bib_path, use_cache=True, **parser_options):
+    """Load ``bib_path`` like ``bibtexparser.load``, backed by a binary cache.
+
+    The cache is keyed on file size, mtime and content hash. When the file
+    changed, only entries whose text changed are re-parsed; all others are
+    reused. ``parser_options`` are passed to ``BibTexParser`` and are part
+    of the cache key. Returns a ``BibDatabase``.
+    """
+    bib_path = Path(bib_path)
+    options = dict(sorted(parser_options.items()))
+    st = os.stat(bib_path)
+    stamp = (st.st_size, st.st_mtime_ns)
+
+    path = cache_path_for(bib_path, options)
+    cache = _read_cache(path) if use_cache else None
+    if cache is not None and cache["options"] != options:
+        cache = None
+    if cache is not None and cache["stamp"] == stamp:
+        return _database(cache)
+
+    data = bib_path.read_bytes()
+    content_hash = _digest(data)
+    if cache is not None and cache["content_hash"] == content_hash:
+        cache["stamp"] = stamp
+        _write_cache(path, cache)
+        return _database(cache)
+
+    spans = list(iter_spans(data))
+    meta_text = b"\n".join(data[s.start : s.end] for s in spans if not s.is_entry)
+    strings_text = b"\n".join(
+        data[s.start : s.end] for s in spans if s.type == "string"
+    ).decode("utf-8")
+    meta_hash = _digest(meta_text)
+
+    old_spans = {}
+    if cache is not None and cache["meta_hash"] == meta_hash:
+        # @string changes can alter any entry, so only reuse spans otherwise.
+        old_spans = cache["spans"]
+
+    entry_spans = [(_digest(data[s.start : s.end]), s) for s in spans if s.is_entry]
+    missing = [(d, s) for d, s in entry_spans if d not in old_spans]
+
+    new_spans = {d: old_spans[d] for d, _ in entry_spans if d in old_spans}
+    workers = min(PARSE_WORKERS, len(missing) // FULL_PARSE_THRESHOLD)
+    _report_duplicates(entry_spans)
+    if workers > 1:
+        new_spans.update(_parse_parallel(data, strings_text, missing, options, workers))
+    elif len(missing) > FULL_PARSE_THRESHOLD:
+        new_spans.update(_distribute(_parse(data.decode("utf-8"), options), missing))
+    else:
+        for digest, span in missing:
+            text = data[span.start : span.end].decode("utf-8")
+            new_spans[digest] = _parse(strings_text + "\n" + text, options).entries
+
+    meta_db = _parse(meta_text.decode("utf-8"), options)
+    cache = {
+        "version": CACHE_VERSION,
+        "options": options,
+        "stamp": stamp,
+        "content_hash": content_hash,
+        "meta_hash": meta_hash,
+        "meta": {
+            "strings": meta_db.strings,
+            "preambles": meta_db.preambles,
+            "comments": meta_db.comments,
+        },
+        "order": [d for d, _ in entry_spans],
+        "spans": new_spans,
+    }
+    if use_cache:
+        _write_cache(path, cache)
+    if missing:
+        print(f"📚 Parsed {len(missing)} changed of {len(entry_spans)} BibTeX entries.")
+    return _database(cache)
+
+
+def load_entries(bib_path, **parser_options):
+    """Shortcut for ``load_bib(bib_path).entries``."""
+    return load_bib(bib_path, **parser_options).entries
@@ -0,0 +1,109 @@
+import mmap
+import os
+import pickle
+from pathlib import Path
+
+from bibtexparser.bparser import BibTexParser
+
+from common.bib_cache import _write_cache, cache_path_for
+from common.bib_spans import iter_spans
+
+INDEX_VERSION = 1
+
+
+def index_path_for(bib_path):
+    return cache_path_for(bib_path, suffix=".bibindex.pickle")
+
+
+class BibIndex:
+    """Citekey → byte span in a .bib file, with entries parsed on demand.
+
+    The offsets come from a lexical scan over an mmap of the file and are
+    persisted (keyed on size and mtime), so point lookups after the first
+    run cost one seek and one single-entry parse. Mapping-style access
+    (``index.get(key)``, ``key in index``) mirrors a ``{ID: entry}`` dict.
+    """
+
+    def __init__(self, bib_path, use_cache=True, **parser_options):
+        self.bib_path = Path(bib_path)
+        self.parser_options = parser_options
+        self._parsed = {}
+        st = os.stat(self.bib_path)
+        stamp = (st.st_size, st.st_mtime_ns)
+
+        path = index_path_for(self.bib_path)
+        cached = self._read(path) if use_cache else None
+        if cached is not None and cached["stamp"] == stamp:
+            self.offsets = cached["offsets"]
+            self.strings_text = cached["strings_text"]
+            return
+
+        self.offsets = {}
+        strings = []
+        if st.st_size:
+            with open(self.bib_path, "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    for span in iter_spans(data):
+                        if span.type == "string":
+                            strings.append(data[span.start : span.end])
+                        elif span.is_entry and span.key:
+                            # Later duplicates win, like {e["ID"]: e for e in entries}.
+                            self.offsets[span.key] = (span.start, span.end)
+        self.strings_text = b"\n".join(strings).decode("utf-8")
+        if use_cache:
+            _write_cache(
+                path,
+                {
+                    "version": INDEX_VERSION,
+                    "stamp": stamp,
+                    "offsets": self.offsets,
+                    "strings_text": self.strings_text,
+                },
+            )
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, "rb") as f:
+                cached = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        return cached if cached.get("version") == INDEX_VERSION else None
+
+    def __contains__(self, key):
+        return key in self.offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def keys(self):
+        return self.offsets.keys()
+
+    def span(self, key):
+        return self.offsets[key]
+
+    def raw(self, key):
+        """Return the entry's source text exactly as it appears in the file."""
+        start, end = self.offsets[key]
+        with open(self.bib_path, "rb") as f:
+            f.seek(start)
+            return f.read(end - start).decode("utf-8")
+
+    def get(self, key, default=None):
+        """Parse and return one entry (as bibtexparser would), or ``default``."""
+        if key not in self.offsets:
+            return default
+        if key not in self._parsed:
+            parser = BibTexParser(**self.parser_options)
+            db = parser.parse(self.strings_text + "\n" + self.raw(key), partial=True)
+            self._parsed[key] = next(
+                (e for e in db.entries if e.get("ID") == key), None
+            )
+        entry = self._parsed[key]
+        return default if entry is None else entry
+
+    def __getitem__(self, key):
+        entry = self.get(key)
+        if entry is None:
+            raise KeyError(key)
+        return entry
@@ -0,0 +1,260 @@
+import argparse
+import mmap
+import re
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from common.bib_rewrite import TYPE_REMAP, TypeChange, atomic_write, patch_types
+from common.bib_spans import iter_spans
+
+# The one list of entry types every script validates against (previously
+# bib_cleaner.py and check_nonstandard_types.py each had their own, and they
+# disagreed on inbook, proceedings and presentation).
+STANDARD_TYPES = {
+    "article",
+    "book",
+    "inbook",
+    "incollection",
+    "inproceedings",
+    "conference",
+    "manual",
+    "mastersthesis",
+    "phdthesis",
+    "misc",
+    "proceedings",
+    "techreport",
+    "unpublished",
+    "presentation",
+}
+
+# Characters that cannot appear in a PDF named after the citekey (see
+# pdf_matching/rename_pdfs_by_content.py).
+UNSAFE_KEY_CHARS = re.compile(r'[\/:*?"<>|]')
+
+# Severities, from least to most serious. "fix" findings are applied by
+# lint_file(fix=True); "error" findings cannot be fixed automatically.
+WARNING, FIX, ERROR = "warning", "fix", "error"
+
+_FIELD_NAME = re.compile(rb"\s*([A-Za-z][\w\-:.+]*)\s*=\s*")
+
+
+class Finding(NamedTuple):
+    key: str
+    rule: str
+    severity: str
+    message: str
+    value: Optional[str] = None  # the new type for fixes, the offending value otherwise
+
+
+class LintEntry:
+    """One entry as seen by the rules: header info plus lazily parsed fields."""
+
+    __slots__ = ("span", "raw", "type", "key", "_fields")
+
+    def __init__(self, span, raw):
+        self.span = span
+        self.raw = raw
+        self.type = span.type  # updated by fixing rules so later rules see it
+        self.key = span.key or ""
+        self._fields = None
+
+    @property
+    def fields(self):
+        if self._fields is None:
+            self._fields = parse_fields(self.raw)
+        return self._fields
+
+    def field(self, name):
+        return self.fields.get(name, "").strip('{}" \t\r\n')
+
+
+class LintResult(NamedTuple):
+    findings: List[Finding]
+    changes: List[TypeChange]
+    written: bool
+
+    def by_severity(self, severity):
+        return [f for f in self.findings if f.severity == severity]
+
+    @property
+    def exit_code(self):
+        """Hazel contract: 2 = unfixable problems, 1 = changes, 0 = clean."""
+        if self.by_severity(ERROR):
+            return 2
+        if self.changes or self.by_severity(FIX):
+            return 1
+        return 0
+
+
+def _value_end(raw, i):
+    """Return the index just past a field value starting at ``raw[i]``."""
+    n = len(raw)
+    depth = 0
+    quoted = False
+    while i < n:
+        c = raw[i]
+        if c == 0x7B:  # {
+            depth += 1
+        elif c == 0x7D:  # }
+            if depth == 0:
+                return i
+            depth -= 1
+        elif c == 0x22 and depth == 0:  # "
+            quoted = not quoted
+        elif c == 0x2C and depth == 0 and not quoted:  # ,
+            return i
+        i += 1
+    return i
+
+
+def parse_fields(raw):
+    """Map lowercase field names to their raw value text for one entry block.
+
+    Only top-level ``name = value`` pairs are read; braces and quotes inside
+    values are skipped over, so text like ``{year = 1999}`` in a title is not
+    mistaken for a field.
+    """
+    fields = {}
+    start = raw.find(b",")
+    if start < 0:
+        return fields
+    i = start + 1
+    while True:
+        m = _FIELD_NAME.match(raw, i)
+        if m is None:
+            break
+        end = _value_end(raw, m.end())
+        name = m.group(1).decode("ascii").lower()
+        fields[name] = raw[m.end() : end].strip().decode("utf-8", "replace")
+        if end >= len(raw) or raw[end] != 0x2C:
+            break
+        i = end + 1
+    return fields
+
+
+# === Rules ===
+# A rule takes a LintEntry and returns a list of findings. Register new ones
+# with @rule; they run in registration order on every entry.
+RULES: Dict[str, Callable[[LintEntry], List[Finding]]] = {}
+
+
+def rule(name):
+    def register(func):
+        RULES[name] = func
+        return func
+
+    return register
+
+
+@rule("type-remap")
+def check_type_remap(entry, remap=TYPE_REMAP):
+    new = remap.get(entry.type)
+    if new is None or new == entry.type:
+        return []
+    old, entry.type = entry.type, new
+    return [Finding(entry.key, "type-remap", FIX, f"Changing '{old}' → '{new}'", new)]
+
+
+@rule("nonstandard-type")
+def check_nonstandard_type(entry):
+    if entry.type in STANDARD_TYPES:
+        return []
+    return [
+        Finding(
+            entry.key,
+            "nonstandard-type",
+            ERROR,
+            f"Still non-standard: {entry.type}",
+            entry.type,
+        )
+    ]
+
+
+@rule("unsafe-citekey")
+def check_unsafe_citekey(entry):
+    # A warning, not an error: exit code 2 stays "non-standard types remain",
+    # which is what existing Hazel rules treat as a hard failure.
+    if entry.key and not UNSAFE_KEY_CHARS.search(entry.key):
+        return []
+    return [
+        Finding(
+            entry.key,
+            "unsafe-citekey",
+            WARNING,
+            f"Citekey unusable as a file name: {entry.key!r}",
+            entry.key,
+        )
+    ]
+
+
+@rule("missing-year")
+def check_missing_year(entry):
+    if entry.field("year") or entry.field("date"):
+        return []
+    return [Finding(entry.key, "missing-year", WARNING, "Missing year")]
+
+
+@rule("missing-title")
+def check_missing_title(entry):
+    if entry.field("title"):
+        return []
+    return [Finding(entry.key, "missing-title", WARNING, "Missing title")]
+
+
+def lint_file(bib_path, rules=None, fix=False):
+    """Run ``rules`` (names, default all) over every entry in one scan.
+
+    With ``fix=True`` the type-remap findings are written back by patching
+    only the affected ``@type`` headers; the file is untouched otherwise.
+    """
+    selected = [RULES[name] for name in (rules or RULES)]
+    bib_path = Path(bib_path)
+    findings = []
+    if bib_path.stat().st_size == 0:
+        return LintResult(findings, [], False)
+
+    with open(bib_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            spans = []
+            remap = {}
+            for span in iter_spans(data):
+                if not span.is_entry:
+                    continue
+                entry = LintEntry(span, data[span.start : span.end])
+                for check in selected:
+                    for finding in check(entry):
+                        findings.append(finding)
+                        if finding.severity == FIX:
+                            spans.append(span)
+                            remap[span.type] = finding.value
+            if not fix or not spans:
+                return LintResult(findings, [], False)
+            new_data, changes = patch_types(data, spans, remap)
+    atomic_write(bib_path, new_data)
+    return LintResult(findings, changes, True)
+
+
+def print_findings(findings):
+    icons = {WARNING: "⚠", FIX: "✏", ERROR: "❌"}
+    for f in findings:
+        print(f"{icons[f.severity]} [{f.key}] {f.message}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Lint a BibTeX file in one pass (exit 2 = errors, 1 = fixes, 0 = clean)."
+    )
+    parser.add_argument("bib_path", type=Path)
+    parser.add_argument("--fix", action="store_true", help="Apply type remaps.")
+    parser.add_argument(
+        "--rule",
+        action="append",
+        choices=sorted(RULES),
+        help="Only run this rule (repeatable).",
+    )
+    args = parser.parse_args()
+
+    result = lint_file(args.bib_path, args.rule, args.fix)
+    print_findings(result.findings)
+    sys.exit(result.exit_code)
@@ -0,0 +1,24 @@
+"""Parse one chunk of a .bib file for :func:`common.bib_cache.load_bib`.
+
+Run as a script: reads ``{"text": ..., "options": ...}`` as JSON on stdin and
+writes the parsed entries as JSON on stdout. It imports nothing from the
+calling script, so it works the same whatever the start method is.
+"""
+
+import json
+import sys
+
+from bibtexparser.bparser import BibTexParser
+
+
+def parse_chunk(text, options):
+    return BibTexParser(**options).parse(text, partial=True).entries
+
+
+def main():
+    request = json.load(sys.stdin)
+    json.dump(parse_chunk(request["text"], request["options"]), sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
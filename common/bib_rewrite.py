@@ -0,0 +1,54 @@
+import os
+import tempfile
+from pathlib import Path
+from typing import NamedTuple
+
+# Better BibTeX exports these biblatex types; BibTeX tools expect the right-hand side.
+TYPE_REMAP = {
+    "report": "techreport",
+    "thesis": "phdthesis",
+    "online": "misc",
+    "electronic": "misc",
+}
+
+
+class TypeChange(NamedTuple):
+    key: str
+    old: str
+    new: str
+
+
+def atomic_write(path, data):
+    """Replace ``path`` with ``data`` in one rename, keeping its permissions."""
+    path = Path(path)
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if path.exists():
+            os.chmod(tmp_name, path.stat().st_mode & 0o7777)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def patch_types(data, spans, remap):
+    """Return ``(new_data, changes)`` with only the ``@type`` words rewritten."""
+    pieces = []
+    changes = []
+    pos = 0
+    for span in spans:
+        new = remap.get(span.type)
+        if new is None or new == span.type:
+            continue
+        pieces.append(data[pos : span.type_start])
+        pieces.append(new.encode("ascii"))
+        pos = span.type_end
+        changes.append(TypeChange(span.key or "", span.type, new))
+    if not changes:
+        return data, changes
+    pieces.append(data[pos:])
+    return b"".join(pieces), changes
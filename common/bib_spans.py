@@ -0,0 +1,62 @@
+import re
+from typing import NamedTuple, Optional
+
+# "@" at the start of a line (after optional indentation) is a candidate
+# entry boundary; brace depth decides whether it really is top level.
+_CANDIDATE = re.compile(rb"^[ \t]*@", re.MULTILINE)
+_HEADER = re.compile(rb"@[ \t]*([A-Za-z]+)[ \t\r\n]*[{(][ \t\r\n]*([^,\s{}()]*)")
+
+META_TYPES = {"string", "preamble", "comment"}
+
+
+class Span(NamedTuple):
+    """Byte range of one top-level ``@type{...}`` block in a .bib file."""
+
+    start: int
+    end: int
+    type: str
+    key: Optional[str]
+    type_start: int
+    type_end: int
+
+    @property
+    def is_entry(self):
+        return self.type not in META_TYPES
+
+
+def iter_spans(data, start=0, end=None):
+    """Yield the top-level blocks of ``data`` (bytes, or an mmap) in order.
+
+    This is a lexical scan, not a parse: it only needs balanced braces, so
+    it is far cheaper than bibtexparser and gives exact byte offsets.
+    Text before the first block is skipped.
+    """
+    end = len(data) if end is None else end
+    starts = []
+    depth = 0
+    last = None
+    for m in _CANDIDATE.finditer(data, start, end):
+        at = m.end() - 1
+        if last is not None:
+            chunk = data[last:at]  # slicing also works on mmap, which has no count()
+            depth += chunk.count(b"{") - chunk.count(b"}")
+            if depth > 0:
+                last = at
+                continue
+        starts.append(at)
+        depth = 0
+        last = at
+    for i, at in enumerate(starts):
+        stop = starts[i + 1] if i + 1 < len(starts) else end
+        header = _HEADER.match(data, at, min(stop, at + 512))
+        if header is None:
+            continue
+        key = header.group(2).decode("utf-8", "replace") or None
+        yield Span(
+            at,
+            stop,
+            header.group(1).decode("ascii").lower(),
+            key,
+            header.start(1),
+            header.end(1),
+        )
@@ -0,0 +1,84 @@
+from collections import defaultdict
+
+from common.entry_table import ODD_YEAR, years_in
+
+
+class BlockIndex:
+    """Inverted index over an ``EntryTable`` for candidate selection.
+
+    Rows are posted under their first-author surname, their year (a year
+    that is not four digits under its text) and each title token, so a matcher only scores the entries that share a block
+    with a PDF instead of the whole bibliography. Row lists are in table
+    order, and so is everything returned, so "first match wins" loops give
+    the same answer as a full scan.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.by_surname = defaultdict(list)
+        self.by_year = defaultdict(list)
+        self.by_token = defaultdict(list)
+        for i, (surname, year, tokens) in enumerate(
+            zip(table.surnames, table.years, table.tokens)
+        ):
+            self.by_surname[surname].append(i)
+            if year == ODD_YEAR:
+                year = table.odd_years[i]
+            self.by_year[year].append(i)
+            for token in tokens:
+                self.by_token[token].append(i)
+        self._surname_lengths = sorted({len(s) for s in self.by_surname if s})
+        self._odd_years = [y for y in self.by_year if isinstance(y, str)]
+
+    def years_in(self, text):
+        """Year blocks whose year occurs in ``text``, the missing year included.
+
+        Matches ``EntryTable.year_in``: four-digit years by any four-digit
+        run, other years by their text.
+        """
+        return years_in(text) | {0} | {y for y in self._odd_years if y in text}
+
+    def surnames_in(self, text):
+        """Every indexed surname that occurs in ``text`` (plus ``""``, which always does)."""
+        found = {""}
+        by_surname = self.by_surname
+        n = len(text)
+        for length in self._surname_lengths:
+            if length > n:
+                break
+            for i in range(n - length + 1):
+                piece = text[i : i + length]
+                if piece in by_surname:
+                    found.add(piece)
+        return found
+
+    def rows_for(self, surnames=None, years=None, tokens=None):
+        """Sorted rows in every given block: surnames ∩ years ∩ any-of-tokens.
+
+        Each argument is an iterable of keys; ``None`` leaves that dimension
+        unconstrained.
+        """
+        result = None
+        for keys, index in (
+            (surnames, self.by_surname),
+            (years, self.by_year),
+            (tokens, self.by_token),
+        ):
+            if keys is None:
+                continue
+            rows = set()
+            for key in keys:
+                rows.update(index.get(key, ()))
+            result = rows if result is None else result & rows
+        if result is None:
+            return list(range(len(self.table)))
+        return sorted(result)
+
+    def rows_for_any(self, surnames=(), years=()):
+        """Sorted rows sharing a surname block or a year block."""
+        rows = set()
+        for surname in surnames:
+            rows.update(self.by_surname.get(surname, ()))
+        for year in years:
+            rows.update(self.by_year.get(year, ()))
+        return sorted(rows)
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+from pathlib import Path
+
+# Bump when the projection or table layout changes so stale indexes rebuild.
+SCHEMA_VERSION = 2
+
+
+def project_entry(entry):
+    """Keep only the CSL fields the note and hook scripts read."""
+    return {
+        "id": entry["id"],
+        "type": entry.get("type", ""),
+        "title": entry.get("title", ""),
+        "author": [
+            {"given": a.get("given", ""), "family": a.get("family", "")}
+            for a in entry.get("author", [])
+            if isinstance(a, dict)
+        ],
+        "issued": entry.get("issued", {}),
+        "DOI": entry.get("DOI", ""),
+    }
+
+
+def entry_hash(projected):
+    """Stable hash of a projected entry; changes only when note/link inputs do."""
+    blob = json.dumps(projected, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def index_path_for(json_path):
+    json_path = Path(json_path)
+    return json_path.with_name(json_path.name + ".index.sqlite")
+
+
+def _source_stamp(json_path):
+    st = os.stat(json_path)
+    return {
+        "schema": str(SCHEMA_VERSION),
+        "mtime_ns": str(st.st_mtime_ns),
+        "size": str(st.st_size),
+    }
+
+
+def _read_stamp(index_path):
+    try:
+        conn = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)
+    except sqlite3.Error:
+        return None
+    try:
+        return dict(conn.execute("SELECT name, value FROM meta"))
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
+
+def build_index(json_path, index_path=None):
+    """Parse the CSL JSON export once and write the projected entries to SQLite.
+
+    The index is written to a temporary file and swapped in with os.replace,
+    so concurrent readers never see a half-built database.
+    """
+    json_path = Path(json_path)
+    index_path = Path(index_path or index_path_for(json_path))
+    stamp = _source_stamp(json_path)
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    fd, tmp_name = tempfile.mkstemp(
+        prefix=index_path.name, suffix=".tmp", dir=index_path.parent
+    )
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(tmp_name)
+        try:
+            conn.execute("CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT)")
+            conn.execute(
+                "CREATE TABLE entries"
+                " (key_lc TEXT PRIMARY KEY, citekey TEXT, data TEXT, hash TEXT)"
+            )
+            rows = []
+            for e in data:
+                if "id" not in e:
+                    continue
+                projected = project_entry(e)
+                rows.append(
+                    (
+                        e["id"].lower(),
+                        e["id"],
+                        json.dumps(projected),
+                        entry_hash(projected),
+                    )
+                )
+            conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", rows)
+            conn.executemany("INSERT INTO meta VALUES (?, ?)", stamp.items())
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_name, index_path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    return index_path
+
+
+def ensure_index(json_path, index_path=None):
+    """Return the index path, rebuilding it if the export's mtime or size changed."""
+    json_path = Path(json_path)
+    index_path = Path(index_path or index_path_for(json_path))
+    if _read_stamp(index_path) != _source_stamp(json_path):
+        build_index(json_path, index_path)
+    return index_path
+
+
+# The readers below bring the index up to date first, unless they are handed
+# an ``index_path`` that ``ensure_index`` already returned.
+def get_entry(json_path, citekey, index_path=None):
+    """Look up one citekey case-insensitively.
+
+    Returns ``(canonical_citekey, entry)`` or ``(None, None)`` if not found.
+    """
+    index_path = index_path or ensure_index(json_path)
+    conn = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)
+    try:
+        row = conn.execute(
+            "SELECT citekey, data FROM entries WHERE key_lc = ?",
+            (citekey.lower(),),
+        ).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None, None
+    return row[0], json.loads(row[1])
+
+
+def load_entries(json_path, index_path=None, keys=None):
+    """Return ``{citekey: entry}`` in export order, for every entry or only ``keys``."""
+    index_path = index_path or ensure_index(json_path)
+    conn = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("SELECT citekey, data FROM entries ORDER BY rowid")
+        if keys is None:
+            return {citekey: json.loads(data) for citekey, data in rows}
+        keys = set(keys)
+        return {citekey: json.loads(data) for citekey, data in rows if citekey in keys}
+    finally:
+        conn.close()
+
+
+def load_entry_hashes(json_path, index_path=None):
+    """Return ``{citekey: entry_hash}`` without decoding any entry."""
+    index_path = index_path or ensure_index(json_path)
+    conn = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)
+    try:
+        return dict(conn.execute("SELECT citekey, hash FROM entries ORDER BY rowid"))
+    finally:
+        conn.close()
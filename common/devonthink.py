@@ -0,0 +1,266 @@
+import argparse
+import json
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional, Sequence
+
+from decouple import config
+
+from common.external import TIMEOUT, run_command, run_many
+
+# Overridable so the batch resolver can run against a stand-in on Linux.
+OSASCRIPT = config("OSASCRIPT_PATH", default="osascript")
+# A batch that times out resolves nothing, so batches stay small, and each
+# gets QUERY_TIMEOUT seconds per query on top of the usual call timeout.
+BATCH_SIZE = 25
+QUERY_TIMEOUT = config("DEVONTHINK_QUERY_TIMEOUT", default=1, cast=float)
+
+# Cached hits rarely go stale; misses are retried sooner so newly indexed
+# PDFs get picked up.
+HIT_TTL = config("DEVONTHINK_HIT_TTL_DAYS", default=30, cast=float) * 86400
+MISS_TTL = config("DEVONTHINK_MISS_TTL_HOURS", default=24, cast=float) * 3600
+
+SCRIPT_TEMPLATE = """
+on firstMatch(theQuery, wantMarkdown)
+    tell application id "DNtp"
+        set theRecords to search theQuery
+        repeat with theRecord in theRecords
+            set theType to type of theRecord as string
+            if (theType is "markdown") is wantMarkdown then
+                return reference URL of theRecord
+            end if
+        end repeat
+    end tell
+    return ""
+end firstMatch
+
+set theChains to {chains}
+set theKinds to {kinds}
+set output to "{"
+repeat with i from 1 to count of theChains
+    set found to ""
+    set foundAt to 0
+    repeat with j from 1 to count of item i of theChains
+        try
+            set found to my firstMatch(item j of item i of theChains, item i of theKinds)
+        end try
+        if found is not "" then
+            set foundAt to j
+            exit repeat
+        end if
+    end repeat
+    if i > 1 then set output to output & ","
+    set output to output & "\\"" & (i - 1) & "\\":[" & foundAt & ",\\"" & found & "\\"]"
+end repeat
+return output & "}"
+"""
+
+
+class Search(NamedTuple):
+    """Queries tried in order until one finds a record of the wanted kind."""
+
+    queries: Sequence[str]
+    markdown: bool = False
+    citekey: Optional[str] = None
+
+
+def applescript_string(text):
+    text = re.sub(r"\s+", " ", str(text)).strip()
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def normalize_term(text):
+    return re.sub(r"\s+", " ", str(text)).strip().lower()
+
+
+def entry_search_terms(entry, citekey):
+    """Primary author+title query followed by the citekey fallback."""
+    authors = entry.get("author", [])
+    full_author = " ".join(
+        f"{a.get('given','')} {a.get('family','')}".strip()
+        for a in authors
+        if isinstance(a, dict)
+    ).strip()
+    primary = re.sub(r"\s+", " ", f"{full_author} {entry.get('title', '')}").strip()
+    return [q for q in (primary, citekey) if q]
+
+
+def build_script(chains):
+    """AppleScript for ``[(queries, want_markdown), ...]`` returning a JSON object
+    that maps each chain's index to ``[1-based query index or 0, reference URL]``."""
+    chain_list = ", ".join(
+        "{" + ", ".join(applescript_string(q) for q in queries) + "}"
+        for queries, _ in chains
+    )
+    kind_list = ", ".join("true" if md else "false" for _, md in chains)
+    return SCRIPT_TEMPLATE.replace("{chains}", "{" + chain_list + "}").replace(
+        "{kinds}", "{" + kind_list + "}"
+    )
+
+
+def _parse_batch(result, size):
+    try:
+        if not result.ok:
+            raise ValueError(result.error or result.stderr.strip())
+        found = json.loads(result.stdout.strip() or "{}")
+    except ValueError as e:
+        print(f"⚠️ DEVONthink batch search error: {e}")
+        return [None] * size
+    return [found.get(str(i), [0, ""]) for i in range(size)]
+
+
+def batch_timeout(query_count):
+    """Seconds a batch of ``query_count`` searches may take."""
+    return TIMEOUT + QUERY_TIMEOUT * query_count
+
+
+def run_applescript(script):
+    """Run a one-off AppleScript through the shared executor."""
+    return run_command([OSASCRIPT], input=script)
+
+
+# === Persistent lookup cache ===
+class LookupCache:
+    """Normalized search term → reference URL, including cached misses.
+
+    Lives in its own table so it can share the link store's SQLite file.
+    """
+
+    def __init__(self, db_path, hit_ttl=HIT_TTL, miss_ttl=MISS_TTL, timeout=30.0):
+        self.hit_ttl = hit_ttl
+        self.miss_ttl = miss_ttl
+        self.conn = sqlite3.connect(str(db_path), timeout=timeout)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS devonthink_lookups (
+                term TEXT NOT NULL,
+                markdown INTEGER NOT NULL,
+                url TEXT,
+                citekey TEXT,
+                checked_at REAL NOT NULL,
+                PRIMARY KEY (term, markdown)
+            )
+            """)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS devonthink_lookups_citekey"
+            " ON devonthink_lookups (citekey)"
+        )
+
+    def close(self):
+        self.conn.close()
+
+    def get(self, query, markdown):
+        """Return ``(hit, url)``: ``(False, None)`` when unknown or expired."""
+        row = self.conn.execute(
+            "SELECT url, checked_at FROM devonthink_lookups"
+            " WHERE term = ? AND markdown = ?",
+            (normalize_term(query), int(markdown)),
+        ).fetchone()
+        if row is None:
+            return False, None
+        url, checked_at = row
+        ttl = self.hit_ttl if url else self.miss_ttl
+        if time.time() - checked_at > ttl:
+            return False, None
+        return True, url
+
+    def put_many(self, rows):
+        """Store ``(query, markdown, url_or_None, citekey)`` rows."""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO devonthink_lookups VALUES (?, ?, ?, ?, ?)",
+                (
+                    (normalize_term(q), int(md), url, citekey, now)
+                    for q, md, url, citekey in rows
+                ),
+            )
+
+    def invalidate(self, citekey):
+        with self.conn:
+            cur = self.conn.execute(
+                "DELETE FROM devonthink_lookups WHERE citekey = ? OR term = ?",
+                (citekey, normalize_term(citekey)),
+            )
+        return cur.rowcount
+
+
+def resolve_links(requests, cache=None, refresh=False, batch_size=BATCH_SIZE):
+    """Resolve many DEVONthink searches with one osascript call per batch.
+
+    ``requests`` maps a caller-chosen key to a :class:`Search` (or a plain
+    ``(queries, markdown)`` tuple). With a ``cache``, known answers are
+    reused and only the still-unknown part of each chain is sent to
+    DEVONthink; ``refresh=True`` ignores cached answers but stores new ones.
+    Returns ``{key: "x-devonthink-item://..." or None}``.
+    """
+    links = {}
+    pending = {}
+    for key, search in requests.items():
+        search = Search(*search)
+        links[key] = None
+        remaining = []
+        for query in search.queries:
+            if cache is None or refresh:
+                remaining.append(query)
+                continue
+            hit, url = cache.get(query, search.markdown)
+            if not hit:
+                remaining.append(query)
+            elif url:
+                # A cached hit ends the chain; earlier unknown queries are
+                # still asked, and the cached URL is the fallback.
+                links[key] = url
+                break
+        if remaining:
+            pending[key] = search._replace(queries=remaining)
+
+    keys = list(pending)
+    batches = [keys[i : i + batch_size] for i in range(0, len(keys), batch_size)]
+    commands = [
+        (
+            [OSASCRIPT],
+            build_script([(pending[k].queries, pending[k].markdown) for k in batch]),
+            batch_timeout(sum(len(pending[k].queries) for k in batch)),
+        )
+        for batch in batches
+    ]
+    # Batches run concurrently (bounded by the shared executor); results are
+    # collected in order and cached from this thread.
+    outputs = run_many(commands)
+    learned = []
+    for batch, output in zip(batches, outputs):
+        for key, result in zip(batch, _parse_batch(output, len(batch))):
+            if result is None:
+                continue  # osascript failed; cache nothing
+            search = pending[key]
+            found_at, url = result
+            url = url if url.startswith("x-devonthink-item://") else None
+            found_at = found_at if url else len(search.queries) + 1
+            for i, query in enumerate(search.queries[:found_at], start=1):
+                hit_url = url if i == found_at else None
+                learned.append((query, search.markdown, hit_url, search.citekey))
+            links[key] = url or links[key]
+    if cache is not None:
+        cache.put_many(learned)
+    return links
+
+
+def find_link(queries, markdown=False, cache=None, refresh=False):
+    return resolve_links({0: Search(queries, markdown)}, cache, refresh)[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Invalidate cached DEVONthink lookups for citation keys."
+    )
+    parser.add_argument("db_path", type=Path, help="Link store SQLite file.")
+    parser.add_argument("citekeys", nargs="+")
+    args = parser.parse_args()
+
+    cache = LookupCache(args.db_path)
+    for citekey in args.citekeys:
+        print(f"🧹 {citekey}: {cache.invalidate(citekey)} cached lookups removed.")
+    cache.close()
@@ -0,0 +1,220 @@
+import hashlib
+import os
+import pickle
+import re
+import sys
+from array import array
+from pathlib import Path
+
+from common.bib_cache import _write_cache, cache_path_for, load_bib
+from common.identifiers import entry_identifiers
+from common.tex_decode import decode, fold
+
+# Bump when the columns or their normalisation change.
+TABLE_VERSION = 4
+
+# Title words kept per entry; every matcher looks at six or fewer.
+MAX_TITLE_WORDS = 8
+
+_NON_WORD = re.compile(r"\W+")
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_YEAR = re.compile(r"\d{4}")
+
+# Stored for years that are present but not four digits ("forthcoming"); the
+# text itself is kept in ``EntryTable.odd_years`` and matched as written.
+ODD_YEAR = 0xFFFF
+
+
+def squash(text):
+    """ASCII-fold, lowercase and drop everything but word characters."""
+    return _NON_WORD.sub("", fold(text).lower())
+
+
+def spaced(text):
+    """ASCII-folded, lowercase alphanumerics separated by single spaces."""
+    return _NON_ALNUM.sub(" ", fold(text).lower()).strip()
+
+
+def years_in(text):
+    """Every four-digit run in ``text`` as an int, for ``year in ...`` tests."""
+    return {
+        int(text[i : i + 4]) for i in range(len(text) - 3) if text[i : i + 4].isdigit()
+    }
+
+
+def first_surname(author):
+    return author.split(" and ")[0].split(",")[0].strip()
+
+
+def table_path_for(bib_path):
+    return cache_path_for(bib_path, suffix=".entrytable.pickle")
+
+
+class EntryTable:
+    """BibTeX entries as parallel columns of pre-normalised match fields.
+
+    Row ``i`` of every column describes the same entry, in file order:
+
+    - ``keys``: citekey
+    - ``years``: year as an int (0 when missing, ``ODD_YEAR`` when not
+      four digits; the text is then kept in ``odd_years``)
+    - ``surnames``: squashed first-author surname, interned
+    - ``written_surnames``: the same surname folded and lowercased, spaces
+      and hyphens kept ("van der berg", "smith-jones")
+    - ``words``: squashed title words (first ``MAX_TITLE_WORDS``), interned
+    - ``head_lens``: how many of those words precede the first colon
+    - ``titles``: the whole title, ``spaced``
+    - ``tokens``: the set of ``spaced`` title words
+    - ``identifiers``: ``doi:...`` / ``arxiv:...`` IDs from DOI, eprint and URL
+
+    Author and title are TeX-decoded (``{\\"o}`` → ``ö``) and ASCII-folded
+    (→ ``o``) first, so they compare equal to Unicode file names once those
+    are folded too. Built once per .bib version and cached, so matchers skip
+    the parse, the decoding and the per-run normalisation.
+    """
+
+    __slots__ = (
+        "keys",
+        "years",
+        "odd_years",
+        "surnames",
+        "written_surnames",
+        "words",
+        "head_lens",
+        "titles",
+        "tokens",
+        "identifiers",
+        "_rows",
+    )
+
+    def __init__(self):
+        self.keys = []
+        self.years = array("H")
+        self.odd_years = {}
+        self.surnames = []
+        self.written_surnames = []
+        self.words = []
+        self.head_lens = array("B")
+        self.titles = []
+        self.tokens = []
+        self.identifiers = []
+        self._rows = None
+
+    @classmethod
+    def from_entries(cls, entries):
+        table = cls()
+        intern = sys.intern
+        for entry in entries:
+            title = decode(entry.get("title", "")).strip()
+            year = entry.get("year", "").strip()
+            words = tuple(intern(squash(w)) for w in title.split()[:MAX_TITLE_WORDS])
+            head = title.split(":")[0].split()[:MAX_TITLE_WORDS]
+            title_spaced = spaced(title)
+
+            table.keys.append(entry.get("ID", "").strip())
+            if not year or _YEAR.fullmatch(year):
+                table.years.append(int(year or 0))
+            else:
+                table.odd_years[len(table.years)] = year
+                table.years.append(ODD_YEAR)
+            surname = first_surname(decode(entry.get("author", "")))
+            table.surnames.append(intern(squash(surname)))
+            table.written_surnames.append(fold(surname).lower())
+            table.words.append(words)
+            table.head_lens.append(len(head))
+            table.titles.append(title_spaced)
+            table.tokens.append(frozenset(intern(t) for t in title_spaced.split()))
+            table.identifiers.append(tuple(entry_identifiers(entry)))
+        return table
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__[:-1]}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._rows = None
+
+    def row(self, key):
+        """Row number for ``key`` (the last one if duplicated), or ``None``."""
+        if self._rows is None:
+            self._rows = {k: i for i, k in enumerate(self.keys)}
+        return self._rows.get(key)
+
+    def year_text(self, i):
+        year = self.years[i]
+        if year == ODD_YEAR:
+            return self.odd_years[i]
+        return str(year) if year else ""
+
+    def year_in(self, i, text):
+        """True if row ``i``'s year, as written, occurs in ``text``.
+
+        A missing year always does, and one that is not four digits
+        ("forthcoming") only when that exact text is in ``text``.
+        """
+        return self.year_text(i) in text
+
+    def prefix(self, i, n, before_colon=True):
+        """The first ``n`` title words, squashed and joined (optionally only up to a colon)."""
+        words = self.words[i]
+        if before_colon:
+            n = min(n, self.head_lens[i])
+        return "".join(words[:n])
+
+    def prefixes(self, n, before_colon=True):
+        return [self.prefix(i, n, before_colon) for i in range(len(self.keys))]
+
+    def fallback_patterns(self, i):
+        """Stem substrings of ``surname_year[_three title words]`` PDF names.
+
+        What the citekey linkers look for when ``<citekey>.pdf`` is missing;
+        meant for stems that are folded and lowercased but not squashed.
+        """
+        author = self.written_surnames[i]
+        year = self.year_text(i)
+        title_words = self.titles[i].split()
+        return [
+            f"{author}_{year}",
+            f"{author}{year}",
+            f"{author}_{year}_{'_'.join(title_words[:3])}",
+        ]
+
+    def fingerprints(self):
+        """An 8-byte digest of every row's columns, to key cached per-entry results."""
+        digests = []
+        for i, key in enumerate(self.keys):
+            row = (key, self.year_text(i), self.surnames[i], self.words[i])
+            row += (self.head_lens[i], self.titles[i])
+            digests.append(
+                hashlib.blake2b(repr(row).encode("utf-8"), digest_size=8).digest()
+            )
+        return digests
+
+    def title_lookup(self, skip_empty=True):
+        """``spaced`` title → citekey; later entries win, as with a dict comprehension."""
+        return {t: k for t, k in zip(self.titles, self.keys) if t or not skip_empty}
+
+
+def load_entry_table(bib_path, use_cache=True):
+    """Load the ``EntryTable`` for ``bib_path``, rebuilding it only when the file changed."""
+    bib_path = Path(bib_path)
+    st = os.stat(bib_path)
+    stamp = (st.st_size, st.st_mtime_ns)
+    path = table_path_for(bib_path)
+    if use_cache:
+        try:
+            with open(path, "rb") as f:
+                cached = pickle.load(f)
+            if cached["version"] == TABLE_VERSION and cached["stamp"] == stamp:
+                return cached["table"]
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, KeyError):
+            pass
+
+    table = EntryTable.from_entries(load_bib(bib_path, use_cache).entries)
+    if use_cache:
+        _write_cache(path, {"version": TABLE_VERSION, "stamp": stamp, "table": table})
+    return table
@@ -0,0 +1,70 @@
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional, Sequence
+
+from decouple import config
+
+# Defaults for calls to hook/osascript; DEVONthink and Hookmark get slow
+# or drop requests when flooded, so concurrency stays small.
+MAX_WORKERS = config("EXTERNAL_CONCURRENCY", default=4, cast=int)
+TIMEOUT = config("EXTERNAL_TIMEOUT", default=60, cast=float)
+RETRIES = config("EXTERNAL_RETRIES", default=1, cast=int)
+
+
+class CommandResult(NamedTuple):
+    args: Sequence[str]
+    returncode: Optional[int]
+    stdout: str = ""
+    stderr: str = ""
+    error: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+
+def run_command(args, input=None, timeout=TIMEOUT, retries=RETRIES, backoff=1.0):
+    """Run one external command with a timeout, retrying on failure.
+
+    Timeouts are not retried. Never raises for timeouts, missing executables or non-zero exits;
+    the last attempt's outcome is returned as a :class:`CommandResult`.
+    """
+    args = [str(a) for a in args]
+    result = None
+    for attempt in range(retries + 1):
+        try:
+            proc = subprocess.run(
+                args, input=input, capture_output=True, text=True, timeout=timeout
+            )
+            result = CommandResult(args, proc.returncode, proc.stdout, proc.stderr)
+        except subprocess.TimeoutExpired:
+            # A call that hung would most likely hang as long again.
+            return CommandResult(args, None, error=f"timed out after {timeout}s")
+        except OSError as e:
+            # A missing executable will not appear on retry.
+            return CommandResult(args, None, error=str(e))
+        if result.ok:
+            return result
+        if attempt < retries:
+            time.sleep(backoff * 2**attempt)
+    return result
+
+
+def run_many(commands, max_workers=MAX_WORKERS, **kwargs):
+    """Run ``commands`` (argument lists, ``(args, input)`` pairs or
+    ``(args, input, timeout)`` triples) with at most ``max_workers`` in
+    flight. Results come back in input order."""
+    commands = [c if isinstance(c, tuple) else (c, None) for c in commands]
+
+    def run(command):
+        args, input, *timeout = command
+        options = dict(kwargs, timeout=timeout[0]) if timeout else kwargs
+        return run_command(args, input, **options)
+
+    if not commands:
+        return []
+    if max_workers <= 1 or len(commands) == 1:
+        return [run(c) for c in commands]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(run, commands))
@@ -0,0 +1,48 @@
+import numpy as np
+from rapidfuzz import fuzz, process
+
+# Query rows scored per cdist call; bounds the score matrix to about
+# BATCH_ROWS × len(choices) float64s (float64 keeps scores identical to
+# calling the scorer directly).
+BATCH_ROWS = 256
+
+
+def top_matches(
+    queries,
+    choices,
+    k=1,
+    score_cutoff=0,
+    scorer=fuzz.partial_ratio,
+    batch_size=BATCH_ROWS,
+    workers=-1,
+):
+    """Best ``k`` choices for every query, as ``[(choice_index, score), ...]``.
+
+    Queries are scored against all choices in batches with
+    ``rapidfuzz.process.cdist`` on all cores. Scores below ``score_cutoff``
+    are dropped. Within a query, equal scores keep choice order, so the first
+    entry is what a ``score > best`` loop over ``choices`` would pick.
+    Both sides should already be normalised.
+    """
+    results = []
+    if not choices:
+        return [[] for _ in queries]
+    for start in range(0, len(queries), batch_size):
+        batch = queries[start : start + batch_size]
+        scores = process.cdist(
+            batch,
+            choices,
+            scorer=scorer,
+            score_cutoff=score_cutoff,
+            dtype=np.float64,
+            workers=workers,
+        )
+        for row in scores:
+            hits = (
+                np.flatnonzero(row >= score_cutoff)
+                if score_cutoff
+                else np.arange(len(row))
+            )
+            order = hits[np.argsort(-row[hits], kind="stable")][:k]
+            results.append([(int(i), float(row[i])) for i in order])
+    return results
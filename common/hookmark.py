@@ -0,0 +1,88 @@
+import sqlite3
+import time
+
+from decouple import config
+
+from common.external import run_many
+
+HOOK_PATH = config("HOOK_PATH", default="hook")
+
+
+class HookLedger:
+    """(source URI, target URI) pairs already linked successfully in Hookmark.
+
+    Hookmark links are bidirectional, so pairs are stored in sorted order.
+    Lives in its own table so it can share the link store's SQLite file.
+    """
+
+    def __init__(self, db_path, timeout=30.0):
+        self.conn = sqlite3.connect(str(db_path), timeout=timeout)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS hook_ledger (
+                uri_a TEXT NOT NULL,
+                uri_b TEXT NOT NULL,
+                linked_at REAL NOT NULL,
+                PRIMARY KEY (uri_a, uri_b)
+            )
+            """)
+
+    def close(self):
+        self.conn.close()
+
+    def __contains__(self, pair):
+        row = self.conn.execute(
+            "SELECT 1 FROM hook_ledger WHERE uri_a = ? AND uri_b = ?",
+            tuple(sorted(pair)),
+        ).fetchone()
+        return row is not None
+
+    def add(self, a, b):
+        self.add_many([(a, b)])
+
+    def add_many(self, pairs):
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO hook_ledger VALUES (?, ?, ?)",
+                ((*sorted(pair), now) for pair in pairs),
+            )
+
+    def forget(self, uri):
+        """Drop every recorded link touching ``uri``."""
+        with self.conn:
+            cur = self.conn.execute(
+                "DELETE FROM hook_ledger WHERE uri_a = ? OR uri_b = ?", (uri, uri)
+            )
+        return cur.rowcount
+
+
+def hook_link_many(pairs, ledger=None, hook_path=HOOK_PATH):
+    """Run ``hook link a b`` for each pair the ledger does not already have.
+
+    Calls run concurrently through the shared executor. Returns one bool
+    per pair, in order: True if a link was created, False if it was
+    skipped or failed. Only successful calls are recorded.
+    """
+    todo = [
+        (i, a, b)
+        for i, (a, b) in enumerate(pairs)
+        if ledger is None or (a, b) not in ledger
+    ]
+    results = run_many([[hook_path, "link", a, b] for _, a, b in todo])
+    created = [False] * len(pairs)
+    done = []
+    for (i, a, b), result in zip(todo, results):
+        if result.ok:
+            created[i] = True
+            done.append((a, b))
+        else:
+            reason = result.error or f"exit {result.returncode}"
+            print(f"⚠️ hook link failed ({reason}): {a} ⇄ {b}")
+    if ledger is not None:
+        ledger.add_many(done)
+    return created
+
+
+def hook_link(a, b, ledger=None, hook_path=HOOK_PATH):
+    return hook_link_many([(a, b)], ledger, hook_path)[0]
@@ -0,0 +1,114 @@
+import re
+import zlib
+
+from decouple import config
+
+# A PDF's metadata is looked for in its first SCAN_HEAD_BYTES (XMP in most
+# files) and last SCAN_TAIL_BYTES (Info dictionary, trailing XMP). At most
+# MAX_STREAMS Flate streams in the head are inflated, each to INFLATE_LIMIT,
+# for Info and link annotations kept in compressed object streams.
+SCAN_HEAD_BYTES = config("PDF_ID_SCAN_BYTES", default=1 << 20, cast=int)
+SCAN_TAIL_BYTES = 1 << 18
+MAX_STREAMS = 64
+INFLATE_LIMIT = 1 << 18
+
+# A DOI suffix may hold balanced parentheses, "10.1016/S0140-6736(20)30183-5",
+# and, in SICIs, balanced angle brackets, "49:8<693::AID-ASI4>3.0.CO;2-O".
+# An unbalanced ")" is the text around the DOI closing, not part of it.
+_DOI_CHAR = r"[^\s\"'<>(){}\[\]\\]"
+_DOI = re.compile(
+    rf"\b10\.\d{{4,9}}/(?:{_DOI_CHAR}|\({_DOI_CHAR}*\)|<[^\s\"'<>/\\]*>)+"
+)
+_ARXIV = re.compile(
+    r"arxiv(?:\.org)?[:\s./]*(?:abs/|pdf/)?"
+    r"(\d{4}\.\d{4,5}|[a-z][a-z\-]+(?:\.[a-z]{2})?/\d{7})",
+    re.IGNORECASE,
+)
+_FLATE = re.compile(rb"/FlateDecode[^>]*>>\s*stream\r?\n")
+# Places that describe the file itself rather than what it cites: the XMP
+# packet, and Info or link-annotation strings.
+_METADATA = re.compile(
+    rb"<x:xa?mpmeta.*?</x:xa?mpmeta>"
+    rb"|/(?:URI|doi|DOI|Subject|Keywords|Identifier)\s*\((?:[^()\\]|\\.)*\)",
+    re.DOTALL,
+)
+
+
+def identifiers_in(text):
+    """``doi:...`` and ``arxiv:...`` identifiers in ``text``, in order of appearance."""
+    found = {}
+    for m in _DOI.finditer(text):
+        doi = m.group(0).rstrip(".,;:").lower()
+        found[m.start(), "doi:" + doi] = None
+        if doi.startswith("10.48550/arxiv."):
+            found[m.start(), "arxiv:" + doi[len("10.48550/arxiv.") :]] = None
+    for m in _ARXIV.finditer(text):
+        found[m.start(), "arxiv:" + m.group(1).lower()] = None
+    return list(dict.fromkeys(ident for _, ident in sorted(found)))
+
+
+def entry_identifiers(entry):
+    """Identifiers of a BibTeX entry, from ``doi``, ``eprint``, ``url`` and notes."""
+    fields = [entry.get(name, "") for name in ("doi", "url", "journal", "note")]
+    eprint = entry.get("eprint", "").strip()
+    prefix = (entry.get("archiveprefix") or entry.get("eprinttype") or "").lower()
+    if eprint and prefix == "arxiv":
+        fields.append(f"arXiv:{eprint}")
+    return identifiers_in(" ".join(fields))
+
+
+def _inflated(data):
+    """The first ``MAX_STREAMS`` Flate streams in ``data``, inflated."""
+    for n, m in enumerate(_FLATE.finditer(data)):
+        if n == MAX_STREAMS:
+            break
+        try:
+            yield zlib.decompressobj().decompress(data[m.end() :], INFLATE_LIMIT)
+        except zlib.error:
+            continue
+
+
+def scan_metadata(path):
+    """IDs in the XMP packet, Info dictionary and link annotations of ``path``.
+
+    Only the first ``SCAN_HEAD_BYTES`` and last ``SCAN_TAIL_BYTES`` are
+    read, so this stays cheap next to any text extraction. These IDs
+    describe the file itself.
+    """
+    with open(path, "rb") as f:
+        head = f.read(SCAN_HEAD_BYTES)
+        f.seek(0, 2)
+        size = f.tell()
+        tail = b""
+        if size > len(head):
+            f.seek(max(len(head), size - SCAN_TAIL_BYTES))
+            tail = f.read()
+    places = [head, tail, *_inflated(head)]
+    metadata = [
+        i
+        for data in places
+        for m in _METADATA.finditer(data)
+        for i in identifiers_in(m.group(0).decode("latin-1"))
+    ]
+    return list(dict.fromkeys(metadata))
+
+
+def page_text(path, state=None):
+    """Text of the first page of ``path``, as pdfminer extracts it.
+
+    With a cascade ``state`` dict, the text (or the error) is kept in
+    ``state["page_text"]``, so each stage that reads page one shares a
+    single extraction.
+    """
+    from pdfminer.high_level import extract_text
+
+    if state is None:
+        return extract_text(path, maxpages=1)
+    if "page_text" not in state:
+        try:
+            state["page_text"] = extract_text(path, maxpages=1)
+        except Exception as e:
+            state["page_text"] = e
+    if isinstance(state["page_text"], Exception):
+        raise state["page_text"]
+    return state["page_text"]
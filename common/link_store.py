@@ -0,0 +1,234 @@
+import argparse
+import csv
+import hashlib
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+COLUMNS = ["CitationKey", "Note_Link", "DEVONthink_Link"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS links (
+    CitationKey TEXT PRIMARY KEY,
+    Note_Link TEXT,
+    DEVONthink_Link TEXT
+);
+CREATE TABLE IF NOT EXISTS entry_state (
+    CitationKey TEXT PRIMARY KEY,
+    entry_hash TEXT,
+    link_hash TEXT,
+    status TEXT,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _clean(value):
+    # linked_items.csv used empty cells (NaN in pandas) for "no link yet".
+    if value is None or value != value or value == "":
+        return None
+    return str(value)
+
+
+class LinkStore:
+    """Citekey → note/DEVONthink links, backed by SQLite.
+
+    WAL mode and a busy timeout let Alfred calls and batch runs share the
+    database; each write is its own short transaction.
+    """
+
+    def __init__(self, db_path, timeout=30.0):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(
+            str(self.db_path), timeout=timeout, isolation_level=None
+        )
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent writers
+        # queue on the busy timeout instead of failing mid-transaction.
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    # === Reads ===
+    def get(self, citekey):
+        row = self.conn.execute(
+            "SELECT * FROM links WHERE CitationKey = ?", (citekey,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def all(self):
+        rows = self.conn.execute("SELECT * FROM links ORDER BY rowid")
+        return {row["CitationKey"]: dict(row) for row in rows}
+
+    def __contains__(self, citekey):
+        return self.get(citekey) is not None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM links").fetchone()[0]
+
+    # === Writes ===
+    def upsert(self, citekey, note_link, devonthink_link):
+        self.upsert_many([(citekey, note_link, devonthink_link)])
+
+    def upsert_many(self, rows):
+        """Insert or replace ``(citekey, note_link, devonthink_link)`` rows in one transaction."""
+        with self.transaction():
+            self._upsert(rows)
+
+    def _upsert(self, rows):
+        rows = [(key, _clean(note), _clean(dt)) for key, note, dt in rows]
+        self.conn.executemany(
+            """
+            INSERT INTO links (CitationKey, Note_Link, DEVONthink_Link)
+            VALUES (?, ?, ?)
+            ON CONFLICT(CitationKey) DO UPDATE SET
+                Note_Link = excluded.Note_Link,
+                DEVONthink_Link = excluded.DEVONthink_Link
+            """,
+            rows,
+        )
+
+    def ensure(self, citekey):
+        """Add an empty row for ``citekey`` if missing. Returns True if added."""
+        with self.transaction():
+            cur = self.conn.execute(
+                "INSERT OR IGNORE INTO links (CitationKey) VALUES (?)", (citekey,)
+            )
+        return cur.rowcount > 0
+
+    def delete(self, citekey):
+        with self.transaction():
+            self.conn.execute("DELETE FROM links WHERE CitationKey = ?", (citekey,))
+
+    # === Per-entry run state (for incremental hook_links.py runs) ===
+    def entry_states(self):
+        """Return ``{citekey: (entry_hash, link_hash, status)}``."""
+        rows = self.conn.execute(
+            "SELECT CitationKey, entry_hash, link_hash, status FROM entry_state"
+        )
+        return {row[0]: tuple(row[1:]) for row in rows}
+
+    def set_entry_states(self, rows):
+        """Record ``(citekey, entry_hash, link_hash, status)`` rows."""
+        now = time.time()
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO entry_state VALUES (?, ?, ?, ?, ?)",
+                ((*row, now) for row in rows),
+            )
+
+    # === Store metadata ===
+    def get_meta(self, key):
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    # === CSV compatibility ===
+    def import_csv(self, csv_path, mark_imported=False):
+        """Upsert the rows of ``csv_path`` in one transaction.
+
+        With ``mark_imported``, the same transaction records that the CSV was
+        imported, so a failed import is retried on the next open.
+        """
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            rows = [
+                (row["CitationKey"], row.get("Note_Link"), row.get("DEVONthink_Link"))
+                for row in csv.DictReader(f)
+                if row.get("CitationKey")
+            ]
+        with self.transaction():
+            self._upsert(rows)
+            if mark_imported:
+                self.set_meta("csv_imported", str(csv_path))
+        return len(rows)
+
+    def export_csv(self, csv_path):
+        rows = self.all().values()
+        with open(csv_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({k: row[k] or "" for k in COLUMNS})
+        return len(rows)
+
+
+def link_hash(row):
+    """Hash of a link row's URIs, to notice links changed outside hook_links.py."""
+    blob = "\n".join((row or {}).get(k) or "" for k in COLUMNS)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def store_path_for(linked_items_path):
+    return Path(linked_items_path).with_suffix(".sqlite")
+
+
+def open_link_store(linked_items_path, db_path=None):
+    """Open the store that replaces ``linked_items_path``.
+
+    On first use the existing linked_items.csv is imported once; after that
+    the CSV is only written by an explicit export. The import is recorded in
+    the same transaction as its rows, so one that failed is retried.
+    """
+    linked_items_path = Path(linked_items_path)
+    db_path = Path(db_path) if db_path else store_path_for(linked_items_path)
+    store = LinkStore(db_path)
+    if store.get_meta("csv_imported") is None:
+        if len(store):
+            # A store from before imports were recorded: it was imported.
+            with store.transaction():
+                store.set_meta("csv_imported", str(linked_items_path))
+        elif linked_items_path.suffix == ".csv" and linked_items_path.exists():
+            try:
+                count = store.import_csv(linked_items_path, mark_imported=True)
+            except BaseException:
+                store.close()
+                raise
+            print(f"📥 Imported {count} rows from {linked_items_path} into {db_path}")
+    return store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Import/export the linked-items SQLite store."
+    )
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("csv_path", type=Path, help="linked_items.csv path.")
+    parser.add_argument(
+        "--db", type=Path, help="Store path (default: CSV path with .sqlite suffix)."
+    )
+    args = parser.parse_args()
+
+    with LinkStore(args.db or store_path_for(args.csv_path)) as store:
+        if args.command == "import":
+            print(f"📥 Imported {store.import_csv(args.csv_path)} rows.")
+        else:
+            print(f"📤 Exported {store.export_csv(args.csv_path)} rows.")
@@ -0,0 +1,355 @@
+import heapq
+import re
+import time
+from difflib import SequenceMatcher
+from typing import NamedTuple
+
+from common.assignment import assign
+from common.block_index import BlockIndex
+from common.csl_index import load_entries
+from common.entry_table import squash
+from common.identifiers import identifiers_in, page_text, scan_metadata
+from common.score_cache import ScoreCache, merge
+
+# Fixed order, cheapest and most certain first. A stage only sees the PDFs
+# every earlier stage left unmatched.
+STAGES = (
+    "citekey",  # file already named <citekey>.pdf
+    "identifier",  # DOI / arXiv ID embedded in the file
+    "metadata",  # PDF Info / XMP title
+    "filename",  # author, year and title words in the file name
+    "fuzzy_filename",  # SequenceMatcher over the file name
+    "first_page",  # first-page text
+    "ocr",  # first-page text after OCR
+)
+
+_UNSAFE = re.compile(r'[\/:*?"<>|]')
+_XMP_TITLE = re.compile(
+    rb"<dc:title>.*?<rdf:li[^>]*>(.*?)</rdf:li>", re.DOTALL | re.IGNORECASE
+)
+
+
+class Match(NamedTuple):
+    row: int
+    score: float
+    stage: str
+
+
+def safe_key(key):
+    """``key`` with path-unsafe characters replaced, or ``None`` if unusable."""
+    if not key or key.startswith(":") or key.startswith("/") or "/" in key:
+        return None
+    return _UNSAFE.sub("_", key)
+
+
+class Cascade:
+    """Runs matching stages over a set of PDFs in ``STAGES`` order.
+
+    ``stages`` maps stage names to callables ``stage(pdfs, state)`` that
+    return ``{pdf: (row, score)}`` for the PDFs they resolve. ``state`` is
+    a per-PDF dict stages can use to hand data on (the first-page text,
+    say). An entry row is given to one PDF only: a later claim on a row
+    that is taken leaves that PDF for the next stage, and the first such
+    claim is kept as a ``Match`` in ``state[pdf]["claimed"]`` (a duplicate
+    of a file already matched, say). Per-stage counts and timings are kept
+    in ``stats``, and the last run's ``state``.
+    """
+
+    def __init__(self, stages):
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            raise ValueError(f"Unknown cascade stages: {', '.join(sorted(unknown))}")
+        self.stages = [(name, stages[name]) for name in STAGES if name in stages]
+        self.stats = []
+        self.state = {}
+
+    def run(self, pdfs):
+        """Match ``pdfs``; returns ``{pdf: Match}`` for the ones resolved."""
+        pending = list(pdfs)
+        state = self.state = {pdf: {} for pdf in pending}
+        matches, claimed = {}, set()
+        self.stats = []
+        for name, stage in self.stages:
+            start = time.perf_counter()
+            found = stage(pending, state) if pending else {}
+            resolved = 0
+            for pdf in pending:
+                if pdf not in found:
+                    continue
+                row, score = found[pdf]
+                if row in claimed:
+                    state[pdf].setdefault("claimed", Match(row, score, name))
+                    continue
+                matches[pdf] = Match(row, score, name)
+                claimed.add(row)
+                resolved += 1
+            self.stats.append(
+                (name, len(pending), resolved, time.perf_counter() - start)
+            )
+            pending = [pdf for pdf in pending if pdf not in matches]
+        return matches
+
+    def report(self):
+        print("Stage            Seen  Matched     Time")
+        for name, seen, resolved, seconds in self.stats:
+            print(f"{name:<15}{seen:>6}{resolved:>9}{seconds:>8.2f}s")
+
+
+# === Stages ===
+def citekey_stage(table):
+    """Stage 1: the file name is already an entry's (path-safe) citekey."""
+    rows = {}
+    for i, key in enumerate(table.keys):
+        rows.setdefault(safe_key(key), i)
+    rows.pop(None, None)
+
+    def stage(pdfs, state):
+        return {pdf: (rows[pdf.stem], 1.0) for pdf in pdfs if pdf.stem in rows}
+
+    return stage
+
+
+def identifier_stage(table, csl_path=None):
+    """Stage 2: a DOI or arXiv ID of the file belongs to exactly one entry.
+
+    IDs come from the entries' ``doi``/``eprint``/``url`` fields and, with
+    ``csl_path``, the DOIs of the CSL-JSON export. IDs in the file's XMP,
+    Info dictionary and links are trusted (``scan_metadata``). Only if they
+    name no entry is the first page extracted (``page_text``, kept in
+    ``state`` for the later stages) and its IDs tried; since a first page
+    may also cite other papers, the entry's surname or opening title words
+    must be on the page too. A tier that names several entries leaves the
+    file to the later stages.
+    """
+    by_id = {}
+    for i, identifiers in enumerate(table.identifiers):
+        for ident in identifiers:
+            by_id.setdefault(ident, set()).add(i)
+    if csl_path:
+        for key, entry in load_entries(csl_path).items():
+            i = table.row(key)
+            if i is not None and entry.get("DOI"):
+                for ident in identifiers_in(entry["DOI"]):
+                    by_id.setdefault(ident, set()).add(i)
+    unique = {ident: rows.pop() for ident, rows in by_id.items() if len(rows) == 1}
+
+    def on_page(i, text):
+        surname, title = table.surnames[i], table.prefix(i, 3)
+        return (surname and surname in text) or (title and title in text)
+
+    def stage(pdfs, state):
+        found = {}
+        if not unique:
+            return found
+        for pdf in pdfs:
+            try:
+                metadata = scan_metadata(pdf)
+            except OSError:
+                continue
+            rows = {unique[i] for i in metadata if i in unique}
+            if not rows:
+                try:
+                    text = page_text(pdf, state[pdf])
+                except Exception:
+                    continue
+                rows = {unique[i] for i in identifiers_in(text) if i in unique}
+                text = squash(text)
+                rows = {i for i in rows if on_page(i, text)}
+            if len(rows) == 1:
+                found[pdf] = (rows.pop(), 1.0)
+        return found
+
+    return stage
+
+
+def read_metadata_titles(pdf):
+    """Titles from the PDF Info dictionary and XMP packet (may be empty)."""
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfparser import PDFParser
+    from pdfminer.pdftypes import resolve1
+
+    titles = []
+    with open(pdf, "rb") as f:
+        doc = PDFDocument(PDFParser(f))
+        for info in doc.info:
+            title = resolve1(info.get("Title"))
+            if isinstance(title, bytes):
+                title = title.decode(
+                    "utf-16" if title[:2] == b"\xfe\xff" else "latin-1"
+                )
+            if isinstance(title, str):
+                titles.append(title)
+        metadata = resolve1(doc.catalog.get("Metadata"))
+        if metadata is not None:
+            for raw in _XMP_TITLE.findall(metadata.get_data()):
+                titles.append(raw.decode("utf-8", "replace"))
+    return titles
+
+
+def metadata_stage(table):
+    """Stage 3: the embedded title equals an entry's whole title.
+
+    Titles shared by several entries are only taken when exactly one of
+    those entries' surnames occurs in the file name.
+    """
+    by_title = {}
+    for i, title in enumerate(table.titles):
+        if len(title) >= 10:
+            by_title.setdefault(title.replace(" ", ""), []).append(i)
+
+    def stage(pdfs, state):
+        found = {}
+        for pdf in pdfs:
+            try:
+                titles = read_metadata_titles(pdf)
+            except Exception:
+                continue
+            for title in titles:
+                rows = by_title.get(squash(title), [])
+                if len(rows) > 1:
+                    name = squash(pdf.stem)
+                    rows = [i for i in rows if table.surnames[i] in name]
+                if len(rows) == 1:
+                    found[pdf] = (rows[0], 1.0)
+                    break
+        return found
+
+    return stage
+
+
+def filename_stage(table, blocks=None):
+    """Stage 4: surname, year and the first title words all occur in the name."""
+    blocks = blocks or BlockIndex(table)
+    titles = table.prefixes(5)
+
+    def stage(pdfs, state):
+        found = {}
+        for pdf in pdfs:
+            name = squash(pdf.stem)
+            rows = blocks.rows_for(blocks.surnames_in(name), blocks.years_in(name))
+            row = next((i for i in rows if titles[i] in name), None)
+            if row is not None:
+                found[pdf] = (row, 1.0)
+        return found
+
+    return stage
+
+
+def fuzzy_filename_candidates(
+    table, blocks, titles, name, k=5, todo=None, seed=(), floor=0.65
+):
+    """Best ``k`` ``(row, score)`` for a squashed file name, score > ``floor``.
+
+    Year and surname each add 0.3, the title's SequenceMatcher ratio up to
+    0.4, so only rows sharing a year or surname block are scored. ``todo``
+    limits scoring to those rows; ``seed`` are already known candidates.
+    """
+    name_years = blocks.years_in(name)  # a missing year always counts
+    name_surnames = blocks.surnames_in(name)
+    matcher = SequenceMatcher(None, "", name)
+    found = [(score, -i) for i, score in seed]  # min-heap of the best so far
+    heapq.heapify(found)
+
+    for i in blocks.rows_for_any(name_surnames, name_years):
+        if todo is not None and i not in todo:
+            continue
+        score = 0.0
+        if table.year_in(i, name):
+            score += 0.3
+        if table.surnames[i] in name_surnames:
+            score += 0.3
+        bar = found[0][0] if len(found) == k else floor
+        matcher.set_seq1(titles[i])
+        if score + 0.4 * matcher.quick_ratio() <= bar:
+            continue  # ratio() <= quick_ratio(), so this entry cannot make the list
+        score += 0.4 * matcher.ratio()
+
+        if score > bar:
+            heapq.heappush(found, (score, -i))
+            if len(found) > k:
+                heapq.heappop(found)
+    return sorted(((-i, score) for score, i in found), key=lambda c: (-c[1], c[0]))
+
+
+def fuzzy_filename_stage(table, blocks=None, k=5):
+    """Stage 5: fuzzy file-name score above 0.65, assigned one-to-one."""
+    blocks = blocks or BlockIndex(table)
+    titles = table.prefixes(5)
+
+    def stage(pdfs, state):
+        edges = []
+        for pdf in pdfs:
+            for row, score in fuzzy_filename_candidates(
+                table, blocks, titles, squash(pdf.stem), k
+            ):
+                edges.append((pdf, row, score))
+        return assign(edges)
+
+    return stage
+
+
+def text_candidate(entries, content, indices):
+    """Best ``(index, score)`` above 0.9 for squashed first-page text, or ``None``.
+
+    ``entries`` holds ``(row, surname, title)``; the surname adds 0.3 and the
+    title's SequenceMatcher ratio up to 0.7. Only ``indices`` are tried.
+    """
+    best, best_score = None, 0.0
+    for n in indices:
+        _, surname, title = entries[n]
+        score = 0.0
+        if surname in content:
+            score += 0.3
+        score += 0.7 * SequenceMatcher(None, title, content).ratio()
+        if score > best_score and score > 0.9:
+            best, best_score = n, score
+    return (best, best_score) if best is not None else None
+
+
+def text_stage(table, extract, key="text", cache_as=None, version=1):
+    """Stages 6 and 7: match the text ``extract(pdf, state)`` returns.
+
+    ``extract`` returns squashed text, or ``""``; the text is kept in
+    ``state[pdf][key]`` for later stages. With ``cache_as``, text and best
+    match are kept in a ``ScoreCache`` under that name, per file content, so
+    unchanged PDFs are neither re-read nor rescored against unchanged entries.
+    """
+    entries = [
+        (i, surname, title)
+        for i, (k, surname, title) in enumerate(
+            zip(table.keys, table.surnames, table.prefixes(6))
+        )
+        if safe_key(k)
+    ]
+    scores = None
+    if cache_as:
+        fingerprints = table.fingerprints()
+        scores = ScoreCache(cache_as, version, [fingerprints[i] for i, _, _ in entries])
+
+    def stage(pdfs, state):
+        found = {}
+        for pdf in pdfs:
+            cached, todo, content = [], None, None
+            if scores:
+                st = pdf.stat()
+                identity = f"{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+                cached, todo, content = scores.lookup(identity)
+            if content is None:
+                content = extract(pdf, state[pdf])
+            state[pdf][key] = content
+            if not content:
+                continue
+            indices = range(len(entries)) if todo is None else sorted(todo)
+            best = text_candidate(entries, content, indices)
+            best = merge(cached, [best] if best else [], 1)
+            if scores:
+                scores.store(identity, best, content)
+            if best:
+                n, score = best[0]
+                found[pdf] = (entries[n][0], score)
+        if scores:
+            scores.save()
+            print(f"📈 {key}: {scores.summary()}")
+        return found
+
+    return stage
@@ -0,0 +1,128 @@
+import os
+from collections import defaultdict
+from pathlib import Path
+
+
+def _grams(text):
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class PdfIndex:
+    """The PDFs in one folder, listed once and queried in memory.
+
+    Built from a single ``os.scandir`` pass (same files, same order as
+    ``folder.glob("*.pdf")``). Exact names are a set lookup; stems are
+    normalised once with ``normalize`` and searched through a trigram index
+    (built on first use). Results come back in listing order, so "first
+    file that matches" loops keep their answer. Call ``add``, ``remove`` or
+    ``move`` when the script itself changes the folder.
+    """
+
+    def __init__(self, folder, normalize=str.lower, suffix=".pdf"):
+        self.folder = Path(folder)
+        self.normalize = normalize
+        self.suffix = suffix
+        self.paths = []
+        self.stems = []
+        self.alive = []
+        self.names = {}
+        self.folded_names = {}
+        self.by_stem = defaultdict(set)
+        self._stem_lengths = defaultdict(int)
+        self._grams = None
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                if entry.name.endswith(suffix) and not entry.name.startswith("."):
+                    self._insert(self.folder / entry.name)
+
+    def _insert(self, path):
+        i = len(self.paths)
+        stem = self.normalize(path.stem)
+        self.paths.append(path)
+        self.stems.append(stem)
+        self.alive.append(True)
+        self.names[path.name] = i
+        self.folded_names.setdefault(path.name.casefold(), i)
+        self.by_stem[stem].add(i)
+        self._stem_lengths[len(stem)] += 1
+        if self._grams is not None:
+            for gram in _grams(stem):
+                self._grams[gram].add(i)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return (p for p, alive in zip(self.paths, self.alive) if alive)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def find(self, name):
+        """Path of the file called ``name`` (falling back to a case-insensitive
+        match, as on a default macOS volume), or ``None``."""
+        i = self.names.get(name)
+        if i is None:
+            i = self.folded_names.get(name.casefold())
+            if i is not None and not self.alive[i]:
+                i = None
+        return None if i is None else self.paths[i]
+
+    # === Changes made during the run ===
+    def add(self, path):
+        path = Path(path)
+        if path.parent == self.folder and path.name.endswith(self.suffix):
+            if path.name in self.names:
+                self.remove(path)
+            self._insert(path)
+
+    def remove(self, path):
+        path = Path(path)
+        i = self.names.pop(path.name, None)
+        if i is None:
+            return
+        self.alive[i] = False
+        self.by_stem[self.stems[i]].discard(i)
+        self._stem_lengths[len(self.stems[i])] -= 1
+        if self.folded_names.get(path.name.casefold()) == i:
+            del self.folded_names[path.name.casefold()]
+
+    def move(self, src, dst):
+        self.remove(src)
+        self.add(dst)
+
+    # === Stem searches ===
+    def _containing(self, text):
+        if len(text) < 3:
+            return {i for i, stem in enumerate(self.stems) if text in stem}
+        if self._grams is None:
+            self._grams = defaultdict(set)
+            for i, stem in enumerate(self.stems):
+                for gram in _grams(stem):
+                    self._grams[gram].add(i)
+        postings = sorted((self._grams.get(g, set()) for g in _grams(text)), key=len)
+        ids = set.intersection(*postings) if postings else set()
+        return {i for i in ids if text in self.stems[i]}
+
+    def _contained_in(self, text):
+        ids = set()
+        for length, count in self._stem_lengths.items():
+            if count <= 0 or length > len(text):
+                continue
+            for start in range(len(text) - length + 1):
+                ids |= self.by_stem.get(text[start : start + length], set())
+        return ids
+
+    def search(self, containing=(), contained_in=None):
+        """Live paths whose normalised stem contains any of ``containing``
+        or is a substring of ``contained_in``, in listing order."""
+        ids = set()
+        for text in containing:
+            ids |= self._containing(text)
+        if contained_in is not None:
+            ids |= self._contained_in(contained_in)
+        return [self.paths[i] for i in sorted(ids) if self.alive[i]]
+
+    def first(self, containing=(), contained_in=None):
+        found = self.search(containing, contained_in)
+        return found[0] if found else None
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+from common.bib_cache import CACHE_DIR
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    digest TEXT PRIMARY KEY,
+    hashes BLOB,
+    used_at REAL
+);
+CREATE TABLE IF NOT EXISTS scores (
+    matcher TEXT NOT NULL,
+    query TEXT NOT NULL,
+    version TEXT NOT NULL,
+    snapshot TEXT NOT NULL,
+    candidates TEXT NOT NULL,
+    data TEXT,
+    PRIMARY KEY (matcher, query)
+);
+"""
+
+
+class ScoreCache:
+    """Best candidates per query, reused across runs, kept in SQLite.
+
+    A matcher scores queries (PDFs, titles) against a list of choices
+    (entries, PDFs), each identified by a content hash such as
+    ``EntryTable.fingerprints()``. For each query the cache keeps its top
+    ``k`` ``(choice hash, score)`` pairs above the matcher's floor and the
+    set of choices they were taken from, so the next run only has to score
+    the choices that are new since then. Bumping ``version`` invalidates
+    everything a matcher stored.
+    """
+
+    def __init__(self, matcher, version, hashes, k=1, db_path=None, timeout=30.0):
+        self.matcher = matcher
+        self.version = str(version)
+        self.k = k
+        self.hashes = list(hashes)
+        self.index = {}
+        for i, h in enumerate(self.hashes):
+            self.index.setdefault(h, i)
+        self.db_path = Path(db_path or CACHE_DIR / "match_scores.sqlite")
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path), timeout=timeout)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+        blob = b"".join(sorted(self.index))
+        self.snapshot = hashlib.blake2b(blob, digest_size=16).hexdigest()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO snapshots VALUES (?, ?, ?) ON CONFLICT(digest)"
+                " DO UPDATE SET used_at = excluded.used_at",
+                (self.snapshot, blob, time.time()),
+            )
+        self._todo = {self.snapshot: set()}
+        self.pending = []
+        self.seen = set()
+        self.hits = self.partial = self.misses = 0
+
+    def _new_since(self, digest):
+        """Indices of choices absent from snapshot ``digest`` (``None`` if unknown)."""
+        if digest not in self._todo:
+            row = self.conn.execute(
+                "SELECT hashes FROM snapshots WHERE digest = ?", (digest,)
+            ).fetchone()
+            if row is None:
+                self._todo[digest] = None
+            else:
+                blob = row[0]
+                size = len(self.hashes[0]) if self.hashes else 8
+                old = {blob[i : i + size] for i in range(0, len(blob), size)}
+                self._todo[digest] = {i for h, i in self.index.items() if h not in old}
+        return self._todo[digest]
+
+    def lookup(self, query):
+        """``(candidates, todo, data)`` for ``query``.
+
+        ``candidates`` are cached ``(choice index, score)`` pairs still
+        valid now; ``todo`` is the set of choice indices that still need
+        scoring, or ``None`` when everything does (no usable cache entry).
+        ``data`` is whatever was stored with the query.
+        """
+        self.seen.add(query)
+        row = self.conn.execute(
+            "SELECT version, snapshot, candidates, data FROM scores"
+            " WHERE matcher = ? AND query = ?",
+            (self.matcher, query),
+        ).fetchone()
+        if row is None or row[0] != self.version:
+            self.misses += 1
+            return [], None, None
+        _, digest, stored, data = row
+        todo = self._new_since(digest)
+        stored = [(bytes.fromhex(h), score) for h, score in json.loads(stored)]
+        candidates = [(self.index[h], s) for h, s in stored if h in self.index]
+        if todo is None or (len(stored) >= self.k and len(candidates) < len(stored)):
+            # A dropped candidate may hide an unknown runner-up.
+            self.misses += 1
+            return [], None, data
+        if todo:
+            self.partial += 1
+        else:
+            self.hits += 1
+        return candidates, todo, data
+
+    def store(self, query, candidates, data=None):
+        """Record the top ``(choice index, score)`` pairs for ``query``; see ``save``."""
+        self.seen.add(query)
+        payload = json.dumps([(self.hashes[i].hex(), score) for i, score in candidates])
+        self.pending.append(
+            (self.matcher, query, self.version, self.snapshot, payload, data)
+        )
+
+    def save(self, prune=True):
+        """Write stored results in one transaction.
+
+        With ``prune``, this matcher's queries not seen in this run (PDFs
+        that are gone, titles no longer asked for) are dropped, and so are
+        snapshots nothing refers to any more.
+        """
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?)", self.pending
+            )
+            if prune:
+                stale = [
+                    (self.matcher, query)
+                    for (query,) in self.conn.execute(
+                        "SELECT query FROM scores WHERE matcher = ?", (self.matcher,)
+                    ).fetchall()
+                    if query not in self.seen
+                ]
+                self.conn.executemany(
+                    "DELETE FROM scores WHERE matcher = ? AND query = ?", stale
+                )
+                self.conn.execute(
+                    "DELETE FROM snapshots WHERE digest != ? AND digest NOT IN"
+                    " (SELECT DISTINCT snapshot FROM scores)",
+                    (self.snapshot,),
+                )
+        self.pending = []
+
+    def close(self, prune=True):
+        self.save(prune)
+        self.conn.close()
+
+    def summary(self):
+        return (
+            f"{self.hits} cached, {self.partial} updated, {self.misses} scored in full"
+        )
+
+
+def merge(candidates, scored, k):
+    """Best ``k`` of cached and newly scored ``(index, score)`` pairs.
+
+    Equal scores keep choice order, as a ``score > best`` loop would.
+    """
+    best = {}
+    for i, score in list(candidates) + list(scored):
+        best[i] = score
+    return sorted(best.items(), key=lambda item: (-item[1], item[0]))[:k]
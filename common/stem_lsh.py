@@ -0,0 +1,239 @@
+import os
+import sqlite3
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import numpy as np
+from decouple import config
+from rapidfuzz import fuzz
+
+from common.bib_cache import cache_path_for
+from common.entry_table import squash
+from common.fuzzy_batch import top_matches
+
+# Bump when signatures change so old sidecars are rebuilt.
+LSH_VERSION = 1
+
+# 48 bands of 2 MinHash rows. A stem usually holds only part of the title
+# (author_year_first_words), so the Jaccard threshold is low (~0.15); ranking
+# by shared bands then keeps the candidate lists short.
+BANDS = 48
+ROWS = 2
+PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(20240521)
+_A = _rng.randint(1, PRIME, size=BANDS * ROWS).astype(np.uint64)
+_B = _rng.randint(0, PRIME, size=BANDS * ROWS).astype(np.uint64)
+
+# Below this many PDFs every title is scored against every stem (exact);
+# above it only the LSH candidates are, LSH_CANDIDATES per title at most.
+LSH_MIN_FILES = config("PDF_LSH_MIN_FILES", default=20000, cast=int)
+LSH_CANDIDATES = config("PDF_LSH_CANDIDATES", default=40, cast=int)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS stems (
+    name TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    signature BLOB
+);
+"""
+
+
+def signature(text):
+    """MinHash signature (``BANDS * ROWS`` uint32s) of ``text``'s trigrams.
+
+    ``None`` when ``text`` has no trigrams.
+    """
+    text = squash(text)
+    if not text:
+        return None
+    text = f" {text} "
+    grams = {text[i : i + 3] for i in range(len(text) - 2)}
+    codes = np.fromiter(
+        ((ord(a) << 42 | ord(b) << 21 | ord(c)) % PRIME for a, b, c in grams),
+        dtype=np.uint64,
+        count=len(grams),
+    )
+    return ((np.outer(_A, codes) + _B[:, None]) % PRIME).min(axis=1).astype(np.uint32)
+
+
+def band_keys(sigs):
+    """One integer key per band for each row of the signature matrix ``sigs``."""
+    rows = np.asarray(sigs, dtype=np.uint64).reshape(len(sigs), BANDS, ROWS)
+    keys = rows[:, :, 0]
+    for r in range(1, ROWS):
+        keys = (keys << np.uint64(31)) | rows[:, :, r]
+    return keys
+
+
+class StemLSH:
+    """MinHash LSH over the PDF stems in one folder, kept in a SQLite sidecar.
+
+    Signatures are stored per file name with its size and mtime, so opening
+    the index only hashes files that are new or changed since the last run
+    and drops the ones that are gone. Each band is a sorted key array
+    searched with ``searchsorted``; files added during the run go into small
+    per-band dicts. ``paths`` is in ``glob("*.pdf")`` order. Call ``add``,
+    ``remove`` or ``move`` when the script itself changes the folder.
+    """
+
+    def __init__(self, folder, db_path=None, suffix=".pdf", timeout=30.0):
+        self.folder = Path(folder)
+        self.suffix = suffix
+        self.db_path = Path(
+            db_path or cache_path_for(self.folder, suffix=".stemlsh.sqlite")
+        )
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path), timeout=timeout)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        stamp = f"{LSH_VERSION}:{BANDS}x{ROWS}"
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'version'"
+        ).fetchone()
+        if row is None or row[0] != stamp:
+            with self.conn:
+                self.conn.execute("DELETE FROM stems")
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('version', ?)", (stamp,)
+                )
+
+        self.paths = []
+        self.alive = []
+        self.ids = {}
+        self.added = [defaultdict(list) for _ in range(BANDS)]
+        self._sync()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _sync(self):
+        stored = {
+            name: (size, mtime_ns, blob)
+            for name, size, mtime_ns, blob in self.conn.execute("SELECT * FROM stems")
+        }
+        fresh, hashed = [], []
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                name = entry.name
+                if not name.endswith(self.suffix) or name.startswith("."):
+                    continue
+                st = entry.stat()
+                old = stored.pop(name, None)
+                if old and old[:2] == (st.st_size, st.st_mtime_ns):
+                    sig = None if old[2] is None else np.frombuffer(old[2], np.uint32)
+                else:
+                    sig = signature(Path(name).stem)
+                    fresh.append((name, st.st_size, st.st_mtime_ns, sig))
+                if sig is not None:
+                    hashed.append((len(self.paths), sig))
+                self._insert(self.folder / name, None)
+        ids = np.array([i for i, _ in hashed], dtype=np.int64)
+        keys = band_keys([sig for _, sig in hashed]) if hashed else np.empty((0, BANDS))
+        order = np.argsort(keys, axis=0, kind="stable")
+        self.band_keys = [keys[order[:, b], b] for b in range(BANDS)]
+        self.band_ids = [ids[order[:, b]] for b in range(BANDS)]
+        if fresh or stored:
+            with self.conn:
+                self.conn.executemany(
+                    "DELETE FROM stems WHERE name = ?", ((name,) for name in stored)
+                )
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO stems VALUES (?, ?, ?, ?)",
+                    (
+                        (name, size, mtime, None if sig is None else sig.tobytes())
+                        for name, size, mtime, sig in fresh
+                    ),
+                )
+
+    def _insert(self, path, sig):
+        i = len(self.paths)
+        self.paths.append(path)
+        self.alive.append(True)
+        self.ids[path.name] = i
+        if sig is not None:
+            for added, key in zip(self.added, band_keys([sig])[0].tolist()):
+                added[key].append(i)
+
+    # === Changes made during the run ===
+    def add(self, path):
+        path = Path(path)
+        if path.parent != self.folder or not path.name.endswith(self.suffix):
+            return
+        self.remove(path)
+        st = path.stat()
+        sig = signature(path.stem)
+        self._insert(path, sig)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO stems VALUES (?, ?, ?, ?)",
+                (
+                    path.name,
+                    st.st_size,
+                    st.st_mtime_ns,
+                    None if sig is None else sig.tobytes(),
+                ),
+            )
+
+    def remove(self, path):
+        i = self.ids.pop(Path(path).name, None)
+        if i is None:
+            return
+        # Bucket entries are left in place and skipped via ``alive``.
+        self.alive[i] = False
+        with self.conn:
+            self.conn.execute("DELETE FROM stems WHERE name = ?", (Path(path).name,))
+
+    def move(self, src, dst):
+        self.remove(src)
+        self.add(dst)
+
+    # === Queries ===
+    def candidates(self, text, limit=LSH_CANDIDATES):
+        """Ids of up to ``limit`` stems sharing the most bands with ``text``.
+
+        The ids come back in listing order.
+        """
+        sig = signature(text)
+        if sig is None:
+            return []
+        hits = Counter()
+        for b, key in enumerate(band_keys([sig])[0]):
+            keys = self.band_keys[b]
+            lo, hi = keys.searchsorted(key, "left"), keys.searchsorted(key, "right")
+            hits.update(self.band_ids[b][lo:hi].tolist())
+            hits.update(self.added[b].get(int(key), ()))
+        ranked = sorted((i for i in hits if self.alive[i]), key=lambda i: (-hits[i], i))
+        return sorted(ranked[:limit])
+
+    def top_matches(
+        self, queries, texts, names, k=1, score_cutoff=0, scorer=fuzz.partial_ratio
+    ):
+        """Like ``fuzzy_batch.top_matches(names, ...)``, over LSH candidates only.
+
+        ``texts`` are the raw query strings used for retrieval, ``queries``
+        and ``names`` the normalised strings the scorer compares (``names``
+        aligned with ``paths``). Small folders are scored exhaustively.
+        """
+        if len(self.paths) < LSH_MIN_FILES:
+            return top_matches(queries, names, k, score_cutoff, scorer)
+        results = []
+        for query, text in zip(queries, texts):
+            ids = self.candidates(text)
+            choices = [names[i] for i in ids]
+            top = top_matches([query], choices, k, score_cutoff, scorer, workers=1)
+            results.append([(ids[j], score) for j, score in top[0]])
+        return results
@@ -0,0 +1,131 @@
+import re
+import unicodedata
+
+# === TeX → Unicode ===
+# Accent commands and the combining mark each one adds to the next letter.
+ACCENTS = {
+    '"': "\u0308",
+    "'": "\u0301",
+    "`": "\u0300",
+    "^": "\u0302",
+    "~": "\u0303",
+    "=": "\u0304",
+    ".": "\u0307",
+    "u": "\u0306",
+    "v": "\u030c",
+    "H": "\u030b",
+    "c": "\u0327",
+    "k": "\u0328",
+    "r": "\u030a",
+    "d": "\u0323",
+    "b": "\u0331",
+}
+
+# Letter-like commands (\ss, {\o}, \aa, ...) and escaped specials.
+SYMBOLS = {
+    "ss": "ß",
+    "o": "ø",
+    "O": "Ø",
+    "ae": "æ",
+    "AE": "Æ",
+    "oe": "œ",
+    "OE": "Œ",
+    "aa": "å",
+    "AA": "Å",
+    "l": "ł",
+    "L": "Ł",
+    "i": "ı",
+    "j": "ȷ",
+    "dh": "ð",
+    "DH": "Ð",
+    "th": "þ",
+    "TH": "Þ",
+    "&": "&",
+    "%": "%",
+    "$": "$",
+    "#": "#",
+    "_": "_",
+    "{": "{",
+    "}": "}",
+    # Spacing: thin, medium and negative thin space.
+    ",": " ",
+    ";": " ",
+    "!": "",
+}
+
+# Letters that do not decompose into ASCII plus combining marks.
+FOLD = {
+    "ß": "ss",
+    "ø": "o",
+    "Ø": "O",
+    "æ": "ae",
+    "Æ": "AE",
+    "œ": "oe",
+    "Œ": "OE",
+    "ł": "l",
+    "Ł": "L",
+    "ı": "i",
+    "ȷ": "j",
+    "đ": "d",
+    "Đ": "D",
+    "ð": "d",
+    "Ð": "D",
+    "þ": "th",
+    "Þ": "TH",
+}
+_FOLD_TABLE = str.maketrans(FOLD)
+
+# The accented letter may itself be a command (``\\"\\i``), which swallows
+# the space that ends it.
+_LETTER = r"(\\[A-Za-z](?![A-Za-z])\s?|[A-Za-z])"
+_ACCENT = re.compile(
+    rf"\\([\"'`^~=.])\s*(?:\{{\s*{_LETTER}\s*\}}|{_LETTER})"
+    rf"|\\([uvHckrdb])(?:\s*\{{\s*{_LETTER}\s*\}}|(?:\s+|(?=\\)){_LETTER})"
+)
+# A letter command swallows the space that ends it (``\\ss e``); specials don't.
+_SYMBOL = re.compile(r"\\(?:([A-Za-z]+)(?![A-Za-z])\s?|([^A-Za-z\s]))")
+_COMMAND = re.compile(r"\\[A-Za-z]+\*?\s*")
+_DASHES = (("---", "—"), ("--", "–"))
+
+
+def _accent(m):
+    command = m.group(1) or m.group(4)
+    letter = m.group(2) or m.group(3) or m.group(5) or m.group(6)
+    if letter.startswith("\\"):
+        name = letter[1:].rstrip()
+        # A dotless i or j only carries the accent: ``\\"\\i`` is ï.
+        letter = name if name in ("i", "j") else SYMBOLS.get(name, name)
+    return letter + ACCENTS[command]
+
+
+def _symbol(m):
+    name = m.group(1) or m.group(2)
+    # Unknown commands are left for _COMMAND to drop.
+    return SYMBOLS.get(name, m.group(0))
+
+
+def decode(text):
+    """Turn BibTeX field text into plain Unicode.
+
+    Handles accent commands (``{\\"o}``, ``\\'{e}``, ``\\c c``), letter
+    commands (``\\ss``, ``{\\o}``), escaped specials (``\\&``), dashes and
+    ``~``; other commands such as ``\\emph`` are dropped, keeping their
+    argument. Braces are removed.
+    """
+    if "\\" not in text and "{" not in text and "~" not in text and "--" not in text:
+        return text
+    text = _ACCENT.sub(_accent, text)
+    text = _SYMBOL.sub(_symbol, text)
+    text = _COMMAND.sub("", text)
+    text = text.replace("{", "").replace("}", "").replace("~", " ")
+    for tex, char in _DASHES:
+        text = text.replace(tex, char)
+    return unicodedata.normalize("NFC", text)
+
+
+def fold(text):
+    """ASCII-fold ``text``: strip accents and spell out letters like ß and ø."""
+    if text.isascii():
+        return text
+    text = unicodedata.normalize("NFKD", text.translate(_FOLD_TABLE))
+    return "".join(c for c in text if not unicodedata.combining(c))
@@ -1,15 +1,28 @@
-import json
+import argparse
+import contextlib
+import io
 import os
 import re
-import subprocess
+import socket
+import socketserver
 import sys
 import uuid
 from pathlib import Path
 
-import pandas as pd
 import yaml
 from decouple import config
 
+from common.csl_index import get_entry, load_entries
+from common.devonthink import (
+    LookupCache,
+    Search,
+    entry_search_terms,
+    resolve_links,
+    run_applescript,
+)
+from common.hookmark import HookLedger, hook_link_many
+from common.link_store import open_link_store
+
 # === Load environment config ===
 json_path = Path(config("CSL_JSON_PATH"))
 vault_path = Path(config("OBSIDIAN_VAULT"))
@@ -18,6 +31,8 @@ articles = config("ARTICLES")
 books = config("BOOKS")
 other = config("OTHER")
 linked_items_path = Path(config("LINKED_ITEMS"))
+link_store_path = config("LINK_STORE", default=None)
+socket_path = Path(config("LIT_NOTE_SOCKET", default="/tmp/zotero_lit_note.sock"))
 vault_name = vault_path.name
 
 MARKDOWN_IN_DEVONTHINK = (
@@ -25,6 +40,16 @@ MARKDOWN_IN_DEVONTHINK = (
 )
 PDF_IN_DEVONTHINK = config("PDF_IN_DEVONTHINK", default="True").lower() == "true"
 
+# === Determine note path ===
+type_map = {
+    "article-journal": articles,
+    "paper-conference": articles,
+    "manuscript": articles,
+    "chapter": articles,
+    "book": books,
+    "thesis": books,
+}
+
 
 def strip_surrogates(val):
     if isinstance(val, str):
@@ -36,157 +61,109 @@ def strip_surrogates(val):
     return val
 
 
-# === Parse citekey ===
-citekey = sys.argv[1].strip()
+def open_store():
+    return open_link_store(linked_items_path, link_store_path)
 
-# === Load CSL JSON ===
-with open(json_path, "r", encoding="utf-8") as f:
-    data = json.load(f)
-    entries = {e["id"]: e for e in data if "id" in e}
 
-lookup = {k.lower(): k for k in entries}
-if citekey.lower() not in lookup:
-    print(f"❌ Citation key not found: {citekey}")
-    sys.exit(1)
+def note_path_for(citekey, entry):
+    entry_type = entry.get("type", "").lower()
+    folder_name = type_map.get(entry_type, other)
+    return vault_path / source_material / folder_name / f"@{citekey}.md"
 
-citekey = lookup[citekey.lower()]
-entry = entries[citekey]
 
-# === Load or initialize CSV ===
-linked_df = (
-    pd.read_csv(linked_items_path)
-    if linked_items_path.exists()
-    else pd.DataFrame(columns=["CitationKey", "Note_Link", "DEVONthink_Link"])
-)
+def create_note(citekey, entry, store, dt_cache=None, refresh=False, ledger=None):
+    """Create or update the literature note for one already-resolved CSL entry.
 
-# === Determine note path ===
-type_map = {
-    "article-journal": articles,
-    "paper-conference": articles,
-    "manuscript": articles,
-    "chapter": articles,
-    "book": books,
-    "thesis": books,
-}
-entry_type = entry.get("type", "").lower()
-folder_name = type_map.get(entry_type, other)
-note_dir = vault_path / source_material / folder_name
-note_path = note_dir / f"@{citekey}.md"
-
-
-# === DEVONthink search helpers ===
-def find_devonthink_link(search_term):
-    script = f"""
-    tell application id "DNtp"
-        set theRecords to search "{search_term}"
-        repeat with theRecord in theRecords
-            set theType to type of theRecord as string
-            if theType is not "markdown" then
-                return reference URL of theRecord
-            end if
-        end repeat
-    end tell
+    Records the links in ``store`` and returns the URIs and strings printed
+    for Alfred/OmniFocus. DEVONthink lookups go through ``dt_cache`` when
+    given; ``refresh`` bypasses cached answers. Hookmark links already in
+    ``ledger`` are not recreated.
     """
-    try:
-        result = subprocess.run(
-            ["osascript", "-e", script], capture_output=True, text=True
+    note_path = note_path_for(citekey, entry)
+
+    title = entry.get("title", "")
+    authors = entry.get("author", [])
+
+    # === DEVONthink searches (PDF with citekey fallback, plus note if in DT) ===
+    search_terms = entry_search_terms(entry, citekey)
+    print(f"🔍 DEVONthink search: {' → '.join(search_terms)}")
+    dt_requests = {"pdf": Search(search_terms, False, citekey)}
+    if MARKDOWN_IN_DEVONTHINK:
+        dt_requests["note"] = Search([note_path.name], True, citekey)
+    dt_links = resolve_links(dt_requests, dt_cache, refresh)
+    devonthink_pdf_link = dt_links["pdf"]
+    devonthink_note_link = dt_links.get("note") or ""
+
+    # === Read/Create YAML frontmatter ===
+    if note_path.exists():
+        content = note_path.read_text(encoding="utf-8")
+        metadata = (
+            yaml.safe_load(content.split("---")[1]) if content.startswith("---") else {}
         )
-        output = result.stdout.strip()
-        return output if output.startswith("x-devonthink-item://") else None
-    except Exception as e:
-        print(f"⚠️ DEVONthink search error: {e}")
-        return None
-
-
-# === Build DEVONthink search strings ===
-title = entry.get("title", "")
-authors = entry.get("author", [])
-full_author = (
-    " ".join([a.get("given", "") + " " + a.get("family", "") for a in authors])
-    if authors
-    else ""
-)
-fallback_term = citekey
-primary_term = f"{full_author} {title}".strip()
+    else:
+        metadata = {}
 
-print(f"🔍 DEVONthink primary search: {primary_term}")
-devonthink_pdf_link = find_devonthink_link(primary_term)
+    if "uid" not in metadata:
+        metadata["uid"] = str(uuid.uuid4())
+        print(f"🆕 Generating new UID: {metadata['uid']}")
 
-if not devonthink_pdf_link:
-    print(f"🔁 Fallback search: {fallback_term}")
-    devonthink_pdf_link = find_devonthink_link(fallback_term)
-
-# === DEVONthink note link (if markdown in DT)
-devonthink_note_link = (
-    find_devonthink_link(Path(note_path).name) if MARKDOWN_IN_DEVONTHINK else ""
-)
-
-# === Read/Create YAML frontmatter ===
-if note_path.exists():
-    content = note_path.read_text(encoding="utf-8")
-    metadata = (
-        yaml.safe_load(content.split("---")[1]) if content.startswith("---") else {}
+    obsidian_adv_uri = (
+        f"obsidian://adv-uri?vault={vault_name.replace(' ', '%20')}&uid={metadata['uid']}"
     )
-else:
-    metadata = {}
-
-if "uid" not in metadata:
-    metadata["uid"] = str(uuid.uuid4())
-    print(f"🆕 Generating new UID: {metadata['uid']}")
 
-obsidian_adv_uri = (
-    f"obsidian://adv-uri?vault={vault_name.replace(' ', '%20')}&uid={metadata['uid']}"
-)
-
-# === DEVONthink backlink injection ===
-if devonthink_pdf_link:
-    backlink_text = f"Linked note: {obsidian_adv_uri}"
-    script = f"""
-    tell application id "DNtp"
-        set theRecords to lookup records with URL "{devonthink_pdf_link}"
-        if theRecords ≠ {{}} then
-            set comment of (item 1 of theRecords) to "{backlink_text}"
-        end if
-    end tell
-    """
-    subprocess.run(["osascript", "-e", script])
-    print(f"📝 Added backlink to DEVONthink PDF.")
-
-# === Populate metadata ===
-year = entry.get("issued", {}).get("date-parts", [[None]])[0][0] or "n.d."
-author_names = [
-    f"{a.get('family','')}, {a.get('given','')}".strip(", ") for a in authors
-]
-authors_str = "; ".join(author_names)
-
-metadata.update(
-    {
-        "title": title,
-        "authors": authors_str,
-        "citation": f"@{citekey}",
-        "year": year,
-        "DOI": entry.get("DOI", ""),
-        "tags": ["literature", "ToRead"],
-        "URI": f"zotero://select/items/@{citekey}",
-        "uid": metadata["uid"],
-    }
-)
+    # === DEVONthink backlink injection ===
+    if devonthink_pdf_link:
+        backlink_text = f"Linked note: {obsidian_adv_uri}"
+        script = f"""
+        tell application id "DNtp"
+            set theRecords to lookup records with URL "{devonthink_pdf_link}"
+            if theRecords ≠ {{}} then
+                set comment of (item 1 of theRecords) to "{backlink_text}"
+            end if
+        end tell
+        """
+        backlink = run_applescript(script)
+        if backlink.ok:
+            print(f"📝 Added backlink to DEVONthink PDF.")
+        else:
+            reason = backlink.error or backlink.stderr.strip()
+            print(f"⚠️ Could not add backlink to DEVONthink PDF: {reason}")
+
+    # === Populate metadata ===
+    year = entry.get("issued", {}).get("date-parts", [[None]])[0][0] or "n.d."
+    author_names = [
+        f"{a.get('family','')}, {a.get('given','')}".strip(", ") for a in authors
+    ]
+    authors_str = "; ".join(author_names)
+
+    metadata.update(
+        {
+            "title": title,
+            "authors": authors_str,
+            "citation": f"@{citekey}",
+            "year": year,
+            "DOI": entry.get("DOI", ""),
+            "tags": ["literature", "ToRead"],
+            "URI": f"zotero://select/items/@{citekey}",
+            "uid": metadata["uid"],
+        }
+    )
 
-metadata = strip_surrogates(metadata)
+    metadata = strip_surrogates(metadata)
 
-# === Markdown body ===
-pdf_backlink_md = (
-    f"[View PDF in DEVONthink]({devonthink_pdf_link})"
-    if devonthink_pdf_link
-    else "PDF not linked yet"
-)
-note_link = (
-    f"[Open Note in DEVONthink]({devonthink_note_link})"
-    if devonthink_note_link
-    else f"[Open in Zotero]({metadata['URI']})"
-)
+    # === Markdown body ===
+    pdf_backlink_md = (
+        f"[View PDF in DEVONthink]({devonthink_pdf_link})"
+        if devonthink_pdf_link
+        else "PDF not linked yet"
+    )
+    note_link = (
+        f"[Open Note in DEVONthink]({devonthink_note_link})"
+        if devonthink_note_link
+        else f"[Open in Zotero]({metadata['URI']})"
+    )
 
-note_body = f"""---
+    note_body = f"""---
 {yaml.dump(metadata, sort_keys=False).strip()}
 ---
 📌 {note_link}
@@ -209,55 +186,189 @@ note_body = f"""---
 -
 """
 
-note_path.parent.mkdir(parents=True, exist_ok=True)
-note_path.write_text(note_body, encoding="utf-8")
-print(f"✅ Note created: {note_path}")
-
-# === Final URIs ===
-note_uri = obsidian_adv_uri
-pdf_uri = devonthink_pdf_link or ""
-zotero_uri = metadata["URI"]
-
-# === Update linked_items.csv ===
-if citekey in linked_df["CitationKey"].values:
-    linked_df.loc[linked_df["CitationKey"] == citekey, "Note_Link"] = note_uri
-    linked_df.loc[linked_df["CitationKey"] == citekey, "DEVONthink_Link"] = pdf_uri
-else:
-    linked_df = pd.concat(
-        [
-            linked_df,
-            pd.DataFrame(
-                [
-                    {
-                        "CitationKey": citekey,
-                        "Note_Link": note_uri,
-                        "DEVONthink_Link": pdf_uri,
-                    }
-                ]
-            ),
-        ],
-        ignore_index=True,
-    )
+    note_path.parent.mkdir(parents=True, exist_ok=True)
+    note_path.write_text(note_body, encoding="utf-8")
+    print(f"✅ Note created: {note_path}")
+
+    # === Final URIs ===
+    note_uri = obsidian_adv_uri
+    pdf_uri = devonthink_pdf_link or ""
+    zotero_uri = metadata["URI"]
 
-linked_df.to_csv(linked_items_path, index=False)
-print("🔄 linked_items.csv updated.")
-
-# === Hookmark linking ===
-hook = config("HOOK_PATH")
-note_path_uri = f"hook://file/{note_path.resolve()}"
-abs_note_path = note_path.resolve()
-
-if pdf_uri:
-    subprocess.run([hook, "link", note_uri, pdf_uri])
-    subprocess.run([hook, "link", pdf_uri, zotero_uri])
-    subprocess.run([hook, "link", note_uri, zotero_uri])
-
-# === Final output
-print(f"🔗 Hooked: {note_uri} ⇔ {pdf_uri} ⇔ {zotero_uri}")
-print(f"TITLE_FOR_OMNIFOCUS::{title}")
-print(f"AUTHOR_FOR_OMNIFOCUS::{authors_str}")
-print(f"NOTE_PATH::{abs_note_path}")
-print(f"NOTE_URI::hook://file/{abs_note_path}")
-print(f"OBSIDIAN_URI::{obsidian_adv_uri}")
-print(f"PDF_URI::{pdf_uri}")
-print(f"ZOTERO_URI::{zotero_uri}")
+    # === Update link store ===
+    store.upsert(citekey, note_uri, pdf_uri)
+    print("🔄 Link store updated.")
+
+    # === Hookmark linking ===
+    hook = config("HOOK_PATH")
+    abs_note_path = note_path.resolve()
+
+    if pdf_uri:
+        hook_link_many(
+            [(note_uri, pdf_uri), (pdf_uri, zotero_uri), (note_uri, zotero_uri)],
+            ledger,
+            hook,
+        )
+
+    result = {
+        "title": title,
+        "authors": authors_str,
+        "note_path": abs_note_path,
+        "note_uri": note_uri,
+        "obsidian_uri": obsidian_adv_uri,
+        "pdf_uri": pdf_uri,
+        "zotero_uri": zotero_uri,
+    }
+    return result
+
+
+def print_result(result):
+    print(
+        f"🔗 Hooked: {result['note_uri']} ⇔ {result['pdf_uri']} ⇔ {result['zotero_uri']}"
+    )
+    print(f"TITLE_FOR_OMNIFOCUS::{result['title']}")
+    print(f"AUTHOR_FOR_OMNIFOCUS::{result['authors']}")
+    print(f"NOTE_PATH::{result['note_path']}")
+    print(f"NOTE_URI::hook://file/{result['note_path']}")
+    print(f"OBSIDIAN_URI::{result['obsidian_uri']}")
+    print(f"PDF_URI::{result['pdf_uri']}")
+    print(f"ZOTERO_URI::{result['zotero_uri']}")
+
+
+def run_once(citekey, refresh=False):
+    found_key, entry = get_entry(json_path, citekey)
+    if found_key is None:
+        print(f"❌ Citation key not found: {citekey}")
+        return 1
+
+    with open_store() as store:
+        dt_cache = LookupCache(store.db_path)
+        ledger = HookLedger(store.db_path)
+        try:
+            if refresh:
+                dt_cache.invalidate(found_key)
+            result = create_note(found_key, entry, store, dt_cache, refresh, ledger)
+        finally:
+            dt_cache.close()
+            ledger.close()
+    print_result(result)
+    return 0
+
+
+# === Resident daemon (see lit_note_client.py) ===
+class WarmState:
+    """CSL entries kept in memory (reloaded when the export changes) plus an open link store."""
+
+    def __init__(self):
+        self.entries_stamp = None
+        self.entries = {}
+        self.lookup = {}
+        self.store = open_store()
+        self.dt_cache = LookupCache(self.store.db_path)
+        self.ledger = HookLedger(self.store.db_path)
+
+    @staticmethod
+    def _stamp(path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def refresh(self):
+        stamp = self._stamp(json_path)
+        if stamp != self.entries_stamp:
+            self.entries = load_entries(json_path)
+            self.lookup = {k.lower(): k for k in self.entries}
+            self.entries_stamp = stamp
+            print(f"📚 Loaded {len(self.entries)} CSL entries.", file=sys.stderr)
+
+    def handle(self, citekey):
+        self.refresh()
+        key = self.lookup.get(citekey.lower())
+        if key is None:
+            print(f"❌ Citation key not found: {citekey}")
+            return 1
+
+        result = create_note(
+            key, self.entries[key], self.store, self.dt_cache, ledger=self.ledger
+        )
+        print_result(result)
+        return 0
+
+
+class LitNoteHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        citekey = self.rfile.readline().decode("utf-8").strip()
+        if not citekey:
+            return
+        # Everything the note prints, warnings included, goes to the client.
+        # hook/osascript run through common.external, which captures their
+        # output; callers report failures with print, so the client sees
+        # what a one-shot run would show.
+        buf = io.StringIO()
+        try:
+            self.server.state.refresh()
+            with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
+                code = self.server.state.handle(citekey)
+        except Exception as e:
+            buf.write(f"❌ Error while creating note for {citekey}: {e}\n")
+            code = 1
+        buf.write(f"EXIT::{code}\n")
+        self.wfile.write(buf.getvalue().encode("utf-8"))
+
+
+def daemon_running():
+    """True if something is listening on ``socket_path``."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except OSError:
+            return False
+    return True
+
+
+def serve():
+    # A socket file nobody listens on is left over from a daemon that died.
+    if daemon_running():
+        print(f"❌ A daemon is already listening on {socket_path}", file=sys.stderr)
+        return 1
+    socket_path.unlink(missing_ok=True)
+    state = WarmState()
+    state.refresh()
+    # Requests are handled one at a time so the redirected output and the
+    # store connection are never shared between two notes.
+    with socketserver.UnixStreamServer(str(socket_path), LitNoteHandler) as server:
+        server.state = state
+        print(f"👂 Listening on {socket_path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            socket_path.unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Create or update an Obsidian literature note for a citekey."
+    )
+    parser.add_argument("citekey", nargs="?", help="Citation key to process.")
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help=f"Run as a resident daemon listening on {socket_path}.",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Ignore cached DEVONthink lookups for this citekey.",
+    )
+    args = parser.parse_args()
+
+    if args.serve:
+        sys.exit(serve())
+    elif args.citekey:
+        sys.exit(run_once(args.citekey.strip(), args.refresh))
+    else:
+        parser.error("a citekey is required unless --serve is given")
@@ -1,27 +1,31 @@
 import argparse
-import json
-import os
-import re
-import subprocess
+import contextlib
+import io
+import sys
 from pathlib import Path
 
 import pandas as pd
 from decouple import config
 
+import create_lit_note
+from common.csl_index import ensure_index, load_entries, load_entry_hashes
+from common.devonthink import LookupCache, Search, resolve_links
+from common.hookmark import HookLedger, hook_link_many
+from common.link_store import link_hash, open_link_store
+
 # === CONFIGURATION ===
 base_dir = Path(config("BASE_DIR"))
 json_path = Path(config("CSL_JSON_PATH"))
-log_path = Path(config("LOG_PATH")) / "/hook_link_log.csv"
-debug_path = Path(config("LOG_PATH")) / "/hook_link_debug.txt"
+log_path = Path(config("LOG_PATH")) / "hook_link_log.csv"
+debug_path = Path(config("LOG_PATH")) / "hook_link_debug.txt"
 cache_path = Path(config("LINKED_ITEMS"))
+link_store_path = config("LINK_STORE", default=None)
 hook_path = config("HOOK_PATH")
-python_path = Path(config("PYTHON_PATH"))
 vault_path = Path(config("OBSIDIAN_VAULT"))
 
 MARKDOWN_IN_DEVONTHINK = (
     config("MARKDOWN_IN_DEVONTHINK", default="False").lower() == "true"
 )
-PDF_IN_DEVONTHINK = config("PDF_IN_DEVONTHINK", default="False").lower() == "true"
 
 # === ARGPARSE ===
 parser = argparse.ArgumentParser(
@@ -31,166 +35,233 @@ parser.add_argument(
     "--dry-run", action="store_true", help="Run without making any changes."
 )
 parser.add_argument("--citekey", type=str, help="Only process this citation key.")
-args = parser.parse_args()
+parser.add_argument(
+    "--full",
+    action="store_true",
+    help=(
+        "Process every entry. By default only added, changed or failed "
+        "entries are; unchanged entries skipped for lack of a PDF or note "
+        "are not retried."
+    ),
+)
+parser.add_argument(
+    "--refresh",
+    action="store_true",
+    help="Ignore cached DEVONthink lookups (and drop them for --citekey).",
+)
+parser.add_argument(
+    "--relink",
+    action="store_true",
+    help="Recreate Hookmark links even if the ledger says they exist.",
+)
 
 
-def safe_hook_link(a, b):
+def safe_hook_links(pairs, ledger, args):
+    """Create all pending Hookmark links, a few at a time, skipping known ones."""
+    if not args.relink:
+        pairs = [pair for pair in pairs if pair not in ledger]
     if args.dry_run:
-        print(f"[Dry Run] Would link: {a} ⇄ {b}")
-    else:
-        subprocess.run([hook_path, "link", a, b])
-        print(f"🔗 Hooked: {a} ⇄ {b}")
+        for a, b in pairs:
+            print(f"[Dry Run] Would link: {a} ⇄ {b}")
+        return
+    created = hook_link_many(pairs, None, hook_path)
+    ledger.add_many(pair for pair, ok in zip(pairs, created) if ok)
+    for (a, b), ok in zip(pairs, created):
+        if ok:
+            print(f"🔗 Hooked: {a} ⇄ {b}")
 
 
-def refresh_cache(citekey):
-    subprocess.run(
-        [python_path, "create_lit_note.py", citekey],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
+def refresh_cache(
+    citekey, entries, links, store, dt_cache, ledger, refresh, refresh_failed
+):
+    """Create/update the note in-process and return the fresh link row.
 
-
-def find_devonthink_doc_link(entry, citekey):
-    authors = entry.get("author", [])
-    full_author = " ".join(
-        f"{a.get('given','')} {a.get('family','')}".strip()
-        for a in authors
-        if isinstance(a, dict)
-    ).strip()
-    title = entry.get("title", "")
-    search_1 = f"{full_author} {title}".strip()
-    search_1 = re.sub(r"\s+", " ", search_1)
-
-    script_template = """
-    tell application id "DNtp"
-        set theRecords to search "{query}"
-        repeat with theRecord in theRecords
-            set theName to name of theRecord
-            set theType to type of theRecord
-            if theType is not "markdown" then
-                return reference URL of theRecord
-            end if
-        end repeat
-    end tell
+    If that raises, ``citekey`` is added to ``refresh_failed`` and its old
+    row is returned.
     """
+    out = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out):
+            result = create_lit_note.create_note(
+                citekey, entries[citekey], store, dt_cache, refresh, ledger
+            )
+    except Exception as e:
+        with open(debug_path, "a", encoding="utf-8") as dbg:
+            dbg.write(f"⚠️ Note refresh failed for {citekey}: {e}\n")
+        refresh_failed.add(citekey)
+        return links.get(citekey)
 
-    # First search: Full author name + title
-    result_1 = subprocess.run(
-        ["osascript", "-e", script_template.replace("{query}", search_1)],
-        capture_output=True,
-        text=True,
-    )
-    out1 = result_1.stdout.strip()
-    if out1.startswith("x-devonthink-item://"):
-        return out1
-
-    # Fallback: citekey
-    fallback_query = citekey
-    result_2 = subprocess.run(
-        ["osascript", "-e", script_template.replace("{query}", fallback_query)],
-        capture_output=True,
-        text=True,
-    )
-    out2 = result_2.stdout.strip()
-    return out2 if out2.startswith("x-devonthink-item://") else None
-
-
-# === PREPARE DEBUG LOG ===
-with open(debug_path, "w", encoding="utf-8") as dbg:
-    dbg.write("🔍 Hook Linking Debug Log\n\n")
-
-# === LOAD CACHE ===
-if cache_path.exists():
-    linked_df = pd.read_csv(cache_path)
-else:
-    linked_df = pd.DataFrame(columns=["CitationKey", "Note_Link", "DEVONthink_Link"])
-
-# === LOAD CSL JSON ===
-with open(json_path, "r", encoding="utf-8") as f:
-    data = json.load(f)
-    entries = {e["id"]: e for e in data if "id" in e}
-
-lookup = {k.lower(): k for k in entries.keys()}
-
-if args.citekey:
-    key_lc = args.citekey.lower()
-    if key_lc not in lookup:
-        print(f"❌ Citation key {args.citekey} not found in CSL JSON.")
-        exit(1)
-    citekeys = [lookup[key_lc]]
-else:
-    citekeys = list(entries.keys())
-
-linked, skipped = [], []
-
-# === PROCESS EACH CITEKEY ===
-for key in citekeys:
-    row = linked_df.loc[linked_df["CitationKey"] == key]
-
-    if (
-        row.empty
-        or pd.isna(row.iloc[0]["Note_Link"])
-        or pd.isna(row.iloc[0]["DEVONthink_Link"])
-    ):
-        refresh_cache(key)
-        linked_df = pd.read_csv(cache_path)
-        row = linked_df.loc[linked_df["CitationKey"] == key]
-
-    note_uri = row.iloc[0]["Note_Link"] if not row.empty else ""
-    devonthink_link = row.iloc[0]["DEVONthink_Link"] if not row.empty else ""
-    zot_uri = f"zotero://select/items/@{key}"
-
-    # Apply MARKDOWN_IN_DEVONTHINK setting
-    if MARKDOWN_IN_DEVONTHINK and pd.notna(note_uri):
-        md_filename = note_uri.replace("hook://file/", "")
-        md_path = Path(md_filename)
-        dt_md_link = devonthink_link_for_path(md_path)
-        if dt_md_link:
-            note_uri = dt_md_link
-
-    # Improved PDF matching
-    pdf_link = ""
-    entry = entries[key]
-    if PDF_IN_DEVONTHINK:
-        dt_pdf_link = find_devonthink_doc_link(entry, key)
-        if dt_pdf_link:
-            pdf_link = dt_pdf_link
+    row = {
+        "CitationKey": citekey,
+        "Note_Link": result["note_uri"] or None,
+        "DEVONthink_Link": result["pdf_uri"] or None,
+    }
+    links[citekey] = row
+    return row
 
-    with open(debug_path, "a", encoding="utf-8") as dbg:
-        dbg.write(f"== {key} ==\n")
-        dbg.write(f"Note URI: {note_uri if pd.notna(note_uri) else '---'}\n")
-        dbg.write(
-            f"DEVONthink link: {devonthink_link if pd.notna(devonthink_link) else '---'}\n"
-        )
 
-    if pd.notna(note_uri) and pd.notna(devonthink_link):
-        safe_hook_link(note_uri, devonthink_link)
-        safe_hook_link(note_uri, zot_uri)
-        safe_hook_link(devonthink_link, zot_uri)
-        linked.append((key, note_uri, devonthink_link, "linked"))
-        with open(debug_path, "a", encoding="utf-8") as dbg:
-            dbg.write("✅ Linked all three.\n\n")
+def note_search(key, entry):
+    note_name = create_lit_note.note_path_for(key, entry).name
+    return Search([note_name], True, key)
+
+
+def run(args, store, dt_cache, ledger):
+    # === PREPARE DEBUG LOG ===
+    with open(debug_path, "w", encoding="utf-8") as dbg:
+        dbg.write("🔍 Hook Linking Debug Log\n\n")
+
+    # === LINK STORE ROWS (kept in memory for the whole run) ===
+    links = store.all()
+
+    # === LOAD CSL ENTRY HASHES (from the compiled index) ===
+    index_path = ensure_index(json_path)
+    hashes = load_entry_hashes(json_path, index_path)
+
+    lookup = {k.lower(): k for k in hashes.keys()}
+
+    if args.citekey:
+        key_lc = args.citekey.lower()
+        if key_lc not in lookup:
+            print(f"❌ Citation key {args.citekey} not found in CSL JSON.")
+            return 1
+        citekeys = [lookup[key_lc]]
+        if args.refresh:
+            dt_cache.invalidate(citekeys[0])
+    elif args.full:
+        citekeys = list(hashes.keys())
     else:
-        skipped.append(
-            (
+        # Only entries that are new, changed, relinked elsewhere, or whose note
+        # refresh or links failed last time. An unchanged entry skipped for
+        # want of a PDF or note is done until its entry or links change.
+        states = store.entry_states()
+        citekeys = [
+            key
+            for key, entry_hash in hashes.items()
+            if key not in states
+            or states[key][:2] != (entry_hash, link_hash(links.get(key)))
+            or states[key][2] not in ("linked", "skipped")
+        ]
+        print(
+            f"⏩ Incremental run: {len(citekeys)} of {len(hashes)} entries need work."
+        )
+
+    entries = load_entries(json_path, index_path, keys=citekeys)
+
+    linked, skipped = [], []
+    hook_pairs = []
+    key_pairs = {}
+
+    # === REFRESH MISSING CACHE ROWS ===
+    rows = {}
+    refresh_failed = set()
+    for key in citekeys:
+        row = links.get(key)
+        if row is None or not row["Note_Link"] or not row["DEVONthink_Link"]:
+            row = refresh_cache(
                 key,
-                note_uri if pd.notna(note_uri) else "",
-                devonthink_link if pd.notna(devonthink_link) else "",
-                "missing note or DEVONthink link",
+                entries,
+                links,
+                store,
+                dt_cache,
+                ledger,
+                args.refresh,
+                refresh_failed,
             )
+        rows[key] = row
+
+    # === DEVONTHINK NOTE LOOKUPS (cached; only for items that will be linked) ===
+    dt_links = {}
+    if MARKDOWN_IN_DEVONTHINK:
+        dt_links = resolve_links(
+            {
+                key: note_search(key, entries[key])
+                for key, row in rows.items()
+                if row and row["Note_Link"] and row["DEVONthink_Link"]
+            },
+            dt_cache,
+            args.refresh,
         )
+
+    # === PROCESS EACH CITEKEY ===
+    for key in citekeys:
+        row = rows[key]
+        note_uri = (row["Note_Link"] if row else None) or ""
+        devonthink_link = (row["DEVONthink_Link"] if row else None) or ""
+        zot_uri = f"zotero://select/items/@{key}"
+
+        # Apply MARKDOWN_IN_DEVONTHINK setting
+        if note_uri and dt_links.get(key):
+            note_uri = dt_links[key]
+
         with open(debug_path, "a", encoding="utf-8") as dbg:
-            dbg.write("❌ Skipped due to missing note or DEVONthink link.\n\n")
+            dbg.write(f"== {key} ==\n")
+            dbg.write(f"Note URI: {note_uri or '---'}\n")
+            dbg.write(f"DEVONthink link: {devonthink_link or '---'}\n")
 
-# === SAVE CSV LOG ===
-df = pd.DataFrame(
-    linked + skipped, columns=["CitationKey", "Note_Link", "DEVONthink_Link", "Status"]
-)
-df.to_csv(log_path, index=False)
+        if note_uri and devonthink_link:
+            key_pairs[key] = [
+                (note_uri, devonthink_link),
+                (note_uri, zot_uri),
+                (devonthink_link, zot_uri),
+            ]
+            hook_pairs.extend(key_pairs[key])
+            linked.append((key, note_uri, devonthink_link, "linked"))
+            with open(debug_path, "a", encoding="utf-8") as dbg:
+                dbg.write("✅ Linked all three.\n\n")
+        else:
+            skipped.append(
+                (key, note_uri, devonthink_link, "missing note or DEVONthink link")
+            )
+            with open(debug_path, "a", encoding="utf-8") as dbg:
+                dbg.write("❌ Skipped due to missing note or DEVONthink link.\n\n")
+
+    # === HOOKMARK LINKING (bounded parallel, with per-call timeouts) ===
+    safe_hook_links(hook_pairs, ledger, args)
+
+    # === RECORD PER-ENTRY STATE FOR THE NEXT INCREMENTAL RUN ===
+    if not args.dry_run:
+        state_rows = []
+        for key in citekeys:
+            # A note refresh that crashed (DEVONthink or osascript down, say)
+            # is retried next run; "skipped" means there is no PDF or note.
+            if key in refresh_failed:
+                status = "failed"
+            elif key not in key_pairs:
+                status = "skipped"
+            elif all(pair in ledger for pair in key_pairs[key]):
+                status = "linked"
+            else:
+                status = "failed"
+            state_rows.append((key, hashes[key], link_hash(rows[key]), status))
+        store.set_entry_states(state_rows)
+
+    # === SAVE CSV LOG ===
+    df = pd.DataFrame(
+        linked + skipped,
+        columns=["CitationKey", "Note_Link", "DEVONthink_Link", "Status"],
+    )
+    df.to_csv(log_path, index=False)
+
+    with open(debug_path, "a", encoding="utf-8") as dbg:
+        dbg.write(f"\n✅ Linked this run: {len(linked)}\n")
+        dbg.write(f"⏭ Skipped (missing data): {len(skipped)}\n")
+        dbg.write(f"📄 CSV Log: {log_path}\n")
+
+    print(f"✅ Done. {len(linked)} linked, {len(skipped)} skipped.")
+    return 0
+
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    with open_link_store(cache_path, link_store_path) as store:
+        dt_cache = LookupCache(store.db_path)
+        ledger = HookLedger(store.db_path)
+        try:
+            return run(args, store, dt_cache, ledger)
+        finally:
+            dt_cache.close()
+            ledger.close()
 
-with open(debug_path, "a", encoding="utf-8") as dbg:
-    dbg.write(f"\n✅ Linked this run: {len(linked)}\n")
-    dbg.write(f"⏭ Skipped (missing data): {len(skipped)}\n")
-    dbg.write(f"📄 CSV Log: {log_path}\n")
 
-print(f"✅ Done. {len(linked)} linked, {len(skipped)} skipped.")
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,10 @@
 import os
-import subprocess
 from pathlib import Path
 import requests
 from decouple import config
 
+from common.external import run_many
+
 # === CONFIG ===
 obsidian_vault = Path(config("OBSIDIAN_VAULT"))
 zotero_user_id = config("ZOTERO_USER_ID")
@@ -25,11 +26,17 @@ for item in items:
         zotero_lookup[cite_key] = zotero_uri
 
 # === Scan Obsidian notes and hook ===
+commands = []
 for note in obsidian_vault.glob("**/@*.md"):
     cite_key = note.stem.lstrip("@")
     zotero_uri = zotero_lookup.get(cite_key)
     if zotero_uri:
         print(f"🔗 Hooking {cite_key} to {note.name}")
-        subprocess.run(["hook", "link", "--name", cite_key, zotero_uri, str(note)])
+        commands.append(["hook", "link", "--name", cite_key, zotero_uri, str(note)])
     else:
-        print(f"⚠️ No Zotero item found for {cite_key}")
\ No newline at end of file
+        print(f"⚠️ No Zotero item found for {cite_key}")
+
+# Run the hook calls a few at a time, with timeouts and retries
+for result in run_many(commands):
+    if not result.ok:
+        print(f"⚠️ Hook failed for {result.args[3]}: {result.error or result.stderr}")
\ No newline at end of file
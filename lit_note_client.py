@@ -0,0 +1,41 @@
+import os
+import socket
+import sys
+from pathlib import Path
+
+from decouple import config
+
+# === Thin Alfred client for `create_lit_note.py --serve` ===
+socket_path = config("LIT_NOTE_SOCKET", default="/tmp/zotero_lit_note.sock")
+# Seconds to wait on the daemon before giving up on it; a stuck DEVONthink
+# call must not hang Alfred.
+timeout = config("LIT_NOTE_TIMEOUT", default=120, cast=float)
+script_path = Path(__file__).resolve().parent / "create_lit_note.py"
+
+citekey = sys.argv[1].strip()
+
+# The daemon sends its whole reply, ending in EXIT::<code>, at once.
+response = b""
+try:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(f"{citekey}\n".encode("utf-8"))
+        chunks = []
+        while chunk := sock.recv(65536):
+            chunks.append(chunk)
+        response = b"".join(chunks)
+except OSError:
+    pass
+if b"EXIT::" not in response:
+    # No daemon running, or it hung or died mid-request: fall back to the
+    # one-shot script.
+    os.execv(sys.executable, [sys.executable, str(script_path), citekey])
+
+exit_code = 0
+for line in response.decode("utf-8").splitlines():
+    if line.startswith("EXIT::"):
+        exit_code = int(line.removeprefix("EXIT::"))
+    else:
+        print(line)
+sys.exit(exit_code)
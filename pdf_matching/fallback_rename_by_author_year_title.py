@@ -1,9 +1,15 @@
-import bibtexparser
+import sys
 import re
 from pathlib import Path
 import csv
 from decouple import config
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.block_index import BlockIndex
+from common.entry_table import load_entry_table
+from common.match_cascade import Cascade, citekey_stage
+from common.tex_decode import fold
+
 
 # === CONFIG ===
 bib_path = Path(config("BIB_PATH"))
@@ -12,32 +18,20 @@ csv_report_path = pdf_dir / "fallback_rename_report.csv"
 dry_run = True  # Set to False to apply changes
 
 def normalize(text):
-    return re.sub(r'\W+', '', text.lower())
-
-# === LOAD BIB FILE ===
-with open(bib_path, "r", encoding="utf-8") as bibfile:
-    bib_db = bibtexparser.load(bibfile)
-
-# Prepare lookup table
-bib_entries = []
-for entry in bib_db.entries:
-    key = entry.get("ID", "").strip()
-    author = entry.get("author", "").split(" and ")[0].split(",")[0].strip()
-    year = entry.get("year", "").strip()
-    title = entry.get("title", "").strip()
-    bib_entries.append({
-        "key": key,
-        "author": normalize(author),
-        "year": year,
-        "title": normalize(" ".join(title.split()[:4]))
-    })
+    return re.sub(r'\W+', '', fold(text).lower())
 
-# === RENAME LOGIC ===
-rename_log = []
+# === LOAD BIB FILE (cached, pre-normalised columns) ===
+table = load_entry_table(bib_path)
+titles = table.prefixes(4, before_colon=False)
+blocks = BlockIndex(table)
 
-for file in pdf_dir.glob("*.pdf"):
-    base = file.stem
-    if re.match(r".+ -\d{4}- .+", base):
+def author_year_title_stage(pdfs, state):
+    """Names like "Author -2020- Title": surname, exact year, title words."""
+    found = {}
+    for file in pdfs:
+        base = file.stem
+        if not re.match(r".+ -\d{4}- .+", base):
+            continue
         parts = base.split(" -")
         if len(parts) < 3:
             continue
@@ -45,38 +39,61 @@ for file in pdf_dir.glob("*.pdf"):
         year_match = re.findall(r"\d{4}", parts[1])
         if not year_match:
             continue
-        year = year_match[0]
+        year = int(year_match[0])
         title_words = normalize(" ".join(parts[2:])[:40])
         author_norm = normalize(author_raw)
+        state[file]["parsed"] = True
 
-        matched = None
-        for entry in bib_entries:
-            if entry["author"] in author_norm and entry["year"] == year and entry["title"] in title_words:
-                matched = entry
+        # Candidates already share the year and have a surname inside author_norm.
+        for i in blocks.rows_for(blocks.surnames_in(author_norm), [year]):
+            if titles[i] in title_words:
+                found[file] = (i, 1.0)
                 break
+    return found
+
+# Files already named <citekey>.pdf keep their entry.
+cascade = Cascade({
+    "citekey": citekey_stage(table),
+    "filename": author_year_title_stage,
+})
+pdfs = list(pdf_dir.glob("*.pdf"))
+matches = cascade.run(pdfs)
+cascade.report()
+
+# === RENAME LOGIC ===
+rename_log = []
+
+for file in pdfs:
+    state = cascade.state[file]
+    if not state.get("parsed"):
+        continue
+    match = matches.get(file)
+    claimed = state.get("claimed")
 
-        if matched:
-            new_filename = f"{matched['key']}.pdf"
-            new_path = pdf_dir / new_filename
-            if new_path.exists():
-                result = "⚠️ Exists — skipped"
-            else:
-                result = "✓ Rename planned" if dry_run else "✓ Renamed"
-                if not dry_run:
-                    file.rename(new_path)
-            rename_log.append({
-                "Original": file.name,
-                "New": new_filename,
-                "CitationKey": matched['key'],
-                "Result": result
-            })
+    if match or claimed:
+        matched = table.keys[(match or claimed).row]
+        new_filename = f"{matched}.pdf"
+        new_path = pdf_dir / new_filename
+        if not match or new_path.exists():
+            # Its entry went to another file, e.g. an existing <citekey>.pdf
+            result = "⚠️ Exists — skipped"
         else:
-            rename_log.append({
-                "Original": file.name,
-                "New": "",
-                "CitationKey": "",
-                "Result": "❌ No match found"
-            })
+            result = "✓ Rename planned" if dry_run else "✓ Renamed"
+            if not dry_run:
+                file.rename(new_path)
+        rename_log.append({
+            "Original": file.name,
+            "New": new_filename,
+            "CitationKey": matched,
+            "Result": result
+        })
+    else:
+        rename_log.append({
+            "Original": file.name,
+            "New": "",
+            "CitationKey": "",
+            "Result": "❌ No match found"
+        })
 
 # === WRITE LOG ===
 with open(csv_report_path, "w", newline="", encoding="utf-8") as csvfile:
@@ -1,10 +1,17 @@
+import sys
 import re
 import csv
 from pathlib import Path
-import bibtexparser
-from difflib import SequenceMatcher
 from decouple import config
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.assignment import assign
+from common.block_index import BlockIndex
+from common.entry_table import load_entry_table
+from common.match_cascade import Cascade, citekey_stage, fuzzy_filename_candidates
+from common.score_cache import ScoreCache
+from common.tex_decode import fold
+
 # === CONFIG ===
 bib_path = Path(config("BIB_PATH"))
 pdf_dir = Path(config("PDF_FOLDER"))
@@ -12,64 +19,79 @@ log_path = pdf_dir.parent / "fuzzy_rename_log.csv"
 dry_run = True  # Set to False to actually rename files
 
 def normalize(text):
-    return re.sub(r'\W+', '', text.lower())
-
-def fuzzy_match(a, b):
-    return SequenceMatcher(None, a, b).ratio()
-
-# Load BibTeX entries
-with open(bib_path, "r", encoding="utf-8") as f:
-    bib_db = bibtexparser.load(f)
+    return re.sub(r'\W+', '', fold(text).lower())
 
-entries = []
-for entry in bib_db.entries:
-    key = entry.get("ID", "").strip()
-    author = entry.get("author", "").split(" and ")[0].split(",")[0].strip()
-    year = entry.get("year", "").strip()
-    title = entry.get("title", "").strip().split(":")[0]
-    entries.append({
-        "key": key,
-        "author": normalize(author),
-        "year": year,
-        "title": normalize(" ".join(title.split()[:5]))
-    })
-
-# Scan and match PDFs
-log = []
+# Load BibTeX entries (cached, pre-normalised columns)
+table = load_entry_table(bib_path)
+titles = table.prefixes(5)
+blocks = BlockIndex(table)
 
-for pdf in pdf_dir.glob("*.pdf"):
-    norm_name = normalize(pdf.stem)
+# Score each PDF against the entries in its blocks, keeping its best few.
+# Bump MATCHER_VERSION when the scoring changes, to drop cached results.
+MATCHER_VERSION = 1
+candidates = 5
 
-    best_match = None
-    best_score = 0.0
+def cached_fuzzy_filename_stage(pdfs, state):
+    """Fuzzy file-name scores, cached per file name, assigned one-to-one."""
+    # Results from earlier runs: a known PDF is only scored against new entries
+    scores = ScoreCache("fuzzy_rename_pdfs", MATCHER_VERSION, table.fingerprints(), k=candidates)
+    edges = []
+    for pdf in pdfs:
+        cached, todo, _ = scores.lookup(pdf.name)
+        found = fuzzy_filename_candidates(
+            table, blocks, titles, normalize(pdf.stem), candidates, todo, seed=cached
+        )
+        scores.store(pdf.name, found)
+        state[pdf]["candidates"] = bool(found)
+        edges.extend((pdf, i, score) for i, score in found)
+    scores.close()
+    print(f"📈 PDFs: {scores.summary()}")
+    # Give each citekey to at most one PDF, maximising the total score
+    return assign(edges)
 
-    for entry in entries:
-        score = 0.0
-        if entry["year"] in norm_name:
-            score += 0.3
-        if entry["author"] in norm_name:
-            score += 0.3
-        score += 0.4 * fuzzy_match(entry["title"], norm_name)
+# Files already named <citekey>.pdf keep their entry.
+cascade = Cascade({
+    "citekey": citekey_stage(table),
+    "fuzzy_filename": cached_fuzzy_filename_stage,
+})
+pdfs = list(pdf_dir.glob("*.pdf"))
+matches = cascade.run(pdfs)
+cascade.report()
 
-        if score > best_score and score > 0.65:
-            best_score = score
-            best_match = entry
+log = []
 
-    if best_match:
-        new_name = f"{best_match['key']}.pdf"
+for pdf in pdfs:
+    match = matches.get(pdf)
+    state = cascade.state[pdf]
+    if match:
+        best_match = table.keys[match.row]
+        new_name = f"{best_match}.pdf"
         new_path = pdf_dir / new_name
         result = "⚠️ Exists — skipped" if new_path.exists() else "✓ Rename planned"
-        if not dry_run and not new_path.exists():
+        if new_path == pdf:
+            result = "✓ Already named"
+        elif not dry_run and not new_path.exists():
             print(f"{pdf} renamed to {new_path}")
             pdf.rename(new_path)
             result = "✓ Renamed"
         log.append({
             "Original": pdf.name,
             "New": new_name,
-            "CitationKey": best_match["key"],
-            "Score": f"{best_score:.2f}",
+            "CitationKey": best_match,
+            "Score": f"{match.score:.2f}",
             "Result": result
         })
+    elif state.get("claimed"):
+        # Its entry went to another file, e.g. an existing <citekey>.pdf
+        claimed = state["claimed"]
+        best_match = table.keys[claimed.row]
+        log.append({
+            "Original": pdf.name,
+            "New": f"{best_match}.pdf",
+            "CitationKey": best_match,
+            "Score": f"{claimed.score:.2f}",
+            "Result": "⚠️ Exists — skipped"
+        })
     else:
         print(f"Failed to rename {pdf}")
         log.append({
@@ -77,7 +99,9 @@ for pdf in pdf_dir.glob("*.pdf"):
             "New": "",
             "CitationKey": "",
             "Score": "0.00",
-            "Result": "❌ No match"
+            "Result": "❌ Candidates went to better matches"
+            if state.get("candidates")
+            else "❌ No match"
         })
 
 # Write log
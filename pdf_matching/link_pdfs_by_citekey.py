@@ -1,11 +1,16 @@
 import csv
 import re
+import sys
 from pathlib import Path
 
-import bibtexparser
 import requests
 from decouple import config
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.entry_table import load_entry_table
+from common.pdf_index import PdfIndex
+from common.tex_decode import fold
+
 # === USER CONFIG ===
 ZOTERO_USER_ID = config("ZOTERO_USER_ID")
 ZOTERO_API_KEY = config("ZOTERO_API_KEY")
@@ -17,33 +22,21 @@ headers = {"Zotero-API-Key": ZOTERO_API_KEY}
 
 # === HELPERS ===
 def normalize(text):
-    return re.sub(r"\W+", "", text.lower())
+    return re.sub(r"\W+", "", fold(text).lower())
 
 
-def find_fallback_pdf(entry):
-    author = entry.get("author", "").split(" and ")[0].split(",")[0].strip().lower()
-    year = entry.get("year", "").strip()
-    title_words = re.findall(r"\w+", entry.get("title", "").lower())
-    patterns = [
-        f"{author}_{year}",
-        f"{author}{year}",
-        f"{author}_{year}_{'_'.join(title_words[:3])}",
-    ]
-    for file in pdf_dir.glob("*.pdf"):
-        base = file.stem.lower()
-        if any(p in base for p in patterns):
-            return file
-    return None
+def find_fallback_pdf(i):
+    return pdf_index.first(containing=table.fallback_patterns(i))
 
 
 # === MAIN LOGIC ===
-with open(bib_path, "r", encoding="utf-8") as bibfile:
-    bib_db = bibtexparser.load(bibfile)
+table = load_entry_table(bib_path)
+# One listing of the PDF folder for the whole run; stems lowercased like before.
+pdf_index = PdfIndex(pdf_dir, lambda stem: fold(stem).lower())
 
 log_rows = []
 
-for entry in bib_db.entries:
-    citation_key = entry.get("ID", "").strip()
+for i, citation_key in enumerate(table.keys):
     item_url = f"https://api.zotero.org/users/{ZOTERO_USER_ID}/items?format=json&key={citation_key}"
     r = requests.get(item_url, headers=headers)
     if r.status_code != 200:
@@ -78,14 +71,14 @@ for entry in bib_db.entries:
         continue
 
     item_key = items[0]["key"]
-    pdf_path = pdf_dir / f"{citation_key}.pdf"
+    pdf_path = pdf_index.find(f"{citation_key}.pdf")
     fallback_used = False
 
-    if not pdf_path.exists():
-        pdf_path = find_fallback_pdf(entry)
+    if not pdf_path:
+        pdf_path = find_fallback_pdf(i)
         fallback_used = True if pdf_path else False
 
-    if not pdf_path or not pdf_path.exists():
+    if not pdf_path:
         log_rows.append(
             {
                 "CitationKey": citation_key,
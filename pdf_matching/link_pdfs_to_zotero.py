@@ -4,13 +4,16 @@ import sys
 import time
 from pathlib import Path
 
-import bibtexparser
 from decouple import config
 from httpx import ReadTimeout
 from pyzotero import zotero
-from rapidfuzz import fuzz
 from tqdm import tqdm
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.entry_table import load_entry_table
+from common.fuzzy_batch import top_matches
+from common.tex_decode import fold
+
 # =========================== CONFIGURATION ===========================
 bib_path = Path(config("BIB_PATH"))
 pdf_dir = Path(config("PDF_FOLDER"))
@@ -22,23 +25,32 @@ zot = zotero.Zotero(ZOTERO_USER_ID, "user", ZOTERO_API_KEY)
 dry_run = "--dry-run" in sys.argv
 log_path = Path("logs/pdf_match_log.csv")
 
+ITEM_TYPES = {"journalArticle", "book", "conferencePaper", "presentation"}
+
 
 # =========================== HELPERS ===========================
 def normalize(text):
-    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+    return re.sub(r"[^a-z0-9]+", " ", fold(text).lower()).strip()
 
 
-def best_pdf_match(title):
-    n_title = normalize(title)
-    best_score = 0
-    best_file = None
-    for pdf in pdf_files:
-        n_name = normalize(pdf.stem)
-        score = fuzz.partial_ratio(n_title, n_name)
-        if score > best_score and score > 70:
-            best_score = score
-            best_file = pdf
-    return best_file, best_score
+def best_pdf_matches(titles):
+    """Best PDF (score > 70) per title, scored against every PDF in one vectorised pass."""
+    titles = list(dict.fromkeys(titles))
+    tops = top_matches([normalize(t) for t in titles], pdf_names, score_cutoff=70)
+    return {
+        title: (pdf_files[top[0][0]], top[0][1])
+        for title, top in zip(titles, tops)
+        if top and top[0][1] > 70
+    }
+
+
+def needs_fuzzy_match(item):
+    """True for items of a matched type whose citekey PDF is not in the folder."""
+    data = item["data"]
+    if data["itemType"] not in ITEM_TYPES:
+        return False
+    citekey = bib_lookup.get(normalize(data.get("title", "")))
+    return bool(citekey) and not (pdf_dir / f"{citekey}.pdf").exists()
 
 
 def fetch_children_with_retry(item_key, retries=5):
@@ -56,18 +68,11 @@ def fetch_children_with_retry(item_key, retries=5):
 
 # =========================== LOAD DATA ===========================
 print("[✓] Loading BibTeX...")
-with open(bib_path, "r", encoding="utf-8") as f:
-    bib_db = bibtexparser.load(f)
-    bib_entries = bib_db.entries
+table = load_entry_table(bib_path)
 
-print(f"[✓] BibTeX entries loaded: {len(bib_entries)}")
+print(f"[✓] BibTeX entries loaded: {len(table)}")
 
-bib_lookup = {}
-for entry in bib_entries:
-    key = entry.get("ID", "")
-    title = normalize(entry.get("title", ""))
-    if title:
-        bib_lookup[title] = key
+bib_lookup = table.title_lookup()
 
 pdf_files = list(pdf_dir.glob("*.pdf"))
 print(f"[✓] PDFs found: {len(pdf_files)}")
@@ -76,6 +81,13 @@ print("[✓] Fetching Zotero items...")
 zot_items = zot.everything(zot.items())
 print(f"[✓] Zotero items fetched: {len(zot_items)}")
 
+# Normalise every stem once, then score all titles that may need a fuzzy
+# match against all PDFs up front.
+pdf_names = [normalize(pdf.stem) for pdf in pdf_files]
+pdf_matches = best_pdf_matches(
+    [item["data"].get("title", "") for item in zot_items if needs_fuzzy_match(item)]
+)
+
 # =========================== PROCESS ===========================
 log_rows = []
 
@@ -83,12 +95,7 @@ for item in tqdm(zot_items, desc="Matching items"):
     item_key = item["key"]
     data = item["data"]
 
-    if data["itemType"] not in {
-        "journalArticle",
-        "book",
-        "conferencePaper",
-        "presentation",
-    }:
+    if data["itemType"] not in ITEM_TYPES:
         continue
 
     title = data.get("title", "")
@@ -137,7 +144,7 @@ for item in tqdm(zot_items, desc="Matching items"):
                 link_msg = f"Link failed: {e}"
     else:
         # Fuzzy matching
-        pdf, score = best_pdf_match(title)
+        pdf, score = pdf_matches.get(title, (None, 0))
         if pdf:
             expected_pdf = pdf.name
             if dry_run:
@@ -1,17 +1,25 @@
 import csv
+import hashlib
 import re
 import shutil
 import sys
 import time
 from pathlib import Path
 
-import bibtexparser
 from decouple import config
 from httpx import ReadTimeout
 from pyzotero import zotero
-from rapidfuzz import fuzz
 from tqdm import tqdm
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.assignment import assign
+from common.entry_table import load_entry_table
+from common.fuzzy_batch import top_matches
+from common.match_cascade import Cascade, citekey_stage
+from common.score_cache import ScoreCache, merge
+from common.stem_lsh import StemLSH
+from common.tex_decode import fold
+
 # =========================== CONFIGURATION ===========================
 bib_path = Path(config("BIB_PATH"))
 pdf_dir = Path(config("PDF_FOLDER"))
@@ -24,23 +32,88 @@ zot = zotero.Zotero(ZOTERO_USER_ID, "user", ZOTERO_API_KEY)
 
 dry_run = "--dry-run" in sys.argv
 
+ITEM_TYPES = {"journalArticle", "book", "conferencePaper", "presentation"}
+CANDIDATES = 5  # PDFs per title considered for the one-to-one assignment
+MATCHER_VERSION = 1  # Bump when scoring changes, to drop cached results
+
 
 # =========================== HELPERS ===========================
 def normalize(text):
-    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
-
-
-def best_pdf_match(title):
-    n_title = normalize(title)
-    best_score = 0
-    best_file = None
-    for pdf in pdf_files:
-        n_name = normalize(pdf.stem)
-        score = fuzz.partial_ratio(n_title, n_name)
-        if score > best_score and score > 70:
-            best_score = score
-            best_file = pdf
-    return best_file, best_score
+    return re.sub(r"[^a-z0-9]+", " ", fold(text).lower()).strip()
+
+
+def top_pdfs(titles):
+    """Top ``CANDIDATES`` PDFs per title, reusing earlier runs' scores.
+
+    A title seen before is only scored against the PDFs added since; new
+    titles go through the LSH index.
+    """
+    queries = [normalize(t) for t in titles]
+    tops = [None] * len(titles)
+    fresh, pending = [], {}
+    for n, title in enumerate(titles):
+        cached, todo, _ = scores.lookup(title)
+        if todo is None:
+            fresh.append(n)
+        elif todo:
+            pending.setdefault(id(todo), (sorted(todo), []))[1].append((n, cached))
+        else:
+            tops[n] = cached
+    for ids, group in pending.values():
+        choices = [pdf_names[i] for i in ids]
+        found = top_matches(
+            [queries[n] for n, _ in group], choices, k=CANDIDATES, score_cutoff=70
+        )
+        for (n, cached), top in zip(group, found):
+            tops[n] = merge(cached, [(ids[j], score) for j, score in top], CANDIDATES)
+    found = pdf_lsh.top_matches(
+        [queries[n] for n in fresh],
+        [titles[n] for n in fresh],
+        pdf_names,
+        k=CANDIDATES,
+        score_cutoff=70,
+    )
+    for n, top in zip(fresh, found):
+        tops[n] = top
+    for title, top in zip(titles, tops):
+        scores.store(title, top)
+    return tops
+
+
+def title_stage(pdfs, state):
+    """Fuzzy stage: Zotero titles against the names of the PDFs left.
+
+    Takes the fuzzy file-name slot of the cascade, but the query is each
+    item's title. A title gets one PDF (score > 70), each PDF goes to at
+    most one title; the assignment maximises the total score over every
+    title's top candidates.
+    """
+    rows = {}
+    for item in zot_items:
+        if needs_fuzzy_match(item):
+            title = item["data"].get("title", "")
+            rows.setdefault(title, table.row(bib_lookup[normalize(title)]))
+    titles = list(rows)
+    left = set(pdfs)
+    edges = [
+        (title, i, score)
+        for title, top in zip(titles, top_pdfs(titles))
+        for i, score in top
+        if score > 70 and pdf_files[i] in left
+    ]
+    return {
+        pdf_files[i]: (rows[title], score)
+        for title, (i, score) in assign(edges).items()
+    }
+
+
+def needs_fuzzy_match(item):
+    """True for items of a matched type whose citekey PDF is not in the folder."""
+    data = item["data"]
+    if data["itemType"] not in ITEM_TYPES:
+        return False
+    citekey = bib_lookup.get(normalize(data.get("title", "")))
+    return bool(citekey) and not (pdf_dir / f"{citekey}.pdf").exists()
 
 
 def fetch_children_with_retry(item_key, retries=5):
@@ -58,37 +131,50 @@ def fetch_children_with_retry(item_key, retries=5):
 
 # =========================== LOAD DATA ===========================
 print("[✓] BibTeX entries loading...")
-with open(bib_path, "r", encoding="utf-8") as f:
-    bib_db = bibtexparser.load(f)
-    bib_entries = bib_db.entries
+table = load_entry_table(bib_path)
 
-print(f"[✓] BibTeX entries loaded: {len(bib_entries)}")
+print(f"[✓] BibTeX entries loaded: {len(table)}")
 
-bib_lookup = {}
-for entry in bib_entries:
-    key = entry.get("ID", "")
-    title = normalize(entry.get("title", ""))
-    bib_lookup[title] = key
+bib_lookup = table.title_lookup(skip_empty=False)
 
 print("Fetching Zotero items...")
 zot_items = zot.everything(zot.items())
 print(f"[✓] Zotero items fetched: {len(zot_items)}")
 
-pdf_files = list(pdf_dir.glob("*.pdf"))
+# Stem signatures persist between runs; only new or changed PDFs are hashed.
+pdf_lsh = StemLSH(pdf_dir)
+pdf_files = pdf_lsh.paths
 print(f"[✓] PDFs available in folder: {len(pdf_files)}")
 
+# Normalise every stem once, then match all titles that may need a fuzzy
+# match up front.
+pdf_names = [normalize(pdf.stem) for pdf in pdf_files]
+scores = ScoreCache(
+    "match_and_link_pdfs",
+    MATCHER_VERSION,
+    [
+        hashlib.blake2b(pdf.name.encode("utf-8"), digest_size=8).digest()
+        for pdf in pdf_files
+    ],
+    k=CANDIDATES,
+)
+# Files already named <citekey>.pdf keep their entry; titles are only
+# matched against the rest.
+cascade = Cascade({"citekey": citekey_stage(table), "fuzzy_filename": title_stage})
+pdf_matches = {
+    table.keys[match.row]: pdf for pdf, match in cascade.run(pdf_files).items()
+}
+scores.close()
+print(f"[✓] Titles: {scores.summary()}")
+cascade.report()
+
 # =========================== PROCESS ===========================
 log_rows = []
 
 for item in tqdm(zot_items, desc="Matching items"):
     item_key = item["key"]
     data = item["data"]
-    if data["itemType"] not in {
-        "journalArticle",
-        "book",
-        "conferencePaper",
-        "presentation",
-    }:
+    if data["itemType"] not in ITEM_TYPES:
         continue
 
     title = data.get("title", "")
@@ -101,15 +187,10 @@ for item in tqdm(zot_items, desc="Matching items"):
         )
         continue
 
-    expected_pdf = pdf_dir / f"{citekey}.pdf"
-    if not expected_pdf.exists():
-        pdf, score = best_pdf_match(title)
-        if not pdf:
-            log_rows.append({"Key": item_key, "Title": title, "Action": "No PDF match"})
-            continue
-        source_pdf = pdf
-    else:
-        source_pdf = expected_pdf
+    source_pdf = pdf_matches.get(citekey)
+    if not source_pdf:
+        log_rows.append({"Key": item_key, "Title": title, "Action": "No PDF match"})
+        continue
 
     # Now prepare to place this PDF in Zotero storage
     storage_folder = storage_dir / item_key
@@ -158,5 +239,6 @@ with open(log_path, "w", newline="", encoding="utf-8") as f:
     for row in log_rows:
         writer.writerow(row)
 
+pdf_lsh.close()
 print("\n✅ Process complete.")
 print(f"✔ Log saved to {log_path}")
@@ -1,3 +1,4 @@
+import sys
 import os
 import re
 import io
@@ -10,6 +11,12 @@ from decouple import config
 from PyPDF2 import PdfReader, PdfWriter
 from tqdm import tqdm
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.bib_index import BibIndex
+from common.match_cascade import Cascade
+from common.pdf_index import PdfIndex
+from common.tex_decode import fold
+
 # === CONFIG ===
 ZOTERO_USER_ID = config("ZOTERO_USER_ID")
 ZOTERO_API_KEY = config("ZOTERO_API_KEY")
@@ -24,16 +31,21 @@ originals_dir.mkdir(exist_ok=True)
 timestamp = datetime.datetime.now().strftime("%Y-%m-%d")
 log_path = pdf_dir.parent / f"auto_link_log_{timestamp}.csv"
 
+# === HELPERS ===
+def clean(text):
+    return re.sub(r'[^\w\s]', '', fold(text)).lower()
+
 # === ZOTERO SETUP ===
 API_ROOT = f"https://api.zotero.org/users/{ZOTERO_USER_ID}"
 session = requests.Session()
 session.headers.update({"Zotero-API-Key": ZOTERO_API_KEY})
 
 # === BIBTEX SETUP ===
-import bibtexparser
-with open(bib_path, "r", encoding="utf-8") as f:
-    bib_db = bibtexparser.load(f)
-entries = {entry['ID']: entry for entry in bib_db.entries}
+# Only the entries for unlinked items are needed: parse them on demand
+entries = BibIndex(bib_path)
+
+# === PDF FOLDER (listed once; kept current as files are moved and copied) ===
+pdf_index = PdfIndex(pdf_dir, clean)
 
 def zotero_api(path, params={}):
     resp = session.get(f"{API_ROOT}{path}", params=params)
@@ -57,13 +69,32 @@ def get_unlinked_items():
         start += 100
     return items
 
-def search_pdf(title):
-    title_clean = re.sub(r'[^\w\s]', '', title).lower()
-    for pdf_path in pdf_dir.glob("*.pdf"):
-        pdf_name_clean = re.sub(r'[^\w\s]', '', pdf_path.stem).lower()
-        if title_clean in pdf_name_clean or pdf_name_clean in title_clean:
-            return pdf_path
-    return None
+def search_pdfs(title):
+    title_clean = clean(title)
+    return pdf_index.search(containing=[title_clean], contained_in=title_clean)
+
+# === CASCADE STAGES (rows are the citekeys of the unlinked items) ===
+def named_stage(pdfs, state):
+    """Files already named <citekey>.pdf."""
+    left = set(pdfs)
+    found = {}
+    for row, citekey in enumerate(citekeys):
+        pdf = pdf_index.find(f"{citekey}.pdf")
+        if pdf in left:
+            found[pdf] = (row, 1.0)
+    return found
+
+def title_stage(pdfs, state):
+    """First file left whose name contains the item's title or is part of it."""
+    left = set(pdfs)
+    found = {}
+    for row, (citekey, title) in enumerate(citekeys.items()):
+        if pdf_index.find(f"{citekey}.pdf"):
+            continue
+        pdf = next((p for p in search_pdfs(title) if p in left and p not in found), None)
+        if pdf:
+            found[pdf] = (row, 1.0)
+    return found
 
 def update_pdf_metadata(pdf_path, entry):
     changed = False
@@ -113,29 +144,48 @@ log_rows = []
 
 print(f"Found {len(unlinked_items)} top-level items without attachments.")
 
-for item in tqdm(unlinked_items, desc="Processing items"):
+# Look up each item's citation key and entry; the cascade matches PDFs to
+# the citekeys found (with the first title seen for each).
+items = []
+citekeys = {}
+for item in tqdm(unlinked_items, desc="Reading items"):
     data = item['data']
     key = data['key']
     title = data.get("title") or ""
-    citekey = data.get("extra", "")
-    m = re.search(r"Citation Key:\s*(\S+)", citekey)
+    m = re.search(r"Citation Key:\s*(\S+)", data.get("extra", ""))
     if not m:
-        log_rows.append([key, title, "❌ No citation key"])
+        items.append((key, title, None, None, "❌ No citation key"))
         continue
     citekey = m.group(1)
 
     entry = entries.get(citekey)
     if not entry:
-        log_rows.append([key, title, "❌ No BibTeX entry for citation key"])
+        items.append((key, title, None, None, "❌ No BibTeX entry for citation key"))
+        continue
+    items.append((key, title, citekey, entry, None))
+    citekeys.setdefault(citekey, title)
+
+cascade = Cascade({"citekey": named_stage, "filename": title_stage})
+rows = list(citekeys)
+found_pdfs = {
+    rows[match.row]: pdf
+    for pdf, match in cascade.run(list(pdf_index)).items()
+    if match.stage == "filename"
+}
+cascade.report()
+
+for key, title, citekey, entry, status in tqdm(items, desc="Processing items"):
+    if status:
+        log_rows.append([key, title, status])
         continue
 
     # Check if already renamed PDF exists
     renamed_pdf = pdf_dir / f"{citekey}.pdf"
-    if renamed_pdf.exists():
+    if pdf_index.find(renamed_pdf.name):
         log_rows.append([key, title, "✔ Already linked or renamed"])
         continue
 
-    found_pdf = search_pdf(title)
+    found_pdf = found_pdfs.get(citekey)
     if not found_pdf:
         log_rows.append([key, title, "❌ No matching PDF found"])
         continue
@@ -143,10 +193,12 @@ for item in tqdm(unlinked_items, desc="Processing items"):
     # Move original
     dest_original = originals_dir / found_pdf.name
     shutil.move(str(found_pdf), dest_original)
+    pdf_index.remove(found_pdf)
 
     # Copy and rename
     renamed_path = pdf_dir / f"{citekey}.pdf"
     shutil.copy(str(dest_original), str(renamed_path))
+    pdf_index.add(renamed_path)
 
     # Update metadata
     update_pdf_metadata(renamed_path, entry)
@@ -1,58 +1,53 @@
+import sys
 from pathlib import Path
-import bibtexparser
-import re
 import csv
 from decouple import config
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.entry_table import load_entry_table
+from common.match_cascade import Cascade, citekey_stage, filename_stage
+
 # === CONFIG ===
 bib_path = Path(config("BIB_PATH"))
 pdf_dir = Path(config("PDF_FOLDER"))
 log_path = pdf_dir / "rename_log.csv"
 dry_run = True  # Set to False to apply renaming
 
-# Normalize helper
-def normalize(text):
-    return re.sub(r'\W+', '', text.lower())
-
-# Load bib file
-with open(bib_path, "r", encoding="utf-8") as f:
-    bib_db = bibtexparser.load(f)
+# Load bib file (cached, pre-normalised columns)
+table = load_entry_table(bib_path)
 
-# Extract structured entries
-entries = []
-for entry in bib_db.entries:
-    key = entry.get("ID", "").strip()
-    author = entry.get("author", "").split(" and ")[0].split(",")[0].strip()
-    year = entry.get("year", "").strip()
-    title = entry.get("title", "").strip().split(":")[0]
-    entries.append({
-        "key": key,
-        "author": normalize(author),
-        "year": year,
-        "title": normalize(" ".join(title.split()[:5]))
-    })
+# Files already named <citekey>.pdf keep their entry; the rest must contain
+# an entry's surname, year (or none) and opening title words in their name.
+cascade = Cascade({
+    "citekey": citekey_stage(table),
+    "filename": filename_stage(table),
+})
+pdfs = list(pdf_dir.glob("*.pdf"))
+matches = cascade.run(pdfs)
+cascade.report()
 
-# Scan and rename matching PDFs
+# Rename matching PDFs
 log = []
-for pdf in pdf_dir.glob("*.pdf"):
-    fname = pdf.stem
-    norm_fname = normalize(fname)
-
-    match = next(
-        (e for e in entries if e["author"] in norm_fname and e["year"] in norm_fname and e["title"] in norm_fname),
-        None
-    )
+for pdf in pdfs:
+    match = matches.get(pdf)
+    claimed = cascade.state[pdf].get("claimed")
 
-    if match:
-        new_name = f"{match['key']}.pdf"
+    if match or claimed:
+        key = table.keys[(match or claimed).row]
+        new_name = f"{key}.pdf"
         new_path = pdf_dir / new_name
         result = "⚠️ Exists — skipped" if new_path.exists() else "✓ Renamed"
-        if not dry_run and not new_path.exists():
+        if not match:
+            # Its entry went to another file, e.g. an existing <citekey>.pdf
+            result = "⚠️ Exists — skipped"
+        elif new_path == pdf:
+            result = "✓ Already named"
+        elif not dry_run and not new_path.exists():
             pdf.rename(new_path)
         log.append({
             "Original": pdf.name,
             "New": new_name,
-            "CitationKey": match['key'],
+            "CitationKey": key,
             "Result": result
         })
     else:
@@ -1,89 +1,97 @@
+import sys
 import re
 import csv
 from pathlib import Path
-from difflib import SequenceMatcher
-from pdfminer.high_level import extract_text
-import bibtexparser
 from decouple import config
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.entry_table import load_entry_table
+from common.identifiers import page_text
+from common.match_cascade import (
+    Cascade,
+    citekey_stage,
+    filename_stage,
+    fuzzy_filename_stage,
+    identifier_stage,
+    metadata_stage,
+    safe_key,
+    text_stage,
+)
+from common.tex_decode import fold
+
 # === CONFIG ===
 bib_path = Path(config("BIB_PATH"))
 pdf_dir = Path(config("PDF_FOLDER"))
+csl_path = config("CSL_JSON_PATH", default=None)  # optional, adds its DOIs
 log_path = pdf_dir.parent / "content_match_rename_log.csv"
 dry_run = True  # Set to False to rename files
+MATCHER_VERSION = 1  # Bump when scoring changes, to drop cached results
 
 def normalize(text):
-    return re.sub(r'\W+', '', text.lower())
-
-def fuzzy_match(a, b):
-    return SequenceMatcher(None, a, b).ratio()
+    return re.sub(r'\W+', '', fold(text).lower())
 
-def extract_text_from_pdf(pdf_path, max_chars=1000):
+def extract_text_from_pdf(pdf_path, state=None, max_chars=1000):
     try:
-        text = extract_text(pdf_path, maxpages=1)
+        text = page_text(pdf_path, state)  # shared with the identifier stage
         return normalize(text[:max_chars])
     except Exception as e:
         print(f"[!] Skipped {pdf_path.name}: {e}")
         return ""
 
-# Load BibTeX entries
-with open(bib_path, "r", encoding="utf-8") as f:
-    bib_db = bibtexparser.load(f)
+# Load BibTeX entries (cached, pre-normalised columns)
+table = load_entry_table(bib_path)
 
-entries = []
-for entry in bib_db.entries:
-    key = entry.get("ID", "").strip()
-    if not key or key.startswith(":") or key.startswith("/") or "/" in key:
-        continue  # skip invalid or unsafe keys
-    safe_key = re.sub(r'[\/:*?"<>|]', '_', key)
-    author = entry.get("author", "").split(" and ")[0].split(",")[0].strip()
-    title = entry.get("title", "").strip().split(":")[0]
-    entries.append({
-        "key": safe_key,
-        "author": normalize(author),
-        "title": normalize(" ".join(title.split()[:6]))
-    })
+# Cheap stages first, so pdfminer only reads files nothing else could place.
+# A DOI / arXiv ID found by a bounded byte scan is an exact join.
+# First-page text and scores are cached per file content between runs.
+cascade = Cascade({
+    "citekey": citekey_stage(table),
+    "identifier": identifier_stage(table, csl_path),
+    "metadata": metadata_stage(table),
+    "filename": filename_stage(table),
+    "fuzzy_filename": fuzzy_filename_stage(table),
+    "first_page": text_stage(
+        table, extract_text_from_pdf, cache_as="rename_pdfs_by_content", version=MATCHER_VERSION
+    ),
+})
+pdfs = list(pdf_dir.glob("*.pdf"))
+matches = cascade.run(pdfs)
+cascade.report()
 
 # Rename logic
 log = []
 
-for pdf in pdf_dir.glob("*.pdf"):
-    content = extract_text_from_pdf(pdf)
-    if not content:
+for pdf in pdfs:
+    match = matches.get(pdf)
+    claimed = cascade.state[pdf].get("claimed")
+    if not match and claimed:
+        # Its entry went to another file, e.g. an existing <citekey>.pdf
+        best_match = safe_key(table.keys[claimed.row])
         log.append({
             "Original": pdf.name,
-            "New": "",
-            "CitationKey": "",
-            "Score": "0.00",
-            "Result": "❌ Failed to read"
+            "New": f"{best_match}.pdf",
+            "CitationKey": best_match,
+            "Score": f"{claimed.score:.2f}",
+            "Stage": claimed.stage,
+            "Result": "⚠️ Exists — skipped"
         })
-        continue
-
-    best_match = None
-    best_score = 0.0
-
-    for entry in entries:
-        score = 0.0
-        if entry["author"] in content:
-            score += 0.3
-        score += 0.7 * fuzzy_match(entry["title"], content)
-        if score > best_score and score > 0.9:
-            best_score = score
-            best_match = entry
-
-    if best_match:
-        new_name = f"{best_match['key']}.pdf"
+    elif match:
+        best_match = safe_key(table.keys[match.row])
+        new_name = f"{best_match}.pdf"
         new_path = pdf_dir / new_name
         result = "✓ Rename planned" if dry_run else "✓ Renamed"
-        if not dry_run and not new_path.exists():
+        if new_path == pdf:
+            result = "✓ Already named"
+        elif not dry_run and not new_path.exists():
             pdf.rename(new_path)
         elif new_path.exists():
             result = "⚠️ Exists — skipped"
         log.append({
             "Original": pdf.name,
             "New": new_name,
-            "CitationKey": best_match["key"],
-            "Score": f"{best_score:.2f}",
+            "CitationKey": best_match,
+            "Score": f"{match.score:.2f}",
+            "Stage": match.stage,
             "Result": result
         })
     else:
@@ -92,11 +100,12 @@ for pdf in pdf_dir.glob("*.pdf"):
             "New": "",
             "CitationKey": "",
             "Score": "0.00",
-            "Result": "❌ No match"
+            "Stage": "",
+            "Result": "❌ Failed to read" if cascade.state[pdf].get("text") == "" else "❌ No match"
         })
 
 with open(log_path, "w", newline="", encoding="utf-8") as f:
-    writer = csv.DictWriter(f, fieldnames=["Original", "New", "CitationKey", "Score", "Result"])
+    writer = csv.DictWriter(f, fieldnames=["Original", "New", "CitationKey", "Score", "Stage", "Result"])
     writer.writeheader()
     writer.writerows(log)
 
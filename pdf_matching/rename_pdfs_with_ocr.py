@@ -1,28 +1,36 @@
+import sys
 import re
 import csv
 import subprocess
 from pathlib import Path
 from tempfile import NamedTemporaryFile
-from difflib import SequenceMatcher
-from pdfminer.high_level import extract_text
-import bibtexparser
 from decouple import config
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.entry_table import load_entry_table
+from common.identifiers import page_text
+from common.match_cascade import (
+    Cascade,
+    citekey_stage,
+    identifier_stage,
+    safe_key,
+    text_stage,
+)
+from common.tex_decode import fold
+
 # === CONFIG ===
 bib_path = Path(config("BIB_PATH"))
 pdf_dir = Path(config("PDF_FOLDER"))
+csl_path = config("CSL_JSON_PATH", default=None)  # optional, adds its DOIs
 log_path = pdf_dir.parent / "content_match_rename_log.csv"
 dry_run = False  # Set to False to apply renames
 
 def normalize(text):
-    return re.sub(r'\W+', '', text.lower())
-
-def fuzzy_match(a, b):
-    return SequenceMatcher(None, a, b).ratio()
+    return re.sub(r'\W+', '', fold(text).lower())
 
-def extract_text_from_pdf(pdf_path, max_chars=1000):
+def extract_text_from_pdf(pdf_path, state=None, max_chars=1000):
     try:
-        text = extract_text(pdf_path, maxpages=1)
+        text = page_text(pdf_path, state)  # shared with the identifier stage
         return normalize(text[:max_chars])
     except Exception:
         return ""
@@ -37,77 +45,89 @@ def ocr_and_extract_text(pdf_path, max_chars=1000):
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL
         )
-        return extract_text_from_pdf(temp_path, max_chars), True
+        return extract_text_from_pdf(temp_path, max_chars=max_chars), True
     except Exception:
         return "", False
     finally:
         if temp_path.exists():
             temp_path.unlink(missing_ok=True)
 
-# Load BibTeX entries
-with open(bib_path, "r", encoding="utf-8") as f:
-    bib_db = bibtexparser.load(f)
-
-entries = []
-for entry in bib_db.entries:
-    key = entry.get("ID", "").strip()
-    if not key or key.startswith(":") or key.startswith("/") or "/" in key:
-        continue
-    safe_key = re.sub(r'[\/:*?"<>|]', '_', key)
-    author = entry.get("author", "").split(" and ")[0].split(",")[0].strip()
-    title = entry.get("title", "").strip().split(":")[0]
-    entries.append({
-        "key": safe_key,
-        "author": normalize(author),
-        "title": normalize(" ".join(title.split()[:6]))
-    })
+def ocr_if_needed(pdf_path, state):
+    # Only files whose own text layer was missing or too short are OCRed.
+    if len(state.get("text", "")) >= 100:
+        return ""
+    state["ocr_tried"] = True
+    content, state["used_ocr"] = ocr_and_extract_text(pdf_path)
+    return content
+
+# Load BibTeX entries (cached, pre-normalised columns)
+table = load_entry_table(bib_path)
+
+# This script renames by default, so it only trusts the file's content: a
+# DOI / arXiv ID, then first-page text, then OCR. Files already named
+# <citekey>.pdf are left alone. The name and metadata-title stages live in
+# rename_pdfs_by_content.py, which is a dry run by default.
+cascade = Cascade({
+    "citekey": citekey_stage(table),
+    "identifier": identifier_stage(table, csl_path),
+    "first_page": text_stage(table, extract_text_from_pdf),
+    "ocr": text_stage(table, ocr_if_needed, key="ocr"),
+})
+pdfs = list(pdf_dir.glob("*.pdf"))
+matches = cascade.run(pdfs)
+cascade.report()
 
 # Main loop
 log = []
 
-for pdf in pdf_dir.glob("*.pdf"):
-    content = extract_text_from_pdf(pdf)
-    used_ocr = False
+for pdf in pdfs:
+    match = matches.get(pdf)
+    state = cascade.state[pdf]
+    used_ocr = state.get("used_ocr", False)
+    claimed = state.get("claimed")
 
-    if not content or len(content) < 100:
-        content, used_ocr = ocr_and_extract_text(pdf)
+    if not match and claimed:
+        # Its entry went to another file, e.g. an existing <citekey>.pdf
+        best_match = safe_key(table.keys[claimed.row])
+        log.append({
+            "Original": pdf.name,
+            "New": f"{best_match}.pdf",
+            "CitationKey": best_match,
+            "Score": f"{claimed.score:.2f}",
+            "Stage": claimed.stage,
+            "Result": f"⚠️ Exists — skipped{' (OCR)' if claimed.stage == 'ocr' else ''}"
+        })
+        continue
 
-    if not content:
+    if not match and state.get("ocr_tried") and not state.get("ocr"):
         log.append({
             "Original": pdf.name,
             "New": "",
             "CitationKey": "",
             "Score": "0.00",
+            "Stage": "",
             "Result": "❌ Failed to read (even with OCR)"
         })
         continue
 
-    best_match = None
-    best_score = 0.0
-
-    for entry in entries:
-        score = 0.0
-        if entry["author"] in content:
-            score += 0.3
-        score += 0.7 * fuzzy_match(entry["title"], content)
-        if score > best_score and score > 0.9:
-            best_score = score
-            best_match = entry
-
-    if best_match:
-        new_name = f"{best_match['key']}.pdf"
+    if match:
+        best_match = safe_key(table.keys[match.row])
+        new_name = f"{best_match}.pdf"
         new_path = pdf_dir / new_name
         result = "✓ Rename planned" if dry_run else "✓ Renamed"
-        if not dry_run and not new_path.exists():
+        if new_path == pdf:
+            result = "✓ Already named"
+        elif not dry_run and not new_path.exists():
             pdf.rename(new_path)
         elif new_path.exists():
             result = "⚠️ Exists — skipped"
         log.append({
             "Original": pdf.name,
             "New": new_name,
-            "CitationKey": best_match["key"],
-            "Score": f"{best_score:.2f}",
-            "Result": f"{result}{' (OCR)' if used_ocr else ''}"
+            "CitationKey": best_match,
+            "Score": f"{match.score:.2f}",
+            "Stage": match.stage,
+            "Result": f"{result}{' (OCR)' if match.stage == 'ocr' else ''}"
         })
     else:
         log.append({
@@ -115,11 +135,12 @@ for pdf in pdf_dir.glob("*.pdf"):
             "New": "",
             "CitationKey": "",
             "Score": "0.00",
+            "Stage": "",
             "Result": "❌ No match (after OCR)" if used_ocr else "❌ No match"
         })
 
 with open(log_path, "w", newline="", encoding="utf-8") as f:
-    writer = csv.DictWriter(f, fieldnames=["Original", "New", "CitationKey", "Score", "Result"])
+    writer = csv.DictWriter(f, fieldnames=["Original", "New", "CitationKey", "Score", "Stage", "Result"])
     writer.writeheader()
     writer.writerows(log)
 
@@ -1,9 +1,14 @@
 import csv
 import shutil
+import sys
 from pathlib import Path
 
 from decouple import config
-from rapidfuzz import fuzz
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.assignment import assign
+from common.stem_lsh import StemLSH
+from common.tex_decode import fold
 
 # ========== SETTINGS ==========
 pdf_dir = Path(config("PDF_FOLDER"))
@@ -14,6 +19,7 @@ unmatched_csv = Path("unmatched_pdfs.csv")
 review_log = Path("logs/review_log.csv")
 
 move_files = False  # Set True to MOVE instead of copying
+alternatives = 3  # Runner-up PDFs listed in the log for each item
 
 # ========== LOAD UNMATCHED ==========
 with unmatched_csv.open("r", encoding="utf-8") as f:
@@ -21,35 +27,46 @@ with unmatched_csv.open("r", encoding="utf-8") as f:
     unmatched = list(reader)
 
 # ========== FIND BEST MATCHES ==========
-pdf_files = list(pdf_dir.glob("*.pdf"))
+# Stem signatures persist between runs; only new or changed PDFs are hashed.
+pdf_lsh = StemLSH(pdf_dir)
+pdf_files = list(pdf_lsh.paths)
 print(f"[✓] PDFs found: {len(pdf_files)}")
 print(f"[✓] Unmatched items: {len(unmatched)}")
 
 
 def normalize(text):
-    return "".join(c.lower() for c in text if c.isalnum())
-
+    return "".join(c.lower() for c in fold(text) if c.isalnum())
+
+
+# Normalise each stem once and rerank each title's LSH candidates with the
+# exact scorer, keeping the top few per title.
+pdf_names = [normalize(pdf.stem) for pdf in pdf_files]
+candidates = pdf_lsh.top_matches(
+    [normalize(row["Title"]) for row in unmatched],
+    [row["Title"] for row in unmatched],
+    pdf_names,
+    k=1 + alternatives,
+    score_cutoff=70,
+)
+# Each PDF goes to at most one item, maximising the total score.
+assigned = assign((n, i, score) for n, top in enumerate(candidates) for i, score in top)
 
 log_rows = []
 
-for row in unmatched:
+for n, (row, top) in enumerate(zip(unmatched, candidates)):
     title = row["Title"]
     key = row["Key"]
-    n_title = normalize(title)
-    best_score = 0
-    best_pdf = None
-
-    for pdf in pdf_files:
-        n_pdf = normalize(pdf.stem)
-        score = fuzz.partial_ratio(n_title, n_pdf)
-        if score > best_score:
-            best_score = score
-            best_pdf = pdf
+    best, best_score = assigned.get(n, (None, 0))
+    best_pdf = pdf_files[best] if best is not None else None
+    others = "; ".join(
+        f"{pdf_files[i].name} ({score:.0f})" for i, score in top if i != best
+    )
 
     if best_pdf and best_score >= 70:
         dest = review_dir / best_pdf.name
         if move_files:
             shutil.move(best_pdf, dest)
+            pdf_lsh.remove(best_pdf)
             action = "Moved"
         else:
             shutil.copy2(best_pdf, dest)
@@ -63,26 +80,33 @@ for row in unmatched:
                 "Matched PDF": best_pdf.name,
                 "Score": best_score,
                 "Action": action,
+                "Alternatives": others,
             }
         )
     else:
-        print(f"❌ No good match (below 70%) for '{title[:60]}...'")
+        if top:
+            print(f"❌ Candidate PDFs went to better matches for '{title[:60]}...'")
+        else:
+            print(f"❌ No good match (below 70%) for '{title[:60]}...'")
         log_rows.append(
             {
                 "Key": key,
                 "Title": title,
                 "Matched PDF": "",
                 "Score": "",
-                "Action": "No match found",
+                "Action": "PDF matched to another item" if top else "No match found",
+                "Alternatives": others,
             }
         )
 
 # ========== WRITE REVIEW LOG ==========
 with review_log.open("w", newline="", encoding="utf-8") as f:
-    fieldnames = ["Key", "Title", "Matched PDF", "Score", "Action"]
+    fieldnames = ["Key", "Title", "Matched PDF", "Score", "Action", "Alternatives"]
     writer = csv.DictWriter(f, fieldnames=fieldnames)
     writer.writeheader()
     writer.writerows(log_rows)
 
+pdf_lsh.close()
+
 print("\n✅ Review copies/moves completed.")
 print(f"✔ Review log saved to {review_log}")
@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+from common.assignment import assign
+
+
+def brute_force(edges, floor=0):
+    """The best total over every one-to-one choice of edges."""
+    arcs = {}
+    for left, right, score in edges:
+        if score >= floor:
+            arcs.setdefault(left, []).append((right, score))
+    lefts = list(arcs)
+
+    def best(k, taken):
+        if k == len(lefts):
+            return 0
+        total = best(k + 1, taken)
+        for right, score in arcs[lefts[k]]:
+            if right not in taken:
+                total = max(total, score + best(k + 1, taken | {right}))
+        return total
+
+    return best(0, frozenset())
+
+
+def check(edges, floor=0):
+    result = assign(edges, floor)
+    scores = {(left, right): score for left, right, score in edges}
+    assert len({right for right, _ in result.values()}) == len(result)
+    for left, (right, score) in result.items():
+        assert scores[left, right] == score >= floor
+    assert sum(score for _, score in result.values()) == pytest.approx(
+        brute_force(edges, floor)
+    )
+    return result
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_matches_brute_force(seed):
+    rnd = random.Random(seed)
+    n_left, n_right = rnd.randint(1, 6), rnd.randint(1, 6)
+    edges = [
+        (f"item{left}", f"pdf{right}", rnd.choice([0.5, 0.7, 0.9, 1.0, rnd.random()]))
+        for left in range(n_left)
+        for right in range(n_right)
+        if rnd.random() < 0.5
+    ]
+    check(edges, floor=rnd.choice([0, 0.6]))
+
+
+def test_a_wrong_greedy_match_is_undone():
+    # a's best PDF is also b's only one: the total wins over a's own best.
+    edges = [("a", "x", 1.0), ("a", "y", 0.99), ("b", "x", 0.99)]
+    assert check(edges) == {"a": ("y", 0.99), "b": ("x", 0.99)}
+
+
+def test_a_pdf_that_fits_nothing_stays_free():
+    edges = [("a", "x", 0.9), ("b", "x", 0.8), ("b", "y", 0.2)]
+    assert check(edges, floor=0.5) == {"a": ("x", 0.9)}
+    assert assign([("a", "x", 0.4)], floor=0.5) == {}
+    assert assign([]) == {}
@@ -0,0 +1,197 @@
+import multiprocessing
+import subprocess
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import bibtexparser
+import pytest
+
+from common import bib_cache
+from common.bib_cache import load_bib
+
+REPO = Path(__file__).resolve().parent.parent
+
+HEADER = """@preamble{"\\newcommand{\\noop}[1]{}"}
+@string{jcell = "Journal of Cells"}
+@comment{exported for the tests}
+"""
+
+
+def entry(n, title=None):
+    return f"""
+@article{{key{n},
+  author = {{Doe, Jane and M{{\\"u}}ller, Jo}},
+  title = {{{title or f"Title number {n}"}}},
+  journal = jcell,
+  year = {{{2000 + n % 20}}},
+  note = {{Braces {{nested {{deeply}}}} and an @ sign}}
+}}
+"""
+
+
+def write_bib(path, count, header=HEADER, titles=None):
+    titles = titles or {}
+    path.write_text(
+        header + "".join(entry(n, titles.get(n)) for n in range(count)),
+        encoding="utf-8",
+    )
+
+
+def assert_same_as_bibtexparser(db, path):
+    expected = bibtexparser.loads(path.read_text(encoding="utf-8"))
+    assert db.entries == expected.entries
+    assert db.strings == expected.strings
+    assert db.preambles == expected.preambles
+    assert db.comments == expected.comments
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(bib_cache, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(bib_cache, "PARSE_WORKERS", 1)
+    return tmp_path / "cache"
+
+
+@pytest.mark.parametrize("count", [0, 3, 250])
+def test_matches_bibtexparser(tmp_path, cache_dir, count):
+    path = tmp_path / "library.bib"
+    write_bib(path, count)
+    assert_same_as_bibtexparser(load_bib(path), path)
+    assert_same_as_bibtexparser(load_bib(path), path)  # from the cache
+
+
+def test_only_changed_entries_are_parsed(tmp_path, cache_dir, capsys):
+    path = tmp_path / "library.bib"
+    write_bib(path, 20)
+    load_bib(path)
+    capsys.readouterr()
+
+    titles = {3: "A new title", 7: "Another"}
+    write_bib(path, 20, titles=titles)
+    assert_same_as_bibtexparser(load_bib(path), path)
+    assert "Parsed 2 changed of 20" in capsys.readouterr().out
+
+    # Appending also changes the old last entry: its span gains the blank line.
+    write_bib(path, 22, titles=titles)
+    assert_same_as_bibtexparser(load_bib(path), path)
+    assert "Parsed 3 changed of 22" in capsys.readouterr().out
+
+
+def test_duplicate_citekeys_are_reported(tmp_path, cache_dir, capsys):
+    path = tmp_path / "library.bib"
+    write_bib(path, 3)
+    load_bib(path)
+    assert "duplicate" not in capsys.readouterr().out
+
+    # A small edit that repeats an existing key, with the rest from the cache.
+    text = path.read_text(encoding="utf-8") + entry(1, "Copy")
+    path.write_text(text, encoding="utf-8")
+    load_bib(path)
+    out = capsys.readouterr().out
+    assert "Parsed 2 changed of 4" in out
+    assert "1 duplicate citekeys in BibTeX: key1" in out
+
+
+def test_string_change_reparses_everything(tmp_path, cache_dir, capsys):
+    path = tmp_path / "library.bib"
+    write_bib(path, 5)
+    load_bib(path)
+    capsys.readouterr()
+
+    write_bib(path, 5, header=HEADER.replace("Journal of Cells", "Cell Journal"))
+    db = load_bib(path)
+    assert_same_as_bibtexparser(db, path)
+    assert db.entries[0]["journal"] == "Cell Journal"
+    assert "Parsed 5 changed of 5" in capsys.readouterr().out
+
+
+def test_touched_file_is_not_reparsed(tmp_path, cache_dir, capsys):
+    path = tmp_path / "library.bib"
+    write_bib(path, 5)
+    load_bib(path)
+    capsys.readouterr()
+
+    write_bib(path, 5)  # same bytes, new mtime
+    assert_same_as_bibtexparser(load_bib(path), path)
+    assert capsys.readouterr().out == ""
+
+
+def test_parser_options_are_cached_separately(tmp_path, cache_dir):
+    path = tmp_path / "library.bib"
+    write_bib(path, 3)
+    plain = load_bib(path)
+    kept = load_bib(path, common_strings=False, ignore_nonstandard_types=False)
+    assert plain.entries == kept.entries
+    assert len(list(cache_dir.glob("*.bibcache.pickle"))) == 2
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_worker_count_does_not_change_the_result(
+    tmp_path, cache_dir, monkeypatch, workers
+):
+    monkeypatch.setattr(bib_cache, "PARSE_WORKERS", workers)
+    monkeypatch.setattr(bib_cache, "FULL_PARSE_THRESHOLD", 20)
+    path = tmp_path / "library.bib"
+    write_bib(path, 300)
+    assert_same_as_bibtexparser(load_bib(path, use_cache=False), path)
+
+    # Duplicate citekeys still come back in file order.
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(entry(5, "Second key5") + entry(6, "Second key6"))
+    assert_same_as_bibtexparser(load_bib(path, use_cache=False), path)
+
+
+def _parallel_load(path):
+    bib_cache.PARSE_WORKERS = 4
+    bib_cache.FULL_PARSE_THRESHOLD = 20
+    return load_bib(path, use_cache=False).entries
+
+
+def test_parallel_parse_under_spawn(tmp_path):
+    path = tmp_path / "library.bib"
+    write_bib(path, 300, titles={7: "Ünïcode tïtle"})
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        entries = pool.apply(_parallel_load, (path,))
+    assert entries == bibtexparser.loads(path.read_text(encoding="utf-8")).entries
+
+
+def test_script_without_main_guard_runs_once(tmp_path):
+    path = tmp_path / "library.bib"
+    write_bib(path, 300)
+    script = tmp_path / "script.py"
+    script.write_text(
+        f"""import multiprocessing, sys
+multiprocessing.set_start_method("spawn")
+sys.path.insert(0, {str(REPO)!r})
+from common import bib_cache
+bib_cache.PARSE_WORKERS = 4
+bib_cache.FULL_PARSE_THRESHOLD = 20
+print("script ran")
+print(len(bib_cache.load_bib({str(path)!r}, use_cache=False).entries))
+""",
+        encoding="utf-8",
+    )
+    out = subprocess.run(
+        [sys.executable, str(script)], capture_output=True, text=True, check=True
+    ).stdout
+    assert out.count("script ran") == 1
+    assert "300" in out.split()
+
+
+def test_failed_worker_chunk_is_parsed_in_process(tmp_path, cache_dir, monkeypatch):
+    monkeypatch.setattr(bib_cache, "PARSE_WORKERS", 4)
+    monkeypatch.setattr(bib_cache, "FULL_PARSE_THRESHOLD", 20)
+    monkeypatch.setattr(bib_cache, "WORKER", [sys.executable, "-c", "exit(1)"])
+    path = tmp_path / "library.bib"
+    write_bib(path, 300)
+    assert_same_as_bibtexparser(load_bib(path, use_cache=False), path)
+
+
+def test_chunks_keep_order_and_cover_everything():
+    spans = [
+        (n, SimpleNamespace(start=10 * n, end=10 * n + 1 + n % 7)) for n in range(50)
+    ]
+    chunks = list(bib_cache._chunks(spans, 8))
+    assert 1 < len(chunks) <= 8
+    assert [d for chunk in chunks for d, _ in chunk] == list(range(50))
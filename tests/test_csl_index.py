@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+from common import csl_index
+from common.csl_index import ensure_index, load_entries, load_entry_hashes
+
+ENTRIES = [
+    {"id": "Doe2020", "title": "Deep things", "author": [{"family": "Doe"}]},
+    {"id": "roe2021", "title": "Other things"},
+]
+
+
+@pytest.fixture
+def export(tmp_path):
+    path = tmp_path / "library.json"
+    path.write_text(json.dumps(ENTRIES), encoding="utf-8")
+    return path
+
+
+def test_readers_use_an_ensured_index(export):
+    index_path = ensure_index(export)
+    assert list(load_entry_hashes(export, index_path)) == ["Doe2020", "roe2021"]
+    assert list(load_entries(export, index_path, keys=["roe2021"])) == ["roe2021"]
+
+
+def test_failed_build_leaves_no_temp_file(export, monkeypatch):
+    def broken(projected):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(csl_index, "entry_hash", broken)
+    with pytest.raises(RuntimeError):
+        ensure_index(export)
+    assert sorted(p.name for p in export.parent.iterdir()) == ["library.json"]
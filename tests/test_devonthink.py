@@ -0,0 +1,188 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from common import devonthink
+from common.devonthink import LookupCache, Search, entry_search_terms, resolve_links
+
+FAKE_OSASCRIPT = Path(__file__).resolve().parent / "bin" / "osascript"
+
+PDF = "x-devonthink-item://PDF-1"
+NOTE = "x-devonthink-item://NOTE-1"
+FALLBACK = "x-devonthink-item://PDF-2"
+
+LIBRARY = {
+    "Jane Doe Deep things": [["PDF document", PDF], ["markdown", NOTE]],
+    "@doe2020.md": [["markdown", NOTE]],
+    "doe2021": [["PDF document", FALLBACK]],
+    "Only notes here": [["markdown", NOTE]],
+}
+
+
+@pytest.fixture
+def osascript(tmp_path, monkeypatch):
+    """Point the resolver at the fake; returns a function listing its calls."""
+    library = tmp_path / "library.json"
+    library.write_text(json.dumps(LIBRARY))
+    log = tmp_path / "calls.jsonl"
+    monkeypatch.setattr(devonthink, "OSASCRIPT", str(FAKE_OSASCRIPT))
+    monkeypatch.setenv("FAKE_DEVONTHINK_LIBRARY", str(library))
+    monkeypatch.setenv("FAKE_DEVONTHINK_LOG", str(log))
+
+    def calls():
+        if not log.exists():
+            return []
+        return [json.loads(line) for line in log.read_text().splitlines()]
+
+    return calls
+
+
+def test_entry_search_terms_put_citekey_last():
+    entry = {"author": [{"given": "Jane", "family": "Doe"}], "title": "Deep  things"}
+    assert entry_search_terms(entry, "doe2020") == ["Jane Doe Deep things", "doe2020"]
+    assert entry_search_terms({}, "doe2020") == ["doe2020"]
+
+
+def test_primary_query_wins(osascript):
+    links = resolve_links({"pdf": Search(["Jane Doe Deep things", "doe2021"])})
+    assert links == {"pdf": PDF}
+
+
+def test_citekey_fallback(osascript):
+    links = resolve_links(
+        {
+            "missing": Search(["Nobody Nothing", "doe2021"]),
+            "wrong_kind": Search(["Only notes here", "doe2021"]),
+            "none": Search(["Nobody Nothing", "nokey"]),
+        }
+    )
+    assert links == {"missing": FALLBACK, "wrong_kind": FALLBACK, "none": None}
+
+
+def test_note_lookup_wants_markdown(osascript):
+    links = resolve_links(
+        {
+            "pdf": Search(["Jane Doe Deep things"], False),
+            "note": Search(["@doe2020.md"], True),
+            "note_by_title": Search(["Jane Doe Deep things"], True),
+        }
+    )
+    assert links == {"pdf": PDF, "note": NOTE, "note_by_title": NOTE}
+    assert len(osascript()) == 1
+
+
+def test_one_call_per_batch(osascript):
+    requests = {n: Search([f"query {n}", "doe2021"]) for n in range(5)}
+    links = resolve_links(requests, batch_size=2)
+    assert links == {n: FALLBACK for n in range(5)}
+    calls = osascript()
+    assert sorted(len(chains) for chains, _ in calls) == [1, 2, 2]
+    assert sorted(c for chains, _ in calls for c in chains) == sorted(
+        [[f"query {n}", "doe2021"] for n in range(5)]
+    )
+
+
+def test_quotes_survive_the_script(osascript):
+    query = 'Doe "Deep" \\ things'
+    resolve_links({0: Search([query])})
+    assert osascript()[0][0] == [[query]]
+
+
+@pytest.mark.parametrize("output", ["not json", "", '{"0": [1, "file:///x"]}'])
+def test_unusable_output_resolves_nothing(osascript, monkeypatch, output):
+    monkeypatch.setenv("FAKE_DEVONTHINK_OUTPUT", output)
+    assert resolve_links({0: Search(["Jane Doe Deep things"])}) == {0: None}
+
+
+def test_missing_osascript_resolves_nothing(monkeypatch, tmp_path):
+    monkeypatch.setattr(devonthink, "OSASCRIPT", str(tmp_path / "no-osascript"))
+    assert resolve_links({0: Search(["Jane Doe Deep things"])}) == {0: None}
+
+
+def test_batch_timeout_grows_with_its_queries(osascript, monkeypatch):
+    monkeypatch.setattr(devonthink, "TIMEOUT", 0)
+    monkeypatch.setattr(devonthink, "QUERY_TIMEOUT", 0.25)
+    monkeypatch.setenv("FAKE_DEVONTHINK_DELAY", "0.5")
+    # One query gets 0.25s: it times out, and is not retried.
+    assert resolve_links({0: Search(["doe2021"])}) == {0: None}
+    assert len(osascript()) == 1
+    # Four queries get a second.
+    requests = {n: Search([f"query {n}", "doe2021"]) for n in range(2)}
+    assert resolve_links(requests) == {0: FALLBACK, 1: FALLBACK}
+
+
+# === Lookup cache ===
+@pytest.fixture
+def cache(tmp_path):
+    cache = LookupCache(tmp_path / "links.sqlite", hit_ttl=1000, miss_ttl=10)
+    yield cache
+    cache.close()
+
+
+def age(cache, seconds):
+    """Pretend every cached answer was looked up ``seconds`` earlier."""
+    with cache.conn:
+        cache.conn.execute(
+            "UPDATE devonthink_lookups SET checked_at = checked_at - ?", (seconds,)
+        )
+
+
+def asked(calls):
+    return [query for chains, _ in calls for chain in chains for query in chain]
+
+
+def test_cached_answers_skip_osascript(osascript, cache):
+    requests = {
+        "pdf": Search(["Nobody Nothing", "doe2021"], False, "doe2021"),
+        "note": Search(["@doe2020.md"], True, "doe2020"),
+    }
+    first = resolve_links(requests, cache)
+    assert first == {"pdf": FALLBACK, "note": NOTE}
+    assert cache.get("nobody   NOTHING", False) == (True, None)  # normalised miss
+    assert cache.get("doe2021", False) == (True, FALLBACK)
+    assert cache.get("doe2021", True) == (False, None)  # other kind unknown
+
+    assert resolve_links(requests, cache) == first
+    assert len(osascript()) == 1
+
+
+def test_expired_misses_are_asked_again(osascript, cache):
+    requests = {"pdf": Search(["Nobody Nothing", "doe2021"], False, "doe2021")}
+    resolve_links(requests, cache)
+    age(cache, 11)  # past the miss TTL, within the hit TTL
+    resolve_links(requests, cache)
+    assert asked(osascript()[1:]) == ["Nobody Nothing"]
+
+    age(cache, 1000)  # now the hit has expired too
+    resolve_links(requests, cache)
+    assert asked(osascript()[2:]) == ["Nobody Nothing", "doe2021"]
+
+
+def test_cached_miss_chain_is_not_asked(osascript, cache):
+    requests = {"pdf": Search(["Nobody Nothing", "nokey"], False, "nokey")}
+    assert resolve_links(requests, cache) == {"pdf": None}
+    assert resolve_links(requests, cache) == {"pdf": None}
+    assert len(osascript()) == 1
+
+
+def test_refresh_and_invalidate(osascript, cache):
+    requests = {"pdf": Search(["Jane Doe Deep things", "doe2020"], False, "doe2020")}
+    resolve_links(requests, cache)
+    resolve_links(requests, cache, refresh=True)
+    assert len(osascript()) == 2
+
+    assert cache.invalidate("doe2020") == 1
+    assert cache.get("Jane Doe Deep things", False) == (False, None)
+    resolve_links(requests, cache)
+    assert len(osascript()) == 3
+
+
+def test_failed_batches_are_not_cached(osascript, cache, monkeypatch):
+    requests = {"pdf": Search(["Jane Doe Deep things"], False, "doe2020")}
+    monkeypatch.setenv("FAKE_DEVONTHINK_OUTPUT", "not json")
+    assert resolve_links(requests, cache) == {"pdf": None}
+    assert cache.get("Jane Doe Deep things", False) == (False, None)
+
+    monkeypatch.delenv("FAKE_DEVONTHINK_OUTPUT")
+    assert resolve_links(requests, cache) == {"pdf": PDF}
@@ -0,0 +1,59 @@
+import importlib
+import json
+import sys
+
+import pytest
+
+
+@pytest.fixture
+def hook_links(tmp_path, monkeypatch):
+    """``hook_links`` configured against a one-entry export in ``tmp_path``."""
+    export = tmp_path / "library.json"
+    export.write_text(json.dumps([{"id": "doe2020", "title": "Deep things"}]))
+    env = {
+        "BASE_DIR": tmp_path,
+        "CSL_JSON_PATH": export,
+        "LOG_PATH": tmp_path,
+        "LINKED_ITEMS": tmp_path / "linked_items.csv",
+        "HOOK_PATH": "hook",
+        "OBSIDIAN_VAULT": tmp_path / "vault",
+        "SOURCE_MATERIAL": "Sources",
+        "ARTICLES": "Articles",
+        "BOOKS": "Books",
+        "OTHER": "Other",
+    }
+    for name, value in env.items():
+        monkeypatch.setenv(name, str(value))
+    for name in ("hook_links", "create_lit_note"):
+        sys.modules.pop(name, None)
+    module = importlib.import_module("hook_links")
+    yield module
+    for name in ("hook_links", "create_lit_note"):
+        sys.modules.pop(name, None)
+
+
+def test_crashed_note_refresh_is_retried(hook_links, monkeypatch):
+    calls = []
+
+    def down(citekey, *args):
+        calls.append(citekey)
+        raise RuntimeError("DEVONthink is not running")
+
+    monkeypatch.setattr(hook_links.create_lit_note, "create_note", down)
+    assert hook_links.main([]) == 0
+    assert hook_links.main([]) == 0
+    assert calls == ["doe2020", "doe2020"]
+
+
+def test_entry_without_pdf_is_not_retried(hook_links, monkeypatch):
+    calls = []
+
+    def no_pdf(citekey, entry, store, *args):
+        calls.append(citekey)
+        store.upsert(citekey, "obsidian://note", "")
+        return {"note_uri": "obsidian://note", "pdf_uri": ""}
+
+    monkeypatch.setattr(hook_links.create_lit_note, "create_note", no_pdf)
+    assert hook_links.main([]) == 0
+    assert hook_links.main([]) == 0
+    assert calls == ["doe2020"]
@@ -0,0 +1,252 @@
+import itertools
+import json
+import zlib
+
+import pytest
+
+from common import identifiers
+from common.entry_table import EntryTable
+from common.identifiers import (
+    entry_identifiers,
+    identifiers_in,
+    page_text,
+    scan_metadata,
+)
+from common.match_cascade import Cascade, identifier_stage
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("https://arxiv.org/abs/2101.00001v2", ["arxiv:2101.00001"]),
+        ("http://export.arxiv.org/pdf/2101.00001.pdf", ["arxiv:2101.00001"]),
+        ("arXiv:2101.00001", ["arxiv:2101.00001"]),
+        ("arXiv: hep-th/9901001v1", ["arxiv:hep-th/9901001"]),
+        ("https://arxiv.org/abs/math.AG/0601001", ["arxiv:math.ag/0601001"]),
+        (
+            "https://doi.org/10.48550/arXiv.2101.00001",
+            ["arxiv:2101.00001", "doi:10.48550/arxiv.2101.00001"],
+        ),
+        ("doi:10.1016/J.CELL.2020.01.001.", ["doi:10.1016/j.cell.2020.01.001"]),
+        ("(see 10.1000/xyz), and 10.1000/abc;", ["doi:10.1000/xyz", "doi:10.1000/abc"]),
+        ("10.1/short and arxiv 12.34", []),
+        (
+            "(doi:10.1016/S0140-6736(20)30183-5).",
+            ["doi:10.1016/s0140-6736(20)30183-5"],
+        ),
+        (
+            "10.1002/(SICI)1097-4571(199806)49:8<693::AID-ASI4>3.0.CO;2-O, p. 3",
+            ["doi:10.1002/(sici)1097-4571(199806)49:8<693::aid-asi4>3.0.co;2-o"],
+        ),
+        (
+            "<prism:doi>10.1000/xyz</prism:doi>",
+            ["doi:10.1000/xyz"],
+        ),
+    ],
+)
+def test_identifiers_in(text, expected):
+    assert identifiers_in(text) == expected
+
+
+def test_entry_identifiers():
+    entry = {
+        "doi": "https://doi.org/10.1000/XYZ",
+        "url": "https://arxiv.org/abs/1905.01234",
+        "journal": "arXiv preprint arXiv:1905.01234",
+    }
+    assert entry_identifiers(entry) == ["doi:10.1000/xyz", "arxiv:1905.01234"]
+    assert entry_identifiers({"eprint": "1905.01234", "archiveprefix": "arXiv"}) == [
+        "arxiv:1905.01234"
+    ]
+    assert entry_identifiers({"eprint": "12345", "archiveprefix": "HAL"}) == []
+
+
+def pdf_bytes(*pages, info=b"", extra=b""):
+    """A small but well-formed PDF: one Flate content stream per page.
+
+    ``info`` is the Info dictionary's body; ``extra`` is an uncompressed
+    object (an XMP packet or a link annotation, say).
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None]
+    kids = []
+    for content in pages:
+        z = zlib.compress(content)
+        objects.append(
+            b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream"
+            % (len(z), z)
+        )
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792]"
+            b" /Resources %s /Contents %d 0 R >>" % (FONTS, len(objects))
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(kids),
+        len(kids),
+    )
+    objects.append(b"<< %s >>" % info)
+    info_ref = len(objects)
+    objects.append(extra or b"<< >>")
+    out, offsets = bytearray(b"%PDF-1.4\n"), []
+    for n, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (n, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R /Info %d 0 R >>\n" % (
+        len(objects) + 1,
+        info_ref,
+    )
+    out += b"startxref\n%d\n%%%%EOF\n" % xref
+    return bytes(out)
+
+
+FONTS = b"<< /Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> >> >>"
+_lines = itertools.count()
+
+
+def shown(text, op=b"Tj"):
+    """``text`` on a line of its own; ``op=b"TJ"`` takes a kerned array."""
+    y = 720 - 20 * (next(_lines) % 30)
+    return b"BT /F1 10 Tf 72 %d Td %s %s ET" % (
+        y,
+        text if op == b"TJ" else b"(%s)" % text,
+        op,
+    )
+
+
+XMP = b"<x:xmpmeta><prism:doi>10.1016/j.cell.2020.01.001</prism:doi></x:xmpmeta>"
+LINK = b"<< /Type /Annot /Subtype /Link /A << /URI (https://arxiv.org/abs/1801.00001v3) >> >>"
+
+
+def test_scan_metadata(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(
+        pdf_bytes(shown(b"doi: 10.1000/xyz"), info=b"/doi (10.1000/info)", extra=LINK)
+    )
+    # Only the file's own IDs: the DOI shown on the page is not among them.
+    assert scan_metadata(path) == ["doi:10.1000/info", "arxiv:1801.00001"]
+
+
+def test_scan_metadata_reads_head_and_tail_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(identifiers, "SCAN_HEAD_BYTES", 1024)
+    monkeypatch.setattr(identifiers, "SCAN_TAIL_BYTES", 64)
+    path = tmp_path / "a.pdf"
+    middle = b"/doi (10.1000/middle)" + b" " * 2000
+    path.write_bytes(b"%" * 2000 + middle + b"/doi (10.1000/tail)")
+    assert scan_metadata(path) == ["doi:10.1000/tail"]
+
+
+def test_page_text_reads_the_first_page_once(tmp_path, monkeypatch):
+    path = tmp_path / "a.pdf"
+    pages = [shown(b"[(doi: 10.10)-20(00/xyz)]", b"TJ"), shown(b"10.1000/second")]
+    path.write_bytes(pdf_bytes(*pages))
+    state = {}
+    text = page_text(path, state)
+    assert identifiers_in(text) == ["doi:10.1000/xyz"]
+
+    import pdfminer.high_level
+
+    monkeypatch.setattr(pdfminer.high_level, "extract_text", None)
+    assert page_text(path, state) == text
+
+
+def test_page_text_keeps_the_error(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"not a pdf")
+    state = {}
+    for _ in range(2):
+        with pytest.raises(Exception):
+            page_text(path, state)
+    assert isinstance(state["page_text"], Exception)
+
+
+def entries():
+    return [
+        {"ID": "smith2020", "title": "Deep", "doi": "10.1016/j.cell.2020.01.001"},
+        {
+            "ID": "lee2019",
+            "author": "Lee, Ann",
+            "title": "Quantum",
+            "eprint": "1905.01234",
+            "archiveprefix": "arXiv",
+        },
+        {"ID": "kim2018", "title": "Other", "url": "https://arxiv.org/abs/1801.00001"},
+        {"ID": "csl2017", "title": "Only in CSL"},
+        {"ID": "twin1", "title": "A", "doi": "10.1000/shared"},
+        {"ID": "twin2", "title": "B", "doi": "10.1000/shared"},
+    ]
+
+
+@pytest.fixture
+def pdfs(tmp_path):
+    files = {
+        "xmp.pdf": pdf_bytes(shown(b"Deep"), extra=XMP),
+        "link.pdf": pdf_bytes(shown(b"Other"), extra=LINK),
+        # Page IDs count when the entry's surname or title is on the page.
+        "kerned.pdf": pdf_bytes(
+            shown(b"[(arXiv:19)-20(05.01234v2)]", b"TJ") + shown(b"A. Lee")
+        ),
+        "csl.pdf": pdf_bytes(shown(b"Only in CSL (doi: 10.5555/csl.42.)")),
+        "cites_two.pdf": pdf_bytes(
+            shown(b"Only in CSL, after 10.1016/j.cell.2020.01.001 and 10.5555/csl.42")
+        ),
+        # Cited, not described: the entry is nowhere on the page.
+        "cites_one.pdf": pdf_bytes(shown(b"Unrelated, see arXiv:1801.00001")),
+        "cites_on_last_page.pdf": pdf_bytes(
+            shown(b"Other"), shown(b"Other 10.1016/j.cell.2020.01.001")
+        ),
+        "shared.pdf": pdf_bytes(shown(b"A"), info=b"/doi (10.1000/shared)"),
+        # Info names an unknown DOI; the cited arXiv ID does not stand in.
+        "unknown_info.pdf": pdf_bytes(
+            shown(b"New paper citing arXiv:1801.00001"), info=b"/doi (10.1000/unknown)"
+        ),
+        "garbage.pdf": b"not a pdf",
+    }
+    folder = tmp_path / "pdfs"
+    folder.mkdir()
+    for name, data in files.items():
+        (folder / name).write_bytes(data)
+    return folder
+
+
+def test_identifier_stage(tmp_path, pdfs):
+    csl = tmp_path / "library.json"
+    csl.write_text(
+        json.dumps(
+            [
+                {"id": "csl2017", "type": "article", "DOI": "10.5555/CSL.42"},
+                {"id": "not_in_bib", "type": "article", "DOI": "10.5555/none"},
+            ]
+        )
+    )
+    table = EntryTable.from_entries(entries())
+    stage = identifier_stage(table, csl)
+    state = {pdf: {} for pdf in pdfs.iterdir()}
+    found = {
+        pdf.name: table.keys[row] for pdf, (row, _) in stage(list(state), state).items()
+    }
+    assert found == {
+        "xmp.pdf": "smith2020",
+        "link.pdf": "kim2018",
+        "kerned.pdf": "lee2019",
+        "csl.pdf": "csl2017",
+        "cites_two.pdf": "csl2017",
+    }
+    # Page one is only read when the file's metadata names no entry, and
+    # then kept for the later stages.
+    assert "page_text" not in state[pdfs / "xmp.pdf"]
+    assert "Only in CSL" in state[pdfs / "cites_two.pdf"]["page_text"]
+
+
+def test_identifier_stage_without_csl(pdfs):
+    table = EntryTable.from_entries(entries())
+    matches = Cascade({"identifier": identifier_stage(table)}).run(
+        sorted(pdfs.iterdir())
+    )
+    assert {pdf.name: table.keys[m.row] for pdf, m in matches.items()} == {
+        "kerned.pdf": "lee2019",
+        "link.pdf": "kim2018",
+        "xmp.pdf": "smith2020",
+    }
@@ -0,0 +1,42 @@
+import pytest
+
+from common.link_store import open_link_store
+
+
+def test_csv_is_imported_once(tmp_path):
+    csv_path = tmp_path / "linked_items.csv"
+    csv_path.write_text(
+        "CitationKey,Note_Link,DEVONthink_Link\nkey1,note://1,x-devonthink-item://1\n",
+        encoding="utf-8",
+    )
+    with open_link_store(csv_path) as store:
+        assert store.get("key1")["Note_Link"] == "note://1"
+        store.delete("key1")
+    with open_link_store(csv_path) as store:
+        assert "key1" not in store
+
+
+def test_failed_import_is_retried(tmp_path):
+    csv_path = tmp_path / "linked_items.csv"
+    csv_path.write_bytes(b"CitationKey,Note_Link,DEVONthink_Link\nkey1,\xff,\n")
+    with pytest.raises(UnicodeDecodeError):
+        open_link_store(csv_path)
+
+    csv_path.write_text(
+        "CitationKey,Note_Link,DEVONthink_Link\nkey1,,\n", encoding="utf-8"
+    )
+    with open_link_store(csv_path) as store:
+        assert "key1" in store
+
+
+def test_store_from_before_recorded_imports_is_not_reimported(tmp_path):
+    csv_path = tmp_path / "linked_items.csv"
+    csv_path.write_text(
+        "CitationKey,Note_Link,DEVONthink_Link\nold,,\n", encoding="utf-8"
+    )
+    with open_link_store(csv_path) as store:
+        store.conn.execute("DELETE FROM meta")
+        store.upsert("new", None, None)
+        store.delete("old")
+    with open_link_store(csv_path) as store:
+        assert list(store.all()) == ["new"]
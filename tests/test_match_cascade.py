@@ -0,0 +1,151 @@
+from pathlib import Path
+
+import pytest
+
+from common.block_index import BlockIndex
+from common.entry_table import EntryTable
+from common.match_cascade import (
+    STAGES,
+    Cascade,
+    Match,
+    citekey_stage,
+    filename_stage,
+    fuzzy_filename_stage,
+    safe_key,
+)
+
+
+def fixed_stage(name, answers, calls):
+    """A stage that records what it saw and returns ``answers``."""
+
+    def stage(pdfs, state):
+        calls.append((name, list(pdfs)))
+        for pdf in pdfs:
+            state[pdf].setdefault("seen_by", []).append(name)
+        return {pdf: answer for pdf, answer in answers.items() if pdf in pdfs}
+
+    return stage
+
+
+def test_stages_run_in_fixed_order_on_what_is_left():
+    calls = []
+    a, b, c = Path("a.pdf"), Path("b.pdf"), Path("c.pdf")
+    cascade = Cascade(
+        {
+            # Deliberately out of order: STAGES decides.
+            "first_page": fixed_stage("first_page", {b: (2, 0.95)}, calls),
+            "citekey": fixed_stage("citekey", {a: (1, 1.0)}, calls),
+            "filename": fixed_stage("filename", {}, calls),
+        }
+    )
+    matches = cascade.run([a, b, c])
+    assert [name for name, _ in calls] == ["citekey", "filename", "first_page"]
+    assert calls[1][1] == [b, c]
+    assert matches == {a: Match(1, 1.0, "citekey"), b: Match(2, 0.95, "first_page")}
+    assert cascade.state[c]["seen_by"] == ["citekey", "filename", "first_page"]
+    assert [(name, seen, done) for name, seen, done, _ in cascade.stats] == [
+        ("citekey", 3, 1),
+        ("filename", 2, 0),
+        ("first_page", 2, 1),
+    ]
+
+
+def test_claimed_rows_are_exclusive():
+    calls = []
+    a, b = Path("a.pdf"), Path("b.pdf")
+    cascade = Cascade(
+        {
+            "citekey": fixed_stage("citekey", {a: (1, 1.0)}, calls),
+            # b's first claim is on a's row: it falls through to the next stage.
+            "filename": fixed_stage("filename", {b: (1, 1.0)}, calls),
+            "fuzzy_filename": fixed_stage("fuzzy_filename", {b: (2, 0.7)}, calls),
+        }
+    )
+    assert cascade.run([a, b]) == {
+        a: Match(1, 1.0, "citekey"),
+        b: Match(2, 0.7, "fuzzy_filename"),
+    }
+    assert cascade.state[b]["claimed"] == Match(1, 1.0, "filename")
+    assert "claimed" not in cascade.state[a]
+
+
+def test_within_a_stage_the_first_pdf_keeps_the_row():
+    a, b = Path("a.pdf"), Path("b.pdf")
+    cascade = Cascade({"filename": fixed_stage("filename", {a: (1, 1), b: (1, 1)}, [])})
+    assert cascade.run([a, b]) == {a: Match(1, 1, "filename")}
+    assert cascade.state[b]["claimed"] == Match(1, 1, "filename")
+
+
+def test_no_stage_runs_without_pdfs():
+    calls = []
+    cascade = Cascade({"citekey": fixed_stage("citekey", {}, calls)})
+    assert cascade.run([]) == {}
+    assert calls == []
+
+
+def test_unknown_stage_is_rejected():
+    with pytest.raises(ValueError, match="filenames"):
+        Cascade({"filenames": lambda pdfs, state: {}})
+    assert STAGES[:2] == ("citekey", "identifier")
+
+
+ENTRIES = [
+    {
+        "ID": "smith2020deep",
+        "author": "Smith, John",
+        "title": "Deep Things in Cells",
+        "year": "2020",
+    },
+    {"ID": "lee2019", "author": "Lee, Ann", "title": "Quantum Stuff", "year": "2019"},
+    {"ID": "odd:key", "author": "Odd, Ed", "title": "Odd", "year": "2001"},
+]
+
+
+def test_safe_key():
+    assert safe_key("odd:key") == "odd_key"
+    assert safe_key("a/b") is None
+    assert safe_key("") is None
+
+
+def test_name_stages_through_the_cascade():
+    table = EntryTable.from_entries(ENTRIES)
+    pdfs = [
+        Path("smith2020deep.pdf"),
+        Path("odd_key.pdf"),
+        Path("Smith 2020 Deep things in cells.pdf"),  # row taken by the citekey file
+        Path("Lee 2019 - quantum stuf.pdf"),
+        Path("unrelated.pdf"),
+    ]
+    matches = Cascade(
+        {
+            "citekey": citekey_stage(table),
+            "filename": filename_stage(table),
+            "fuzzy_filename": fuzzy_filename_stage(table),
+        }
+    ).run(pdfs)
+    found = {pdf.name: (table.keys[m.row], m.stage) for pdf, m in matches.items()}
+    assert found == {
+        "smith2020deep.pdf": ("smith2020deep", "citekey"),
+        "odd_key.pdf": ("odd:key", "citekey"),
+        "Lee 2019 - quantum stuf.pdf": ("lee2019", "fuzzy_filename"),
+    }
+
+
+def test_years_match_as_written():
+    # As before the block index: the year text must occur in the name, so a
+    # non-numeric year can still count, and a missing year always does.
+    table = EntryTable.from_entries(
+        [
+            {"ID": "a", "author": "Ames, A", "title": "Soon", "year": "forthcoming"},
+            {"ID": "b", "author": "Bell, B", "title": "Undated", "year": "n.d."},
+            {"ID": "c", "author": "Cole, C", "title": "Timeless", "year": ""},
+        ]
+    )
+    blocks = BlockIndex(table)
+    name = "amesforthcomingsoon"
+    assert [table.year_in(i, name) for i in range(3)] == [True, False, True]
+    assert blocks.rows_for(blocks.surnames_in(name), blocks.years_in(name)) == [0]
+    assert blocks.rows_for(None, blocks.years_in("bellnd")) == [2]
+    assert filename_stage(table, blocks)([Path("Ames forthcoming Soon.pdf")], {}) == {
+        Path("Ames forthcoming Soon.pdf"): (0, 1.0)
+    }
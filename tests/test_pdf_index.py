@@ -0,0 +1,96 @@
+import re
+
+import pytest
+
+from common.entry_table import EntryTable
+from common.pdf_index import PdfIndex
+from common.tex_decode import fold
+
+ENTRIES = [
+    {
+        "ID": "smithjones2019",
+        "author": "Smith-Jones, Ann and Doe, Jane",
+        "title": "Deep Learning for Cells",
+        "year": "2019",
+    },
+    {
+        "ID": "vanderberg2019",
+        "author": "van der Berg, Piet",
+        "title": "Notes on {DNA} Repair",
+        "year": "2019",
+    },
+    {
+        "ID": "muller2018",
+        "author": 'M{\\"u}ller, Jo',
+        "title": "Über alles",
+        "year": "2018",
+    },
+    {"ID": "nobody2017", "author": "Nobody, N.", "title": "Nothing", "year": "2017"},
+]
+
+
+def baseline_patterns(entry):
+    """The patterns the linkers built from the raw BibTeX entry before the table."""
+    author = entry.get("author", "").split(" and ")[0].split(",")[0].strip().lower()
+    year = entry.get("year", "").strip()
+    title_words = re.findall(r"\w+", entry.get("title", "").lower())
+    return [
+        f"{author}_{year}",
+        f"{author}{year}",
+        f"{author}_{year}_{'_'.join(title_words[:3])}",
+    ]
+
+
+@pytest.fixture
+def folder(tmp_path):
+    for name in [
+        "unrelated.pdf",
+        "smithjones_2019.pdf",  # squashed: not what the linkers look for
+        "Smith-Jones_2019_deep_learning_for.pdf",
+        "van der berg_2019_notes.pdf",
+        "Müller2018 Über alles.pdf",
+        "notes.txt",
+    ]:
+        (tmp_path / name).write_bytes(b"%PDF-1.4\n")
+    return tmp_path
+
+
+def test_fallback_patterns_keep_the_surname_as_written():
+    table = EntryTable.from_entries(ENTRIES)
+    for i, entry in enumerate(ENTRIES[:2]):
+        assert table.fallback_patterns(i) == baseline_patterns(entry)
+    assert table.fallback_patterns(2)[:2] == ["muller_2018", "muller2018"]
+
+
+def test_fallback_finds_hyphenated_and_multiword_surnames(folder):
+    table = EntryTable.from_entries(ENTRIES)
+    index = PdfIndex(folder, lambda stem: fold(stem).lower())
+    found = [index.first(containing=table.fallback_patterns(i)) for i in range(4)]
+    assert [p.name if p else None for p in found] == [
+        "Smith-Jones_2019_deep_learning_for.pdf",
+        "van der berg_2019_notes.pdf",
+        "Müller2018 Über alles.pdf",
+        None,
+    ]
+
+
+def test_search_matches_a_folder_scan(folder):
+    index = PdfIndex(folder, lambda stem: fold(stem).lower())
+    assert [p.name for p in index] == [p.name for p in folder.glob("*.pdf")]
+    for text in ["2019", "berg", "smith", "_20", "zzz"]:
+        scanned = [p for p in folder.glob("*.pdf") if text in fold(p.stem).lower()]
+        assert index.search(containing=[text]) == scanned
+    assert index.search(contained_in="see unrelated files") == [
+        folder / "unrelated.pdf"
+    ]
+
+
+def test_index_follows_renames(folder):
+    index = PdfIndex(folder)
+    old, new = folder / "unrelated.pdf", folder / "renamed.pdf"
+    index.move(old, new)
+    assert index.find("renamed.pdf") == new
+    assert index.find("UNRELATED.pdf") is None
+    assert index.first(containing=["renamed"]) == new
+    index.remove(new)
+    assert index.first(containing=["renamed"]) is None
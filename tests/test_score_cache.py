@@ -0,0 +1,131 @@
+import os
+
+import pytest
+
+from common import score_cache
+from common.entry_table import EntryTable
+from common.match_cascade import text_stage
+from common.score_cache import ScoreCache, merge
+
+
+def hashes(*names):
+    return [name.encode().ljust(8, b".")[:8] for name in names]
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(score_cache, "CACHE_DIR", tmp_path / "cache")
+    return tmp_path / "cache" / "match_scores.sqlite"
+
+
+def run(choices, query="q", k=1, version=1, scored=None):
+    """One run of a matcher: returns what ``lookup`` said, then stores ``scored``."""
+    cache = ScoreCache("test", version, hashes(*choices), k=k)
+    found = cache.lookup(query)
+    if scored is not None:
+        cache.store(query, scored, data="payload")
+    cache.close()
+    return found
+
+
+def test_unchanged_choices_are_a_hit(db):
+    assert run(["a", "b"], scored=[(1, 0.9)]) == ([], None, None)
+    assert run(["a", "b"]) == ([(1, 0.9)], set(), "payload")
+    assert db.exists()
+
+
+def test_only_new_choices_need_scoring(db):
+    run(["a", "b"], scored=[(1, 0.9)])
+    # "c" is new; "b" moved to index 0 and keeps its score.
+    assert run(["b", "c", "a"]) == ([(0, 0.9)], {1}, "payload")
+
+
+def test_losing_a_full_top_k_member_rescores_everything(db):
+    run(["a", "b", "c"], k=2, scored=[(1, 0.9), (2, 0.8)])
+    assert run(["a", "c"], k=2) == ([], None, "payload")
+
+
+def test_losing_a_member_of_a_short_list_is_fine(db):
+    # Fewer than k candidates were above the floor: none was hidden.
+    run(["a", "b", "c"], k=2, scored=[(1, 0.9)])
+    assert run(["a", "c"], k=2) == ([], set(), "payload")
+
+
+def test_version_bump_drops_results(db):
+    run(["a"], scored=[(0, 0.9)])
+    assert run(["a"], version=2) == ([], None, None)
+
+
+def test_unseen_queries_are_pruned(db):
+    run(["a"], query="old", scored=[(0, 0.9)])
+    run(["a"], query="new", scored=[(0, 0.8)])
+    assert run(["a"], query="old") == ([], None, None)
+
+
+def test_merge():
+    assert merge([(3, 0.5), (1, 0.9)], [(2, 0.9), (3, 0.6)], 2) == [(1, 0.9), (2, 0.9)]
+    assert merge([], [], 3) == []
+
+
+# === Per-file text cache (text_stage) ===
+ENTRIES = [
+    {"ID": "lee2019", "author": "Lee, Ann", "title": "Quantum Stuff Revisited Again"},
+    {"ID": "kim2018", "author": "Kim, Bo", "title": "Other Stuff Entirely Here"},
+]
+TEXT = "leequantumstuffrevisitedagain"
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = tmp_path / "scan.pdf"
+    path.write_bytes(b"%PDF-1.4 original")
+    return path
+
+
+def match(table, pdf, reads):
+    def extract(path, state):
+        reads.append(path)
+        return TEXT
+
+    stage = text_stage(table, extract, cache_as="test_text")
+    found = stage([pdf], {pdf: {}})
+    return {p.name: table.keys[row] for p, (row, _) in found.items()}
+
+
+def test_unchanged_file_is_not_read_again(db, pdf):
+    table = EntryTable.from_entries(ENTRIES)
+    reads = []
+    assert match(table, pdf, reads) == {"scan.pdf": "lee2019"}
+    assert match(table, pdf, reads) == {"scan.pdf": "lee2019"}
+    assert len(reads) == 1
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda p: os.utime(p, ns=(0, p.stat().st_mtime_ns + 1_000_000)),  # mtime
+        lambda p: p.write_bytes(b"%PDF-1.4 original, longer"),  # size
+        lambda p: (  # same size and mtime, new inode
+            p.with_name("new.pdf").write_bytes(p.read_bytes()),
+            os.utime(p.with_name("new.pdf"), ns=(0, p.stat().st_mtime_ns)),
+            os.replace(p.with_name("new.pdf"), p),
+        ),
+    ],
+    ids=["mtime", "size", "inode"],
+)
+def test_changed_file_is_read_again(db, pdf, change):
+    table = EntryTable.from_entries(ENTRIES)
+    reads = []
+    match(table, pdf, reads)
+    change(pdf)
+    match(table, pdf, reads)
+    assert len(reads) == 2
+
+
+def test_new_entries_reuse_the_cached_text(db, pdf):
+    reads = []
+    assert match(EntryTable.from_entries(ENTRIES[1:]), pdf, reads) == {}
+    assert match(EntryTable.from_entries(ENTRIES), pdf, reads) == {
+        "scan.pdf": "lee2019"
+    }
+    assert len(reads) == 1
@@ -0,0 +1,29 @@
+import pytest
+
+from common.tex_decode import decode, fold
+
+
+@pytest.mark.parametrize(
+    "tex, text",
+    [
+        (r"M{\"u}ller", "Müller"),
+        (r"Fran\c cois and \v{S}koda", "François and Škoda"),
+        (r"Stra\ss e, {\o}re", "Straße, øre"),
+        (r"na\"\i ve", "naïve"),
+        (r"na\"{\i}ve and na{\"\i}ve", "naïve and naïve"),
+        (r"\u\i x", "ĭx"),
+        (r"J.\,R.\,R. Tolkien", "J. R. R. Tolkien"),
+        (r"a\;b and a\!b", "a b and ab"),
+        (r"\emph{Deep} learning -- a review", "Deep learning – a review"),
+        (r"R\&D at 50\%", "R&D at 50%"),
+        ("plain text", "plain text"),
+    ],
+)
+def test_decode(tex, text):
+    assert decode(tex) == text
+
+
+def test_fold():
+    assert fold(decode(r"Erd\H{o}s, Ł{\'o}d{\'z}, \O{}stergaard")) == (
+        "Erdos, Lodz, Ostergaard"
+    )
@@ -1,27 +1,21 @@
 #!/Users/antonio/micromamba/envs/zotero/bin/python3
 
 import sys
-from bibtexparser import loads
+from pathlib import Path
 from decouple import config
 
-STANDARD_TYPES = {
-    "article", "book", "incollection", "inproceedings",
-    "manual", "misc", "unpublished", "conference",
-    "phdthesis", "mastersthesis", "techreport"
-}
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.bib_lint import lint_file
 
-with open(config("BIB_PATH"), "r", encoding="utf-8") as f:
-    bib_db = loads(f.read())
+# Shared STANDARD_TYPES (common/bib_lint.py); types are checked as exported,
+# before any remapping, in a single scan of the file.
+result = lint_file(config("BIB_PATH"), ["nonstandard-type"])
 
-nonstandard = set()
-for entry in bib_db.entries:
-    typ = entry["ENTRYTYPE"].lower()
-    if typ not in STANDARD_TYPES:
-        nonstandard.add(typ)
+nonstandard = {f.value for f in result.findings}
 
 if nonstandard:
-    print("⚠ Non-standard types found:", ", ".join(nonstandard))
+    print("⚠ Non-standard types found:", ", ".join(sorted(nonstandard)))
     sys.exit(1)
 else:
     print("✅ All entry types are standard.")
-    sys.exit(0)
\ No newline at end of file
+    sys.exit(0)
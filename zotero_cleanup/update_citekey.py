@@ -1,9 +1,11 @@
-import pandas as pd
 import sys
 from pathlib import Path
 
 from decouple import config
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.link_store import open_link_store
+
 # === CONFIGURATION ===
 base_dir = Path(__file__).parent.resolve()
 linked_items_path = base_dir / "linked_items.csv"
@@ -12,18 +14,11 @@ bib_path = Path(config("BIB_PATH"))
 citekey = sys.argv[1]
 linked_items_path = Path(sys.argv[2])
 
-# Load the linked_items.csv
-df = pd.read_csv(linked_items_path)
-
-# If the citekey already exists, do nothing.
-if citekey in df["CitationKey"].values:
-    print(f"Citekey {citekey} already in linked_items.csv — skipping update.")
-    sys.exit(0)
-
-# Otherwise, add a blank row for this citekey.
-new_row = {"CitationKey": citekey, "Note": "", "DEVONthink_Link": ""}
-df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
+# Open the link store that replaces linked_items.csv
+with open_link_store(linked_items_path, config("LINK_STORE", default=None)) as store:
+    # If the citekey already exists, do nothing; otherwise add a blank row.
+    if not store.ensure(citekey):
+        print(f"Citekey {citekey} already in link store — skipping update.")
+        sys.exit(0)
 
-# Save the updated CSV.
-df.to_csv(linked_items_path, index=False)
-print(f"Added {citekey} to linked_items.csv")
\ No newline at end of file
+print(f"Added {citekey} to link store")